@@ -0,0 +1,311 @@
+"""Admission control: per-client rate limits and a budget for in-flight upload bytes.
+
+``AdmissionMiddleware`` runs before routing, so it classes each request by
+method and path (``route_class``): uploads, other writes and reads each
+have their own token bucket per client. A client flooding uploads runs out
+of upload tokens only; its reads, and every other client, are unaffected.
+Over the limit a request gets 429 with ``Retry-After``. Clients are told
+apart by address, so rate limits stay off until ``TRUSTED_PROXY_HOPS`` says
+how many proxies stand in front of the API (0 when clients connect
+directly); otherwise every request behind an ingress would carry the
+proxy's address and share one bucket.
+
+Upload bodies also reserve their Content-Length from a process-wide byte
+budget (``UPLOAD_INFLIGHT_BYTES``) until the request ends; bodies sent
+without a length reserve as they arrive. When the budget is spent a new
+upload waits up to ``UPLOAD_ADMISSION_WAIT_SECONDS`` for room, then gets 503
+with ``Retry-After`` before any of its body is read. That bounds the disk,
+GridFS and hashing work one worker takes on at once, which is what keeps
+read latency flat while uploads pile up.
+
+Buckets are held in this process by default, so each worker enforces its
+own limits. ``RATE_LIMIT_BACKEND=redis`` shares them between workers and
+hosts through any client that speaks the redis-py asyncio API; if Redis
+fails, requests are let through rather than refused. The byte budget is
+always per process, as it protects the process's own resources.
+"""
+import asyncio
+import logging
+import math
+import os
+import re
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException
+
+from metrics import REQUESTS_REJECTED, UPLOAD_BYTES_IN_FLIGHT
+from uploads import MAX_UPLOAD_BYTES
+
+logger = logging.getLogger(__name__)
+
+
+@dataclass(frozen=True)
+class RateLimit:
+    rate: float  # tokens added per second; 0 or less disables the limit
+    burst: int  # bucket size
+
+
+def _rate_limit(name: str, rate: float, burst: int) -> RateLimit:
+    return RateLimit(
+        float(os.environ.get(f"RATE_LIMIT_{name}_PER_SECOND", rate)),
+        int(os.environ.get(f"RATE_LIMIT_{name}_BURST", burst)),
+    )
+
+
+RATE_LIMITS = {
+    "upload": _rate_limit("UPLOAD", 2, 20),
+    "write": _rate_limit("WRITE", 20, 100),
+    "read": _rate_limit("READ", 100, 400),
+}
+# Idle clients beyond this many are forgotten (their buckets would have refilled anyway)
+RATE_LIMIT_MAX_CLIENTS = int(os.environ.get("RATE_LIMIT_MAX_CLIENTS", 100_000))
+# Reverse proxies in front of the API; the client address is taken from X-Forwarded-For past them.
+# Unset (None) leaves rate limits off, as the client address cannot be trusted
+TRUSTED_PROXY_HOPS = int(os.environ["TRUSTED_PROXY_HOPS"]) if os.environ.get("TRUSTED_PROXY_HOPS") else None
+
+UPLOAD_INFLIGHT_BYTES = int(os.environ.get("UPLOAD_INFLIGHT_BYTES", 2 * MAX_UPLOAD_BYTES))
+UPLOAD_ADMISSION_WAIT_SECONDS = float(os.environ.get("UPLOAD_ADMISSION_WAIT_SECONDS", 5))
+UPLOAD_RETRY_AFTER_SECONDS = 10
+
+# Probes and scrapes must never be throttled
+EXEMPT_PATHS = ("/api/healthz", "/metrics")
+_UPLOAD_ROUTES = (
+    ("POST", re.compile(r"^/api/content$")),
+    ("POST", re.compile(r"^/api/artists/[^/]+/profile-image$")),
+    ("PUT", re.compile(r"^/api/uploads/[^/]+/[^/]+$")),
+    ("POST", re.compile(r"^/api/uploads/[^/]+/complete$")),
+)
+
+
+def route_class(method: str, path: str) -> Optional[str]:
+    """The rate limit class of a request, or None when it is not limited"""
+    if path in EXEMPT_PATHS:
+        return None
+    for upload_method, pattern in _UPLOAD_ROUTES:
+        if method == upload_method and pattern.match(path):
+            return "upload"
+    return "read" if method in ("GET", "HEAD") else "write"
+
+
+def client_address(scope) -> str:
+    if TRUSTED_PROXY_HOPS:
+        forwarded = dict(scope["headers"]).get(b"x-forwarded-for")
+        if forwarded:
+            hops = [hop.strip() for hop in forwarded.decode("latin-1").split(",")]
+            if len(hops) >= TRUSTED_PROXY_HOPS:
+                return hops[-TRUSTED_PROXY_HOPS]
+    client = scope.get("client")
+    return client[0] if client else "unknown"
+
+
+class MemoryBuckets:
+    """Token buckets held in this process, least recently used first."""
+
+    def __init__(self, max_entries: int = RATE_LIMIT_MAX_CLIENTS):
+        self.max_entries = max_entries
+        self.buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()  # key -> (tokens, updated)
+
+    async def take(self, key: str, limit: RateLimit) -> float:
+        """Take a token; 0 if one was available, else the seconds until there is one"""
+        now = time.monotonic()
+        tokens, updated = self.buckets.get(key, (limit.burst, now))
+        tokens = min(limit.burst, tokens + (now - updated) * limit.rate)
+        wait = 0.0
+        if tokens >= 1:
+            tokens -= 1
+        else:
+            wait = (1 - tokens) / limit.rate
+        self.buckets[key] = (tokens, now)
+        self.buckets.move_to_end(key)
+        while len(self.buckets) > self.max_entries:
+            self.buckets.popitem(last=False)
+        return wait
+
+
+# Same arithmetic as MemoryBuckets.take, atomic in Redis and on Redis's clock
+_TAKE_SCRIPT = """
+local rate, burst = tonumber(ARGV[1]), tonumber(ARGV[2])
+local time = redis.call('TIME')
+local now = tonumber(time[1]) + tonumber(time[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= 1 then tokens = tokens - 1 else wait = (1 - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000) + 1000)
+return tostring(wait)
+"""
+
+
+class RedisBuckets:
+    """Token buckets shared through Redis; a bucket expires once it would be full again."""
+
+    def __init__(self, client, prefix: str = "ratelimit:"):
+        self.client = client
+        self.prefix = prefix
+        self.script = client.register_script(_TAKE_SCRIPT)
+
+    async def take(self, key: str, limit: RateLimit) -> float:
+        try:
+            return float(await self.script(keys=[self.prefix + key], args=[limit.rate, limit.burst]))
+        except Exception:
+            logger.warning("Rate limit backend unavailable; admitting request", exc_info=True)
+            return 0.0
+
+
+def create_rate_buckets(redis_client=None):
+    """Build the bucket store selected by the RATE_LIMIT_BACKEND environment variable"""
+    backend = os.environ.get("RATE_LIMIT_BACKEND", "memory")
+    if backend == "memory":
+        return MemoryBuckets()
+    if backend == "redis":
+        if redis_client is None:
+            import redis.asyncio
+            redis_client = redis.asyncio.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+        return RedisBuckets(redis_client)
+    raise ValueError(f"Unknown RATE_LIMIT_BACKEND: {backend}")
+
+
+class ByteBudget:
+    """Bytes of upload bodies this process has admitted and not yet finished."""
+
+    def __init__(self, capacity: int = UPLOAD_INFLIGHT_BYTES):
+        self.capacity = capacity
+        self.in_use = 0
+        self._changed = asyncio.Condition()
+
+    def _fits(self, size: int) -> bool:
+        # A body larger than the whole budget is admitted on its own
+        return self.in_use == 0 or self.in_use + size <= self.capacity
+
+    def try_acquire(self, size: int) -> bool:
+        if not self._fits(size):
+            return False
+        self.in_use += size
+        UPLOAD_BYTES_IN_FLIGHT.inc(amount=size)
+        return True
+
+    async def acquire(self, size: int, timeout: float) -> bool:
+        """Reserve size bytes, waiting up to timeout seconds for room"""
+        if self.try_acquire(size):
+            return True
+        if timeout <= 0:
+            return False
+        async with self._changed:
+            try:
+                await asyncio.wait_for(self._changed.wait_for(lambda: self._fits(size)), timeout)
+            except asyncio.TimeoutError:
+                return False
+            return self.try_acquire(size)
+
+    async def release(self, size: int):
+        if not size:
+            return
+        self.in_use -= size
+        UPLOAD_BYTES_IN_FLIGHT.dec(amount=size)
+        async with self._changed:
+            self._changed.notify_all()
+
+
+class AdmissionController:
+    def __init__(self, buckets, limits: Optional[Dict[str, RateLimit]] = None, budget: Optional[ByteBudget] = None):
+        self.buckets = buckets
+        if limits is None:
+            limits = RATE_LIMITS if TRUSTED_PROXY_HOPS is not None else {}
+            if TRUSTED_PROXY_HOPS is None:
+                logger.warning("Rate limits are off until TRUSTED_PROXY_HOPS is set (0 without a reverse proxy)")
+        self.limits = limits
+        self.budget = ByteBudget() if budget is None else budget
+
+    async def check_rate(self, client: str, klass: str) -> float:
+        """0 if the client may make a request of this class now, else the seconds to wait"""
+        limit = self.limits.get(klass)
+        if limit is None or limit.rate <= 0:
+            return 0.0
+        return await self.buckets.take(f"{klass}:{client}", limit)
+
+    def stats(self) -> dict:
+        return {
+            "backend": type(self.buckets).__name__,
+            "limits": {name: {"rate": limit.rate, "burst": limit.burst} for name, limit in self.limits.items()},
+            "upload_bytes_in_flight": self.budget.in_use,
+            "upload_bytes_capacity": self.budget.capacity,
+        }
+
+
+def _retry_after(seconds: float) -> str:
+    return str(max(1, math.ceil(seconds)))
+
+
+class AdmissionMiddleware:
+    """Apply the rate limits and the upload byte budget before a request reaches the app."""
+
+    def __init__(self, app, controller: AdmissionController):
+        self.app = app
+        self.controller = controller
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        klass = route_class(scope["method"], scope["path"])
+        if klass is None:
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        has_body = scope["method"] in ("POST", "PUT", "PATCH")
+        wait = await self.controller.check_rate(client_address(scope), klass)
+        if wait:
+            REQUESTS_REJECTED.inc(klass, "rate_limited")
+            await self._reject(send, 429, "Too many requests", wait, close=has_body)
+            return
+        if klass != "upload" or not has_body or self.controller.budget.capacity <= 0:
+            await self.app(scope, receive, send)
+            return
+
+        budget = self.controller.budget
+        content_length = headers.get(b"content-length")
+        reserved = 0
+        if content_length is not None and content_length.isdigit():
+            size = int(content_length)
+            if not await budget.acquire(size, UPLOAD_ADMISSION_WAIT_SECONDS):
+                REQUESTS_REJECTED.inc(klass, "upload_budget")
+                await self._reject(send, 503, "Too many uploads in progress", UPLOAD_RETRY_AFTER_SECONDS, close=True)
+                return
+            reserved = size
+            budgeted_receive = receive
+        else:
+            async def budgeted_receive():
+                nonlocal reserved
+                message = await receive()
+                if message["type"] == "http.request" and message.get("body"):
+                    if not budget.try_acquire(len(message["body"])):
+                        REQUESTS_REJECTED.inc(klass, "upload_budget")
+                        raise HTTPException(status_code=503, detail="Too many uploads in progress",
+                                            headers={"Retry-After": _retry_after(UPLOAD_RETRY_AFTER_SECONDS)})
+                    reserved += len(message["body"])
+                return message
+
+        try:
+            await self.app(scope, budgeted_receive, send)
+        finally:
+            await budget.release(reserved)
+
+    async def _reject(self, send, status: int, detail: str, retry_after: float, close: bool):
+        body = f'{{"detail":"{detail}"}}'.encode()
+        headers = [
+            (b"content-type", b"application/json"),
+            (b"content-length", str(len(body)).encode()),
+            (b"retry-after", _retry_after(retry_after).encode()),
+        ]
+        if close:
+            # The body was never read, so the connection cannot be reused
+            headers.append((b"connection", b"close"))
+        await send({"type": "http.response.start", "status": status, "headers": headers})
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,49 @@
+"""Helpers for the batch endpoints.
+
+Large batches are split into chunks that are written concurrently over the
+connection pool, with unordered writes so one bad item never blocks the rest.
+"""
+import asyncio
+import os
+from typing import Dict, List
+
+from fastapi import HTTPException
+from pymongo.errors import BulkWriteError
+
+MAX_BATCH_SIZE = int(os.environ.get("MAX_BATCH_SIZE", 1000))
+WRITE_CHUNK_SIZE = int(os.environ.get("BATCH_WRITE_CHUNK_SIZE", 250))
+WRITE_CONCURRENCY = int(os.environ.get("BATCH_WRITE_CONCURRENCY", 4))
+
+
+def check_batch_size(size: int):
+    if size == 0:
+        raise HTTPException(status_code=400, detail="Batch is empty")
+    if size > MAX_BATCH_SIZE:
+        raise HTTPException(status_code=413, detail=f"Batch exceeds the limit of {MAX_BATCH_SIZE} items")
+
+
+def parse_ids(ids: str) -> List[str]:
+    """Split a comma-separated id list, dropping blanks and duplicates but keeping order"""
+    parsed = list(dict.fromkeys(i.strip() for i in ids.split(",") if i.strip()))
+    check_batch_size(len(parsed))
+    return parsed
+
+
+async def insert_unordered(collection, docs: List[dict]) -> Dict[int, dict]:
+    """Insert docs in concurrent unordered chunks; returns the write error for each failed position"""
+    semaphore = asyncio.Semaphore(WRITE_CONCURRENCY)
+    errors: Dict[int, dict] = {}
+
+    async def insert_chunk(offset: int, chunk: List[dict]):
+        async with semaphore:
+            try:
+                await collection.insert_many(chunk, ordered=False)
+            except BulkWriteError as e:
+                for error in e.details.get("writeErrors", []):
+                    errors[offset + error["index"]] = error
+
+    await asyncio.gather(*(
+        insert_chunk(offset, docs[offset:offset + WRITE_CHUNK_SIZE])
+        for offset in range(0, len(docs), WRITE_CHUNK_SIZE)
+    ))
+    return errors
@@ -0,0 +1,322 @@
+"""Load-test suite: drives the API in-process against a seeded database.
+
+The app from server.py is mounted on an httpx ASGI transport, so there is
+no network or uvicorn in the measurement. The database is either
+mongomock-motor (default, no server needed) or a real mongod given by
+--mongo-url; a throwaway database is created and dropped for each run.
+
+Run from the backend directory:
+
+    python -m bench.loadtest run --artists 200 --content 5000 --concurrency 16
+    python -m bench.loadtest compare results/old.json results/new.json
+
+Each run writes a JSON report (p50/p95/p99 latency, RPS and peak RSS per
+scenario, plus the commit and configuration) so runs can be diffed.
+"""
+import asyncio
+import json
+import logging
+import os
+import platform
+import random
+import resource
+import statistics
+import subprocess
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import httpx
+import typer
+
+import server
+from blobstore import LocalBlobStore
+from cache import create_cache
+from indexes import ensure_indexes
+from pagination import encode_cursor
+from schema import ARTISTS, CONTENT, detect_legacy
+from stats import reconcile_stats
+
+RESULTS_DIR = Path(__file__).parent / "results"
+SCENARIOS = ["list", "search", "get_by_id", "upload", "deep_skip", "deep_cursor"]
+SEARCH_WORDS = ["blue", "study", "landscape", "portrait", "light", "sound", "grey", "night"]
+
+cli = typer.Typer(help="Throughput and latency benchmarks for the API")
+
+
+def _percentile(values: List[float], pct: float) -> float:
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def _peak_rss_mb() -> float:
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 * 1024) if platform.system() == "Darwin" else peak / 1024
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True, text=True, check=True, cwd=Path(__file__).parent
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def _blob_chunks(data: bytes):
+    yield data
+
+
+async def seed(db, blob_store, artists: int, content: int, file_size: int, distinct_files: int) -> Dict[str, list]:
+    """Insert artists and content directly, sharing a pool of distinct files"""
+    blob_ids = []
+    for _ in range(distinct_files):
+        blob = await blob_store.put(_blob_chunks(os.urandom(file_size)))
+        blob_ids.append(blob.sha256)
+
+    base = datetime.utcnow() - timedelta(days=365)
+    artist_docs = []
+    for i in range(artists):
+        created = base + timedelta(seconds=i)
+        artist_docs.append({
+            "id": str(uuid.uuid4()),
+            "name": f"Artist {i}",
+            "email": f"artist{i}@bench.example.com",
+            "bio": " ".join(random.choices(SEARCH_WORDS, k=12)),
+            "location": "Brooklyn, NY",
+            "website": "",
+            "social_links": {},
+            "profile_renditions": [],
+            "created_at": created,
+            "updated_at": created,
+        })
+    for start in range(0, len(artist_docs), 1000):
+        await db.artists.insert_many([ARTISTS.encode(doc) for doc in artist_docs[start:start + 1000]])
+
+    content_docs = []
+    for i in range(content):
+        created = base + timedelta(seconds=i)
+        content_docs.append({
+            "id": str(uuid.uuid4()),
+            "artist_id": artist_docs[i % artists]["id"],
+            "title": f"{random.choice(SEARCH_WORDS).title()} study {i}",
+            "description": " ".join(random.choices(SEARCH_WORDS, k=20)),
+            "blob_id": blob_ids[i % distinct_files],
+            "file_type": "application/octet-stream",
+            "file_name": f"piece-{i}.bin",
+            "file_size": file_size,
+            "tags": random.sample(SEARCH_WORDS, 3),
+            "renditions": [],
+            "created_at": created,
+            "updated_at": created,
+        })
+    for start in range(0, len(content_docs), 1000):
+        await db.content.insert_many([CONTENT.encode(doc) for doc in content_docs[start:start + 1000]])
+
+    # Seeding bypasses the API, so build the artist counters the way the repair job does
+    await reconcile_stats(db)
+    return {"artists": artist_docs, "content": content_docs}
+
+
+def _request_factory(scenario: str, data: Dict[str, list], file_size: int):
+    """Return a coroutine function issuing one request of the scenario"""
+    content = data["content"]
+    artists = data["artists"]
+    newest_first = sorted(content, key=lambda d: (d["created_at"], d["id"]), reverse=True)
+    payload = os.urandom(file_size)
+
+    async def list_page(client):
+        return await client.get("/api/content", params={"limit": 20, "skip": random.randint(0, 100)})
+
+    async def search(client):
+        return await client.get("/api/content", params={"search": random.choice(SEARCH_WORDS), "limit": 20})
+
+    async def get_by_id(client):
+        return await client.get(f"/api/content/{random.choice(content)['id']}")
+
+    async def upload(client):
+        return await client.post(
+            "/api/content",
+            data={"artist_id": random.choice(artists)["id"], "title": "Bench upload", "tags": "bench"},
+            files={"file": ("bench.bin", payload, "application/octet-stream")}
+        )
+
+    async def deep_skip(client):
+        depth = random.randint(len(content) // 2, max(len(content) - 20, len(content) // 2))
+        return await client.get("/api/content", params={"limit": 20, "skip": depth})
+
+    async def deep_cursor(client):
+        depth = random.randint(len(newest_first) // 2, max(len(newest_first) - 21, len(newest_first) // 2))
+        return await client.get("/api/content", params={"limit": 20, "cursor": encode_cursor(newest_first[depth])})
+
+    return {
+        "list": list_page,
+        "search": search,
+        "get_by_id": get_by_id,
+        "upload": upload,
+        "deep_skip": deep_skip,
+        "deep_cursor": deep_cursor,
+    }[scenario]
+
+
+async def run_scenario(client, make_request, requests: int, concurrency: int) -> dict:
+    latencies: List[float] = []
+    statuses: Dict[str, int] = {}
+    bytes_received = 0
+    remaining = iter(range(requests))
+
+    async def worker():
+        nonlocal bytes_received
+        for _ in remaining:
+            start = time.perf_counter()
+            response = await make_request(client)
+            latencies.append(time.perf_counter() - start)
+            statuses[str(response.status_code)] = statuses.get(str(response.status_code), 0) + 1
+            bytes_received += len(response.content)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    ms = [latency * 1000 for latency in latencies]
+    return {
+        "requests": requests,
+        "concurrency": concurrency,
+        "statuses": statuses,
+        "errors": sum(count for status, count in statuses.items() if not status.startswith("2")),
+        "rps": requests / elapsed,
+        "latency_ms": {
+            "mean": statistics.fmean(ms),
+            "p50": _percentile(ms, 50),
+            "p95": _percentile(ms, 95),
+            "p99": _percentile(ms, 99),
+            "max": max(ms),
+        },
+        "avg_response_bytes": bytes_received / requests,
+        "peak_rss_mb": _peak_rss_mb(),
+    }
+
+
+async def _run(config: dict) -> dict:
+    if config["mongo_url"]:
+        from motor.motor_asyncio import AsyncIOMotorClient
+        mongo_client = AsyncIOMotorClient(config["mongo_url"])
+    else:
+        from mongomock_motor import AsyncMongoMockClient
+        mongo_client = AsyncMongoMockClient()
+    db_name = f"bench_{uuid.uuid4().hex[:8]}"
+
+    with tempfile.TemporaryDirectory() as blob_root:
+        # Point the app at the benchmark database, blob store and a cold cache
+        server.init_db(mongo_client, db_name)
+        server.blob_store = LocalBlobStore(Path(blob_root))
+        server.cache = create_cache()
+        # Every simulated client shares one address; measure the app, not the rate limits
+        server.admission.limits = {}
+        db = server.db
+        await detect_legacy(db)
+        await ensure_indexes(db)
+
+        typer.echo(f"Seeding {config['artists']} artists and {config['content']} content items...")
+        data = await seed(db, server.blob_store, config["artists"], config["content"], config["file_size"], config["distinct_files"])
+
+        # One INFO line per request from httpx would dominate the run
+        logging.getLogger("httpx").setLevel(logging.WARNING)
+        results = {}
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for scenario in config["scenarios"]:
+                if scenario == "search" and not config["mongo_url"]:
+                    typer.echo("Skipping search: mongomock has no $text support, use --mongo-url")
+                    continue
+                make_request = _request_factory(scenario, data, config["file_size"])
+                results[scenario] = await run_scenario(client, make_request, config["requests"], config["concurrency"])
+                latency = results[scenario]["latency_ms"]
+                typer.echo(
+                    f"{scenario:12} {results[scenario]['rps']:9.1f} rps  "
+                    f"p50 {latency['p50']:7.2f} ms  p95 {latency['p95']:7.2f} ms  p99 {latency['p99']:7.2f} ms  "
+                    f"errors {results[scenario]['errors']}  rss {results[scenario]['peak_rss_mb']:.0f} MB"
+                )
+
+        if config["mongo_url"]:
+            await mongo_client.drop_database(db_name)
+    return results
+
+
+@cli.command()
+def run(
+    artists: int = typer.Option(100, help="Artists to seed"),
+    content: int = typer.Option(2000, help="Content items to seed"),
+    file_size: int = typer.Option(64 * 1024, help="Bytes per seeded file and per upload"),
+    distinct_files: int = typer.Option(20, help="Distinct seeded files shared by the content items"),
+    requests: int = typer.Option(500, help="Requests per scenario"),
+    concurrency: int = typer.Option(16, help="Concurrent clients"),
+    scenario: List[str] = typer.Option(SCENARIOS, help="Scenarios to run (repeatable)"),
+    mongo_url: Optional[str] = typer.Option(None, help="Use a real mongod instead of mongomock"),
+    output: Optional[Path] = typer.Option(None, help="Where to write the JSON report"),
+    seed_value: int = typer.Option(1234, "--seed", help="Random seed"),
+):
+    """Seed a database and run the load scenarios"""
+    unknown = set(scenario) - set(SCENARIOS)
+    if unknown:
+        raise typer.BadParameter(f"Unknown scenarios: {', '.join(sorted(unknown))}")
+    random.seed(seed_value)
+    config = {
+        "artists": artists,
+        "content": content,
+        "file_size": file_size,
+        "distinct_files": distinct_files,
+        "requests": requests,
+        "concurrency": concurrency,
+        "scenarios": scenario,
+        "mongo_url": mongo_url,
+        "seed": seed_value,
+    }
+    results = asyncio.run(_run(config))
+
+    commit = _git_commit()
+    report = {
+        "commit": commit,
+        "timestamp": datetime.utcnow().isoformat(),
+        "python": platform.python_version(),
+        "database": "mongod" if mongo_url else "mongomock",
+        "config": {k: v for k, v in config.items() if k != "mongo_url"},
+        "scenarios": results,
+    }
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"{datetime.utcnow():%Y%m%dT%H%M%S}-{commit or 'nogit'}.json"
+    output.write_text(json.dumps(report, indent=2))
+    typer.echo(f"Report written to {output}")
+
+
+@cli.command()
+def compare(baseline: Path, candidate: Path):
+    """Show per-scenario changes between two reports"""
+    old = json.loads(baseline.read_text())
+    new = json.loads(candidate.read_text())
+    typer.echo(f"{old.get('commit')} -> {new.get('commit')}")
+    typer.echo(f"{'scenario':12} {'rps':>18} {'p50 ms':>20} {'p99 ms':>20}")
+    for name in new["scenarios"]:
+        if name not in old["scenarios"]:
+            continue
+        a, b = old["scenarios"][name], new["scenarios"][name]
+
+        def change(x, y):
+            return f"{x:8.2f}->{y:8.2f} ({(y - x) / x * 100:+.0f}%)" if x else f"{x:.2f}->{y:.2f}"
+
+        typer.echo(
+            f"{name:12} {change(a['rps'], b['rps']):>18} "
+            f"{change(a['latency_ms']['p50'], b['latency_ms']['p50']):>20} "
+            f"{change(a['latency_ms']['p99'], b['latency_ms']['p99']):>20}"
+        )
+
+
+if __name__ == "__main__":
+    cli()
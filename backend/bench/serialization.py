@@ -0,0 +1,103 @@
+"""Micro-benchmark: per-item cost of serializing Artist and Content documents.
+
+Compares the old list path (build a model per document, then let FastAPI
+validate and serialize it again for ``response_model``) with the
+DocumentSerializer + orjson fast path.
+
+Run from the backend directory:
+
+    python -m bench.serialization --items 1000 --repeat 20
+"""
+import json
+import time
+import uuid
+from datetime import datetime
+from typing import List
+
+import orjson
+import typer
+from fastapi.encoders import jsonable_encoder
+from pydantic import TypeAdapter
+
+import server
+
+
+def artist_doc(i: int) -> dict:
+    now = datetime.utcnow().replace(microsecond=(i * 1000) % 1000000)
+    return {
+        "id": str(uuid.uuid4()),
+        "name": f"Artist {i}",
+        "email": f"artist{i}@example.com",
+        "bio": "Contemporary artist working with light and sound. " * 4,
+        "location": "Brooklyn, NY",
+        "website": "https://example.com",
+        "social_links": {"instagram": f"artist{i}"},
+        "profile_image_blob": uuid.uuid4().hex * 2,
+        "profile_image_type": "image/jpeg",
+        "profile_renditions": [],
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def content_doc(i: int) -> dict:
+    now = datetime.utcnow().replace(microsecond=(i * 1000) % 1000000)
+    content_id = str(uuid.uuid4())
+    return {
+        "id": content_id,
+        "artist_id": str(uuid.uuid4()),
+        "title": f"Piece {i}",
+        "description": "Study in blue and grey. " * 8,
+        "blob_id": uuid.uuid4().hex * 2,
+        "file_type": "image/jpeg",
+        "file_name": f"piece-{i}.jpg",
+        "file_size": 2_400_000,
+        "tags": ["painting", "blue", "study"],
+        "renditions": [
+            {"size": size, "width": size, "height": size * 3 // 4, "blob_id": uuid.uuid4().hex * 2, "media_type": "image/webp"}
+            for size in (160, 480, 1080)
+        ],
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+def pydantic_path(model, docs: List[dict]) -> bytes:
+    """What the endpoints did before: model per item, then response_model validation and encoding"""
+    items = [model(**doc) for doc in docs]
+    adapter = TypeAdapter(List[model])
+    validated = adapter.validate_python(items, from_attributes=True)
+    return json.dumps(jsonable_encoder(adapter.dump_python(validated, mode="json"))).encode()
+
+
+def fast_path(serializer, docs: List[dict]) -> bytes:
+    return orjson.dumps(serializer.many(docs))
+
+
+def per_item_us(fn, docs: List[dict], repeat: int) -> float:
+    fn(docs)  # warm up
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn(docs)
+        best = min(best, time.perf_counter() - start)
+    return best / len(docs) * 1e6
+
+
+def main(items: int = typer.Option(1000, help="Documents per list"), repeat: int = typer.Option(20, help="Timed runs; the best is reported")):
+    cases = [
+        ("ArtistSummary", server.ArtistSummary, server.ARTIST_SUMMARY_SERIALIZER, [artist_doc(i) for i in range(items)]),
+        ("ContentSummary", server.ContentSummary, server.CONTENT_SUMMARY_SERIALIZER, [content_doc(i) for i in range(items)]),
+        ("Artist", server.Artist, server.ARTIST_SERIALIZER, [artist_doc(i) for i in range(items)]),
+        ("Content", server.Content, server.CONTENT_SERIALIZER, [content_doc(i) for i in range(items)]),
+    ]
+    typer.echo(f"{'model':16} {'pydantic us/item':>18} {'fast us/item':>14} {'speedup':>9}")
+    for name, model, serializer, docs in cases:
+        assert orjson.loads(fast_path(serializer, docs)) == json.loads(pydantic_path(model, docs)), name
+        slow = per_item_us(lambda d: pydantic_path(model, d), docs, repeat)
+        fast = per_item_us(lambda d: fast_path(serializer, d), docs, repeat)
+        typer.echo(f"{name:16} {slow:18.2f} {fast:14.2f} {slow / fast:8.1f}x")
+
+
+if __name__ == "__main__":
+    typer.run(main)
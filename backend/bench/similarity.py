@@ -0,0 +1,56 @@
+"""Micro-benchmark: near-duplicate queries against the in-memory hash index.
+
+Fills a HashIndex with random 64-bit hashes plus planted near duplicates,
+then times single-core queries at a given Hamming radius and checks that
+every planted duplicate is found.
+
+Run from the backend directory:
+
+    python -m bench.similarity --hashes 1000000 --queries 2000 --radius 10
+"""
+import asyncio
+import statistics
+import time
+import uuid
+
+import numpy as np
+import typer
+
+from similarity import HashIndex
+
+
+def main(
+    hashes: int = typer.Option(1_000_000, help="Hashes in the index"),
+    queries: int = typer.Option(2000, help="Queries to time"),
+    radius: int = typer.Option(10, help="Hamming radius in bits"),
+    seed: int = typer.Option(0, help="Random seed"),
+):
+    """Build an index and report query latency percentiles and recall"""
+    rng = np.random.default_rng(seed)
+    values = rng.integers(0, 2 ** 63, size=hashes, dtype=np.int64).astype(np.uint64) | (rng.integers(0, 2, size=hashes, dtype=np.uint64) << np.uint64(63))
+    index = HashIndex()
+    started = time.perf_counter()
+    for value in values:
+        index.add(uuid.uuid4().bytes, 0, int(value))
+    asyncio.run(index.merge())
+    typer.echo(f"built {len(index)} hashes in {time.perf_counter() - started:.1f}s")
+
+    # Each query is a stored hash with up to `radius` random bits flipped, so it must find its original
+    targets = rng.integers(0, hashes, size=queries)
+    latencies, found = [], 0
+    for target in targets:
+        flips = rng.choice(64, size=rng.integers(0, radius + 1), replace=False)
+        query = int(values[target]) ^ sum(1 << int(bit) for bit in flips)
+        started = time.perf_counter()
+        matches = index.search(query, radius)
+        latencies.append((time.perf_counter() - started) * 1000)
+        found += any(distance == bin(query ^ int(values[target])).count("1") for _, distance in matches)
+    latencies.sort()
+    typer.echo(
+        f"radius {radius}: p50 {statistics.median(latencies):.3f} ms, "
+        f"p99 {latencies[int(len(latencies) * 0.99)]:.3f} ms, recall {found / queries:.3f}"
+    )
+
+
+if __name__ == "__main__":
+    typer.run(main)
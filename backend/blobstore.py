@@ -0,0 +1,234 @@
+"""Content-addressed storage for uploaded media.
+
+Blobs are keyed by the SHA-256 of their bytes, so identical uploads are
+stored once and documents only need to keep the hex digest around.
+
+An upload that reuses a stored blob marks it as touched. Blob release
+(cleanup.py) deletes with ``min_age``, which keeps a blob written or reused
+since then: the upload's document may not have been inserted yet.
+"""
+import asyncio
+import hashlib
+import os
+import tempfile
+import time
+import uuid
+from contextlib import asynccontextmanager
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+from motor.motor_asyncio import AsyncIOMotorGridFSBucket
+
+CHUNK_SIZE = 1024 * 1024
+
+
+@dataclass
+class BlobRef:
+    sha256: str
+    size: int
+
+
+class BlobNotFound(Exception):
+    pass
+
+
+class BlobStore:
+    """Interface shared by the storage backends."""
+
+    async def put(self, chunks: AsyncIterator[bytes]) -> BlobRef:
+        """Store a stream of bytes and return its content address"""
+        raise NotImplementedError
+
+    async def size(self, sha256: str) -> int:
+        raise NotImplementedError
+
+    async def exists(self, sha256: str) -> bool:
+        raise NotImplementedError
+
+    async def delete(self, sha256: str, min_age: float = 0) -> bool:
+        """Delete a blob unless it was written or reused within min_age seconds; False when it was kept"""
+        raise NotImplementedError
+
+    def open(self, sha256: str, start: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+        """Yield the bytes of a blob, optionally restricted to a byte range"""
+        raise NotImplementedError
+
+    @asynccontextmanager
+    async def local_file(self, sha256: str) -> AsyncIterator[Path]:
+        """Path of a local file with the blob's bytes, for readers that need to seek; a temporary copy by default"""
+        fd, name = tempfile.mkstemp(prefix="blob-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                async for chunk in self.open(sha256):
+                    await asyncio.to_thread(f.write, chunk)
+            yield Path(name)
+        finally:
+            os.unlink(name)
+
+
+class LocalBlobStore(BlobStore):
+    """Stores blobs as files under ``root/ab/cd/<sha256>``."""
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, sha256: str) -> Path:
+        return self.root / sha256[:2] / sha256[2:4] / sha256
+
+    async def put(self, chunks: AsyncIterator[bytes]) -> BlobRef:
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self.tmp_dir / uuid.uuid4().hex
+        f = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                await asyncio.to_thread(f.write, chunk)
+        except BaseException:
+            f.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+        await asyncio.to_thread(f.close)
+
+        sha256 = digest.hexdigest()
+        path = self._path(sha256)
+        if path.exists():
+            # Already stored by an earlier upload with the same bytes
+            tmp_path.unlink(missing_ok=True)
+            os.utime(path)
+        else:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            os.replace(tmp_path, path)
+        return BlobRef(sha256=sha256, size=size)
+
+    async def size(self, sha256: str) -> int:
+        try:
+            return self._path(sha256).stat().st_size
+        except FileNotFoundError:
+            raise BlobNotFound(sha256)
+
+    async def exists(self, sha256: str) -> bool:
+        return self._path(sha256).exists()
+
+    async def delete(self, sha256: str, min_age: float = 0) -> bool:
+        path = self._path(sha256)
+        try:
+            if min_age and time.time() - path.stat().st_mtime < min_age:
+                return False
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        return True
+
+    async def open(self, sha256: str, start: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+        try:
+            f = await asyncio.to_thread(open, self._path(sha256), "rb")
+        except FileNotFoundError:
+            raise BlobNotFound(sha256)
+        try:
+            f.seek(start)
+            remaining = length
+            while remaining is None or remaining > 0:
+                size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+                chunk = await asyncio.to_thread(f.read, size)
+                if not chunk:
+                    break
+                if remaining is not None:
+                    remaining -= len(chunk)
+                yield chunk
+        finally:
+            f.close()
+
+    @asynccontextmanager
+    async def local_file(self, sha256: str) -> AsyncIterator[Path]:
+        path = self._path(sha256)
+        if not path.exists():
+            raise BlobNotFound(sha256)
+        yield path
+
+
+class GridFSBlobStore(BlobStore):
+    """Stores blobs in a GridFS bucket, using the digest as the filename."""
+
+    def __init__(self, db, bucket_name: str = "blobs"):
+        self.db = db
+        self.bucket = AsyncIOMotorGridFSBucket(db, bucket_name=bucket_name, chunk_size_bytes=CHUNK_SIZE)
+        self.files = db[f"{bucket_name}.files"]
+
+    async def _find(self, sha256: str):
+        return await self.files.find_one({"filename": sha256}, {"_id": 1, "length": 1, "uploadDate": 1, "metadata.touched_at": 1})
+
+    async def put(self, chunks: AsyncIterator[bytes]) -> BlobRef:
+        digest = hashlib.sha256()
+        size = 0
+        # The digest is only known once the stream is consumed, so upload
+        # under a temporary name and rename (or discard) afterwards.
+        stream = self.bucket.open_upload_stream(f"tmp-{uuid.uuid4().hex}")
+        try:
+            async for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                await stream.write(chunk)
+        except BaseException:
+            await stream.abort()
+            raise
+        await stream.close()
+
+        sha256 = digest.hexdigest()
+        existing = await self._find(sha256)
+        if existing:
+            await self.bucket.delete(stream._id)
+            await self.files.update_one({"_id": existing["_id"]}, {"$set": {"metadata.touched_at": datetime.utcnow()}})
+        else:
+            await self.bucket.rename(stream._id, sha256)
+        return BlobRef(sha256=sha256, size=size)
+
+    async def size(self, sha256: str) -> int:
+        doc = await self._find(sha256)
+        if not doc:
+            raise BlobNotFound(sha256)
+        return doc["length"]
+
+    async def exists(self, sha256: str) -> bool:
+        return await self._find(sha256) is not None
+
+    async def delete(self, sha256: str, min_age: float = 0) -> bool:
+        doc = await self._find(sha256)
+        if not doc:
+            return True
+        touched = max(doc["uploadDate"], (doc.get("metadata") or {}).get("touched_at") or doc["uploadDate"])
+        if min_age and datetime.utcnow() - touched < timedelta(seconds=min_age):
+            return False
+        await self.bucket.delete(doc["_id"])
+        return True
+
+    async def open(self, sha256: str, start: int = 0, length: Optional[int] = None) -> AsyncIterator[bytes]:
+        doc = await self._find(sha256)
+        if not doc:
+            raise BlobNotFound(sha256)
+        grid_out = await self.bucket.open_download_stream(doc["_id"])
+        grid_out.seek(start)
+        remaining = length
+        while remaining is None or remaining > 0:
+            size = CHUNK_SIZE if remaining is None else min(CHUNK_SIZE, remaining)
+            chunk = await grid_out.read(size)
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def create_blob_store(db, root_dir: Path) -> BlobStore:
+    """Build the blob store selected by the BLOB_STORE environment variable"""
+    backend = os.environ.get("BLOB_STORE", "local")
+    if backend == "local":
+        return LocalBlobStore(Path(os.environ.get("BLOB_ROOT", root_dir / "blobs")))
+    if backend == "gridfs":
+        return GridFSBlobStore(db, os.environ.get("BLOB_BUCKET", "blobs"))
+    raise ValueError(f"Unknown BLOB_STORE backend: {backend}")
@@ -0,0 +1,204 @@
+"""Read-through cache for artist and content metadata.
+
+Only projected metadata is cached, never binary payloads. Lookups that find
+nothing are cached too (for a shorter TTL) so repeated 404s stay off the
+database. Writers invalidate the keys they touch; list pages are keyed by a
+per-artist version number that writers bump instead of deleting pages.
+
+Invalidating a key also counts up its generation. A miss notes the
+generation before it loads and stores the result only if it is unchanged,
+so an invalidation that lands while the database is being read is never
+undone by storing what was read before it. Generations are kept for
+``CACHE_INVALIDATION_WINDOW_SECONDS``, far longer than any load takes.
+
+The in-process backend is a size-bounded LRU with per-entry expiry. Setting
+CACHE_BACKEND=redis shares entries between workers through any client that
+speaks the redis-py asyncio API (a fakeredis client works for local runs).
+"""
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Optional, Tuple
+
+import bson
+
+CACHE_TTL_SECONDS = float(os.environ.get("CACHE_TTL_SECONDS", 30))
+CACHE_NEGATIVE_TTL_SECONDS = float(os.environ.get("CACHE_NEGATIVE_TTL_SECONDS", 5))
+CACHE_MAX_ENTRIES = int(os.environ.get("CACHE_MAX_ENTRIES", 10000))
+CACHE_INVALIDATION_WINDOW_SECONDS = 300
+
+
+class MemoryBackend:
+    """LRU + TTL cache held in this process."""
+
+    def __init__(self, max_entries: int = CACHE_MAX_ENTRIES):
+        self.max_entries = max_entries
+        self.entries: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+        self.versions = {}
+        # key -> (monotonic time of its last invalidation, generation), oldest first
+        self.generations: "OrderedDict[str, Tuple[float, int]]" = OrderedDict()
+        self.evictions = 0
+        self.expirations = 0
+        self.stale_loads = 0
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        entry = self.entries.get(key)
+        if entry is None:
+            return False, None
+        expires_at, value = entry
+        if expires_at < time.monotonic():
+            del self.entries[key]
+            self.expirations += 1
+            return False, None
+        self.entries.move_to_end(key)
+        return True, value
+
+    async def set(self, key: str, value: Any, ttl: float, generation: Optional[int] = None):
+        """Store the value; with a generation, only if the key has not been invalidated since it was read"""
+        if generation is not None and await self.generation(key) != generation:
+            self.stale_loads += 1
+            return
+        self.entries[key] = (time.monotonic() + ttl, value)
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+            self.evictions += 1
+
+    async def delete(self, key: str):
+        self.entries.pop(key, None)
+        now = time.monotonic()
+        _, generation = self.generations.pop(key, (now, 0))
+        self.generations[key] = (now, generation + 1)
+        self._forget_generations(now)
+
+    async def generation(self, key: str) -> int:
+        self._forget_generations(time.monotonic())
+        return self.generations.get(key, (0, 0))[1]
+
+    def _forget_generations(self, now: float):
+        while self.generations:
+            _, (invalidated_at, _) = next(iter(self.generations.items()))
+            if now - invalidated_at < CACHE_INVALIDATION_WINDOW_SECONDS:
+                break
+            self.generations.popitem(last=False)
+
+    async def version(self, key: str) -> int:
+        return self.versions.get(key, 0)
+
+    async def bump(self, key: str):
+        self.versions[key] = self.versions.get(key, 0) + 1
+
+    def stats(self) -> dict:
+        return {"entries": len(self.entries), "evictions": self.evictions, "expirations": self.expirations, "stale_loads": self.stale_loads}
+
+
+# Store ARGV[1] under KEYS[1] for ARGV[2] ms unless the generation in KEYS[2] has moved past ARGV[3]
+_SET_IF_CURRENT_SCRIPT = """
+if tonumber(redis.call('GET', KEYS[2]) or '0') ~= tonumber(ARGV[3]) then return 0 end
+redis.call('SET', KEYS[1], ARGV[1], 'PX', ARGV[2])
+return 1
+"""
+
+
+class RedisBackend:
+    """Shared cache in Redis; values are BSON-encoded so datetimes round-trip."""
+
+    def __init__(self, client, prefix: str = "cache:"):
+        self.client = client
+        self.prefix = prefix
+        self.set_if_current = client.register_script(_SET_IF_CURRENT_SCRIPT)
+
+    async def get(self, key: str) -> Tuple[bool, Any]:
+        raw = await self.client.get(self.prefix + key)
+        if raw is None:
+            return False, None
+        return True, bson.decode(raw)["v"]
+
+    async def set(self, key: str, value: Any, ttl: float, generation: Optional[int] = None):
+        """Store the value; with a generation, only if the key has not been invalidated since it was read"""
+        raw = bson.encode({"v": value})
+        if generation is None:
+            await self.client.set(self.prefix + key, raw, px=int(ttl * 1000))
+        else:
+            await self.set_if_current(keys=[self.prefix + key, self.prefix + "generation:" + key], args=[raw, int(ttl * 1000), generation])
+
+    async def delete(self, key: str):
+        generation_key = self.prefix + "generation:" + key
+        async with self.client.pipeline(transaction=True) as pipe:
+            pipe.delete(self.prefix + key)
+            pipe.incr(generation_key)
+            pipe.expire(generation_key, CACHE_INVALIDATION_WINDOW_SECONDS)
+            await pipe.execute()
+
+    async def generation(self, key: str) -> int:
+        value = await self.client.get(self.prefix + "generation:" + key)
+        return int(value) if value is not None else 0
+
+    async def version(self, key: str) -> int:
+        value = await self.client.get(self.prefix + "version:" + key)
+        return int(value) if value is not None else 0
+
+    async def bump(self, key: str):
+        await self.client.incr(self.prefix + "version:" + key)
+
+    def stats(self) -> dict:
+        # Redis applies its own maxmemory eviction; see INFO stats for those counters
+        return {}
+
+
+class DocumentCache:
+    def __init__(self, backend, ttl: float = CACHE_TTL_SECONDS, negative_ttl: float = CACHE_NEGATIVE_TTL_SECONDS):
+        self.backend = backend
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.hits = 0
+        self.negative_hits = 0
+        self.misses = 0
+
+    async def get_or_load(self, key: str, loader: Callable[[], Awaitable[Optional[Any]]]) -> Optional[Any]:
+        """Return the cached value for key, calling loader on a miss; None results are cached as well"""
+        found, value = await self.backend.get(key)
+        if found:
+            self.hits += 1
+            if value is None:
+                self.negative_hits += 1
+            return value
+        self.misses += 1
+        generation = await self.backend.generation(key)
+        value = await loader()
+        await self.backend.set(key, value, self.ttl if value is not None else self.negative_ttl, generation)
+        return value
+
+    async def invalidate(self, *keys: str):
+        for key in keys:
+            await self.backend.delete(key)
+
+    async def version(self, key: str) -> int:
+        return await self.backend.version(key)
+
+    async def bump(self, key: str):
+        await self.backend.bump(key)
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {
+            "backend": type(self.backend).__name__,
+            "hits": self.hits,
+            "negative_hits": self.negative_hits,
+            "misses": self.misses,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+            **self.backend.stats(),
+        }
+
+
+def create_cache(redis_client=None) -> DocumentCache:
+    """Build the cache selected by the CACHE_BACKEND environment variable"""
+    backend = os.environ.get("CACHE_BACKEND", "memory")
+    if backend == "memory":
+        return DocumentCache(MemoryBackend())
+    if backend == "redis":
+        if redis_client is None:
+            import redis.asyncio
+            redis_client = redis.asyncio.from_url(os.environ.get("REDIS_URL", "redis://localhost:6379/0"))
+        return DocumentCache(RedisBackend(redis_client))
+    raise ValueError(f"Unknown CACHE_BACKEND: {backend}")
@@ -0,0 +1,231 @@
+"""Artist deletion, blob release and the orphaned content collector.
+
+Deleting an artist removes the artist document and its counters first, then
+their content in batches of ``ARTIST_DELETE_BATCH_SIZE``: one indexed read
+of the next batch (``artist_created_at__id``), one ``delete_many`` by
+``_id`` and one tag count update. On a replica set each batch is a
+transaction, so two deletions racing over the same content cannot both
+decrement its tags; a standalone server runs the same steps without one.
+Every batch is a few bounded round trips, so even an artist with 100k
+items never holds the event loop; ``DELETE /api/artists/{id}`` does the
+first ``ARTIST_DELETE_INLINE_BATCHES`` and leaves the rest to a
+``purge_artist`` job.
+
+Blobs are content addressed and shared by identical uploads, so deleting a
+document never deletes its files: their ids go into a ``release_blobs`` job,
+which deletes each blob that no document or open upload session references
+any more. An upload reuses a stored blob before it inserts the document
+that refers to it, so blobs written or reused in the last
+``BLOB_RELEASE_GRACE_SECONDS`` are kept and checked again once that has
+passed.
+
+Content whose artist is gone (a purge interrupted before its job was
+queued, or an upload that raced the deletion) is found by
+``collect_orphans``, a job that reschedules itself every
+``GC_INTERVAL_SECONDS``. It lists the distinct ``artist_id`` values of
+content off the index and ``$lookup``s each one against the artists' ``_id``
+index, so it reads one key per artist, not every document. The same job
+expires chunked upload sessions past their ``expires_at`` and releases
+their parts.
+"""
+import logging
+import os
+from datetime import datetime, timedelta
+from typing import Iterable, List, Optional, Tuple
+
+from database import in_transaction, is_replica_set
+from jobs import enqueue, ensure_queued
+from schema import ARTISTS, CONTENT, id_str
+from tags import record_tags
+from uploads import UPLOAD_COMPLETE_LEASE_SECONDS
+
+logger = logging.getLogger(__name__)
+
+ARTIST_DELETE_BATCH_SIZE = int(os.environ.get("ARTIST_DELETE_BATCH_SIZE", 1000))
+# Batches deleted within the DELETE request; anything left is purged by a job
+ARTIST_DELETE_INLINE_BATCHES = int(os.environ.get("ARTIST_DELETE_INLINE_BATCHES", 5))
+GC_INTERVAL_SECONDS = float(os.environ.get("GC_INTERVAL_SECONDS", 3600))
+BLOB_RELEASE_GRACE_SECONDS = float(os.environ.get("BLOB_RELEASE_GRACE_SECONDS", 900))
+
+PURGE_ARTIST = "purge_artist"
+RELEASE_BLOBS = "release_blobs"
+COLLECT_ORPHANS = "collect_orphans"
+
+_PURGE_PROJECTION = {"_id": 1, "id": 1, "blob_id": 1, "renditions.blob_id": 1, "tags": 1}
+
+# Everything that can hold a blob: a blob is only deleted once none of these match it
+_BLOB_REFERENCES = (
+    ("content", "blob_id", {}),
+    ("content", "renditions.blob_id", {}),
+    ("artists", "profile_image_blob", {}),
+    ("artists", "profile_renditions.blob_id", {}),
+    # A completing session is still reading its parts
+    ("upload_sessions", "part_blobs", {"status": {"$in": ["open", "completing"]}}),
+)
+
+
+def blob_ids(docs: Iterable[dict]) -> List[str]:
+    """The blobs of content or artist documents, renditions included"""
+    found = {}
+    for doc in docs:
+        for key in (doc.get("blob_id"), doc.get("profile_image_blob")):
+            if key:
+                found[key] = None
+        for rendition in (doc.get("renditions") or []) + (doc.get("profile_renditions") or []):
+            found[rendition["blob_id"]] = None
+    return list(found)
+
+
+async def release_unreferenced(db, blob_store, keys: Iterable[str]) -> int:
+    """Delete the blobs nothing references any more; returns how many were deleted"""
+    unreferenced = set(keys)
+    for collection, field, extra in _BLOB_REFERENCES:
+        if not unreferenced:
+            break
+        referenced = await db[collection].distinct(field, {field: {"$in": list(unreferenced)}, **extra})
+        unreferenced.difference_update(referenced)
+    deleted, recent = 0, []
+    for key in unreferenced:
+        if await blob_store.delete(key, min_age=BLOB_RELEASE_GRACE_SECONDS):
+            deleted += 1
+        else:
+            recent.append(key)
+    if recent:
+        await enqueue(db, RELEASE_BLOBS, {"blob_ids": recent}, delay=BLOB_RELEASE_GRACE_SECONDS)
+    return deleted
+
+
+async def queue_release(db, docs: Iterable[dict]):
+    """Release the blobs of deleted documents in a job"""
+    keys = blob_ids(docs)
+    if keys:
+        await enqueue(db, RELEASE_BLOBS, {"blob_ids": keys})
+
+
+async def delete_artist(ctx, artist_id: str) -> Optional[dict]:
+    """Delete an artist with their counters and queue their profile image; their content is left to purge_artist_content"""
+    async def run(session):
+        artist = await ctx.db.artists.find_one_and_delete(
+            ARTISTS.id_query(artist_id),
+            {"_id": 1, "id": 1, "profile_image_blob": 1, "profile_renditions.blob_id": 1},
+            session=session
+        )
+        if artist:
+            await ctx.db.artist_stats.delete_one({"artist_id": artist_id}, session=session)
+        return artist
+
+    artist = ARTISTS.decode(await in_transaction(ctx.db.client, run, await is_replica_set(ctx.db.client)))
+    if artist:
+        await ctx.cache.invalidate(f"artist:{artist_id}")
+        await queue_release(ctx.db, [artist])
+        if ctx.publish:
+            ctx.publish("artists", "deleted", artist_id)
+    return artist
+
+
+async def _delete_batch(db, query: dict, transactional: bool) -> List[dict]:
+    async def run(session):
+        # Read inside the transaction: content another deletion already took conflicts and is read again
+        docs = await db.content.find(query, _PURGE_PROJECTION, session=session).limit(ARTIST_DELETE_BATCH_SIZE).to_list(ARTIST_DELETE_BATCH_SIZE)
+        if docs:
+            await db.content.delete_many({"_id": {"$in": [doc["_id"] for doc in docs]}}, session=session)
+            await record_tags(db, [tag for doc in docs for tag in doc.get("tags", [])], -1, session=session)
+        return docs
+
+    return CONTENT.decode_many(await in_transaction(db.client, run, transactional))
+
+
+async def purge_artist_content(ctx, artist_id: str, max_batches: Optional[int] = None) -> Tuple[int, bool]:
+    """Delete an artist's content batch by batch; returns how many items went and whether none are left"""
+    transactional = await is_replica_set(ctx.db.client)
+    query = CONTENT.ref_query("artist_id", artist_id)
+    deleted = batches = 0
+    done = False
+    try:
+        while not done and (max_batches is None or batches < max_batches):
+            docs = await _delete_batch(ctx.db, query, transactional)
+            batches += 1
+            deleted += len(docs)
+            done = len(docs) < ARTIST_DELETE_BATCH_SIZE
+            await queue_release(ctx.db, docs)
+            for doc in docs:
+                await ctx.cache.invalidate(f"content:{doc['id']}")
+                if ctx.publish:
+                    ctx.publish("content", "deleted", doc["id"])
+    finally:
+        if deleted:
+            await ctx.cache.bump(f"artist_content:{artist_id}")
+    if done:
+        # Content uploaded while the artist was being deleted may have recreated the counters
+        await ctx.db.artist_stats.delete_one({"artist_id": artist_id})
+    return deleted, done
+
+
+async def find_orphaned_artists(db) -> List[str]:
+    """Ids that content refers to as its artist_id but no artist has"""
+    pipeline = [
+        # The sort lets the group read one index key per artist (DISTINCT_SCAN on artist_created_at__id)
+        {"$sort": {"artist_id": 1}},
+        {"$group": {"_id": "$artist_id"}},
+        {"$lookup": {"from": "artists", "localField": "_id", "foreignField": "_id", "as": "artist"}},
+        {"$match": {"artist": {"$size": 0}}},
+        {"$project": {"_id": 1}},
+    ]
+    orphans = {id_str(row["_id"]) async for row in db.content.aggregate(pipeline) if row["_id"] is not None}
+    if ARTISTS.legacy and orphans:
+        # v1 artists and v1 artist_id values do not match on _id; look those up by either form
+        for artist in await db.artists.find(ARTISTS.ids_query(list(orphans)), {"_id": 1, "id": 1}).to_list(None):
+            orphans.discard(ARTISTS.decode(artist)["id"])
+    return sorted(orphans)
+
+
+async def expire_upload_sessions(db) -> int:
+    """Mark upload sessions past expires_at expired and queue their parts for release"""
+    now = datetime.utcnow()
+    stale = now - timedelta(seconds=UPLOAD_COMPLETE_LEASE_SECONDS)
+    query = {
+        "status": {"$in": ["open", "completing"]},
+        "expires_at": {"$lte": now},
+    }
+    expired = 0
+    async for session in db.upload_sessions.find(query, {"_id": 0, "id": 1, "status": 1, "updated_at": 1, "part_blobs": 1}):
+        if session["status"] == "completing" and session["updated_at"] >= stale:
+            continue  # still being completed
+        # Queued first: should the update not go through, the still open session keeps the parts referenced
+        await queue_release(db, [{"blob_id": key} for key in session["part_blobs"]])
+        result = await db.upload_sessions.update_one(
+            {"id": session["id"], "status": session["status"], "updated_at": session["updated_at"]},
+            {"$set": {"status": "expired", "updated_at": now}}
+        )
+        expired += result.modified_count
+    return expired
+
+
+async def purge_artist(ctx, payload: dict):
+    """Delete the rest of a deleted artist's content"""
+    if await ctx.db.artists.find_one(ARTISTS.id_query(payload["artist_id"]), {"_id": 1}):
+        logger.warning("Artist %s exists; not purging their content", payload["artist_id"])
+        return
+    deleted, _ = await purge_artist_content(ctx, payload["artist_id"])
+    logger.info("Purged %d content items of deleted artist %s", deleted, payload["artist_id"])
+
+
+async def release_blobs(ctx, payload: dict):
+    await release_unreferenced(ctx.db, ctx.blob_store, payload["blob_ids"])
+
+
+async def collect_orphans(ctx, payload: dict):
+    """Purge content whose artist no longer exists and expire stale upload sessions, then run again in GC_INTERVAL_SECONDS"""
+    # Schedule the next run first, so a failing run does not end the schedule
+    await ensure_queued(ctx.db, COLLECT_ORPHANS, delay=GC_INTERVAL_SECONDS)
+    for artist_id in await find_orphaned_artists(ctx.db):
+        deleted, _ = await purge_artist_content(ctx, artist_id)
+        logger.info("Collected %d orphaned content items of artist %s", deleted, artist_id)
+    expired = await expire_upload_sessions(ctx.db)
+    if expired:
+        logger.info("Expired %d upload sessions", expired)
+
+
+async def schedule_collector(db):
+    """Queue the orphan collector unless a run is already waiting; called when a worker starts"""
+    await ensure_queued(db, COLLECT_ORPHANS)
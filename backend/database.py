@@ -0,0 +1,103 @@
+"""MongoDB client configuration.
+
+Connection settings are read from the environment (server.py loads
+``backend/.env`` first) when the client is created in the app's lifespan,
+not at import time, so importing the app never touches the network.
+
+List and search endpoints read through a second database handle with
+``MONGO_LIST_READ_PREFERENCE`` (secondaryPreferred by default), and every
+read carries a ``max_time_ms`` budget so a slow query fails fast with a 503
+instead of holding a pooled connection.
+"""
+import importlib.util
+import logging
+import os
+from typing import List, Optional
+
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo.read_preferences import Nearest, Primary, PrimaryPreferred, Secondary, SecondaryPreferred
+
+logger = logging.getLogger(__name__)
+
+# Server-side time budgets (maxTimeMS) per kind of read
+LOOKUP_TIME_MS = int(os.environ.get("MONGO_LOOKUP_TIME_MS", 1000))
+LIST_TIME_MS = int(os.environ.get("MONGO_LIST_TIME_MS", 3000))
+SEARCH_TIME_MS = int(os.environ.get("MONGO_SEARCH_TIME_MS", 5000))
+# How long /api/healthz waits for a ping before reporting the database unavailable
+HEALTHZ_TIMEOUT_SECONDS = float(os.environ.get("HEALTHZ_TIMEOUT_SECONDS", 2))
+
+_READ_PREFERENCES = {
+    "primary": Primary,
+    "primaryPreferred": PrimaryPreferred,
+    "secondary": Secondary,
+    "secondaryPreferred": SecondaryPreferred,
+    "nearest": Nearest,
+}
+
+# Wire compressors and the module pymongo needs for each
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+
+def available_compressors(requested: str) -> List[str]:
+    """Keep the requested compressors whose module is installed, in order of preference"""
+    names = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in names if name not in _COMPRESSOR_MODULES]
+    if unknown:
+        raise ValueError(f"Unknown MONGO_COMPRESSORS: {', '.join(unknown)}")
+    available = [name for name in names if importlib.util.find_spec(_COMPRESSOR_MODULES[name])]
+    skipped = [name for name in names if name not in available]
+    if skipped:
+        logger.info("Wire compression %s not installed, skipping", ", ".join(skipped))
+    return available
+
+
+def list_read_preference():
+    """Read preference for list and search queries, which tolerate slightly stale data"""
+    mode = os.environ.get("MONGO_LIST_READ_PREFERENCE", "secondaryPreferred")
+    if mode not in _READ_PREFERENCES:
+        raise ValueError(f"Unknown MONGO_LIST_READ_PREFERENCE: {mode}")
+    max_staleness = int(os.environ.get("MONGO_MAX_STALENESS_SECONDS", -1))
+    if mode == "primary" or max_staleness < 0:
+        return _READ_PREFERENCES[mode]()
+    return _READ_PREFERENCES[mode](max_staleness=max_staleness)
+
+
+def client_options() -> dict:
+    options = {
+        "minPoolSize": int(os.environ.get("MONGO_MIN_POOL_SIZE", 0)),
+        "maxPoolSize": int(os.environ.get("MONGO_MAX_POOL_SIZE", 100)),
+        # How long a request waits for a free pooled connection before failing
+        "waitQueueTimeoutMS": int(os.environ.get("MONGO_WAIT_QUEUE_TIMEOUT_MS", 2000)),
+        "serverSelectionTimeoutMS": int(os.environ.get("MONGO_SERVER_SELECTION_TIMEOUT_MS", 5000)),
+        "connectTimeoutMS": int(os.environ.get("MONGO_CONNECT_TIMEOUT_MS", 5000)),
+    }
+    compressors = available_compressors(os.environ.get("MONGO_COMPRESSORS", "zstd,snappy,zlib"))
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+    return options
+
+
+def create_client(event_listeners: Optional[list] = None) -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(os.environ['MONGO_URL'], event_listeners=event_listeners or [], **client_options())
+
+
+async def check_connection(client):
+    """Fail startup quickly when no server can be reached"""
+    await client.admin.command("ping")
+
+
+async def is_replica_set(client) -> bool:
+    """Whether the deployment supports change streams and transactions (a replica set or sharded cluster)"""
+    try:
+        hello = await client.admin.command("hello")
+    except Exception:
+        return False
+    return "setName" in hello or hello.get("msg") == "isdbgrid"
+
+
+async def in_transaction(client, callback, transactional: bool):
+    """Await callback(session) in a transaction, retried on transient errors; callback(None) when not transactional"""
+    if not transactional:
+        return await callback(None)
+    async with await client.start_session() as session:
+        return await session.with_transaction(callback)
@@ -0,0 +1,272 @@
+"""Live artist/content change events for ``/api/feed``.
+
+One ``FeedHub`` per process turns writes into events and fans them out to
+every connected client, so the database sees one reader per process instead
+of one poller per client. Events come from a MongoDB change stream when the
+server is a replica set or sharded cluster, which also carries writes made
+by other API processes and job workers. Otherwise the endpoints publish
+their own writes in-process; that fallback only covers the current process.
+
+Every event has an id that clients send back (``Last-Event-ID``) when they
+reconnect. Recent events are kept in a ring buffer and replayed from there;
+a client whose id is no longer buffered, or comes from before a restart,
+gets a ``reset`` event and should reload its lists.
+"""
+import asyncio
+import logging
+import os
+import uuid
+from collections import deque
+from datetime import datetime
+from typing import AsyncIterator, Callable, Dict, Optional
+
+import orjson
+from bson import ObjectId
+from fastapi import HTTPException
+from pymongo.errors import OperationFailure, PyMongoError
+
+from database import is_replica_set
+from schema import id_str
+
+logger = logging.getLogger(__name__)
+
+FEED_SOURCE = os.environ.get("FEED_SOURCE", "auto")  # auto, changestream, local
+FEED_BUFFER_SIZE = int(os.environ.get("FEED_BUFFER_SIZE", 10000))
+FEED_QUEUE_SIZE = int(os.environ.get("FEED_QUEUE_SIZE", 1000))
+FEED_HEARTBEAT_SECONDS = float(os.environ.get("FEED_HEARTBEAT_SECONDS", 15))
+
+ENTITIES = {"artists": "artist", "content": "content"}
+_OPERATIONS = {"insert": "created", "update": "updated", "replace": "updated", "delete": "deleted"}
+# Never ship inline binary payloads in events
+_EXCLUDED_FIELDS = ("file_data", "profile_image")
+# Excluded payloads whose presence events still report, as summaries show it
+_PRESENCE_FLAGS = {"profile_image": "has_profile_image"}
+# ChangeStreamFatalError, ChangeStreamHistoryLost
+_HISTORY_LOST = (280, 286)
+
+
+class Event:
+    __slots__ = ("id", "type", "entity", "payload")
+
+    def __init__(self, event_id: str, entity: str, op: str, entity_id, data: Optional[dict]):
+        self.id = event_id
+        self.type = f"{entity}.{op}"
+        self.entity = entity
+        # Encoded once, however many clients receive it
+        self.payload = orjson.dumps({"id": event_id, "type": self.type, "entity_id": entity_id, "data": data}).decode()
+
+
+class Subscription:
+    def __init__(self, entities):
+        self.entities = set(entities)
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=FEED_QUEUE_SIZE)
+        self.overflowed = False
+        self.closed = False
+
+    def offer(self, event: Event):
+        if (event.entity not in self.entities and event.entity != "feed") or self.overflowed:
+            return
+        try:
+            self.queue.put_nowait(event)
+        except asyncio.QueueFull:
+            # A client this far behind is told to reload rather than slowing everyone down
+            self.overflowed = True
+
+    def close(self):
+        self.closed = True
+        try:
+            # Wake a subscriber waiting on an empty queue
+            self.queue.put_nowait(None)
+        except asyncio.QueueFull:
+            pass
+
+
+class FeedHub:
+    def __init__(self, serializers: Dict[str, Callable[[dict], dict]]):
+        self.serializers = serializers
+        self.boot_id = uuid.uuid4().hex[:8]
+        self.sequence = 0
+        self.buffer: deque = deque(maxlen=FEED_BUFFER_SIZE)
+        self.subscribers = set()
+        self.mode = "local"
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self, db):
+        """Pick the event source and, for change streams, start the single reader"""
+        mode = FEED_SOURCE
+        if mode == "auto":
+            mode = "changestream" if await is_replica_set(db.client) else "local"
+        self.mode = mode
+        if mode == "changestream":
+            await _enable_pre_images(db)
+            self._task = asyncio.create_task(self._watch(db))
+        logger.info("Feed events from %s", "change streams" if mode == "changestream" else "in-process publishing")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+
+    def close(self):
+        """End every open subscription, so a draining worker is not held up by long-lived streams"""
+        for subscription in self.subscribers:
+            subscription.close()
+
+    def publish(self, collection: str, op: str, entity_id: str, doc: Optional[dict] = None):
+        """Record a write made by this process; a no-op when change streams deliver writes instead"""
+        if self.mode != "local":
+            return
+        self.sequence += 1
+        self._dispatch(Event(f"{self.boot_id}-{self.sequence}", ENTITIES[collection], op, entity_id, self._serialize(collection, doc)))
+
+    def _serialize(self, collection: str, doc: Optional[dict]) -> Optional[dict]:
+        if doc is None:
+            return None
+        # Serializers take stored documents as well as API-shaped ones
+        data = {k: v for k, v in doc.items() if k not in _EXCLUDED_FIELDS}
+        for field, flag in _PRESENCE_FLAGS.items():
+            if field in doc:
+                data[flag] = bool(doc[field])
+        return self.serializers[ENTITIES[collection]](data)
+
+    def _dispatch(self, event: Event, buffered: bool = True):
+        if buffered:
+            self.buffer.append(event)
+        for subscription in self.subscribers:
+            subscription.offer(event)
+
+    async def _watch(self, db):
+        pipeline = [
+            {"$match": {"ns.coll": {"$in": list(ENTITIES)}, "operationType": {"$in": list(_OPERATIONS)}}},
+            # Report inline payloads: a v1 base64 string or a v2 Binary (which sorts after strings) is > ""
+            {"$set": {"fullDocument": {"$cond": [
+                {"$eq": [{"$type": "$fullDocument"}, "object"]},
+                {"$mergeObjects": ["$fullDocument", {
+                    flag: {"$gt": [{"$ifNull": [f"$fullDocument.{field}", ""]}, ""]} for field, flag in _PRESENCE_FLAGS.items()
+                }]},
+                "$fullDocument",
+            ]}}},
+            {"$project": {f"{side}.{field}": 0 for side in ("fullDocument", "fullDocumentBeforeChange") for field in _EXCLUDED_FIELDS}},
+        ]
+        resume_token = None
+        while True:
+            try:
+                async with db.watch(
+                    pipeline,
+                    full_document="updateLookup",
+                    full_document_before_change="whenAvailable",
+                    resume_after=resume_token
+                ) as stream:
+                    async for change in stream:
+                        resume_token = change["_id"]
+                        self._dispatch(self._change_event(change))
+            except asyncio.CancelledError:
+                raise
+            except OperationFailure as e:
+                if e.code not in _HISTORY_LOST:
+                    logger.exception("Change stream failed, reopening")
+                    await asyncio.sleep(1)
+                    continue
+                # The oplog no longer reaches back to our token: start over and have clients reload
+                logger.warning("Change stream history lost, restarting from now")
+                resume_token = None
+                self.buffer.clear()
+                self._dispatch(reset_event(), buffered=False)
+            except PyMongoError:
+                # The driver already retries resumable errors once; back off before reopening
+                logger.exception("Change stream interrupted, reopening")
+                await asyncio.sleep(1)
+
+    def _change_event(self, change: dict) -> Event:
+        collection = change["ns"]["coll"]
+        op = _OPERATIONS[change["operationType"]]
+        doc = change.get("fullDocument")
+        before = change.get("fullDocumentBeforeChange")
+        key = change["documentKey"]["_id"]
+        if isinstance(key, ObjectId):
+            # A schema v1 document; deletes without a pre-image only carry the ObjectId
+            entity_id = (doc or before or {}).get("id") or str(key)
+        else:
+            entity_id = id_str(key)
+        return Event(change["_id"]["_data"], ENTITIES[collection], op, entity_id, self._serialize(collection, doc) if op != "deleted" else None)
+
+    async def subscribe(self, entities, last_event_id: Optional[str] = None, heartbeat: Optional[float] = None) -> AsyncIterator[Optional[Event]]:
+        """Yield events for the given entities, first replaying those after last_event_id
+
+        With a heartbeat interval, None is yielded whenever that long passes without an event.
+        """
+        subscription = Subscription(entities)
+        # Registering and snapshotting the buffer happen without an await in between,
+        # so every event is either replayed or queued, never both or neither
+        self.subscribers.add(subscription)
+        try:
+            if last_event_id:
+                replay = self._replay(last_event_id)
+                if replay is None:
+                    yield reset_event()
+                else:
+                    for event in replay:
+                        if event.entity in subscription.entities:
+                            yield event
+            while True:
+                if subscription.overflowed and subscription.queue.empty():
+                    yield reset_event()
+                    return
+                try:
+                    event = await asyncio.wait_for(subscription.queue.get(), heartbeat)
+                except asyncio.TimeoutError:
+                    yield None
+                    continue
+                if subscription.closed:
+                    # Clients reconnect with Last-Event-ID, to another worker
+                    return
+                yield event
+        finally:
+            self.subscribers.discard(subscription)
+
+    def _replay(self, last_event_id: str):
+        """Buffered events after last_event_id, or None when it is unknown"""
+        events = list(self.buffer)
+        for index, event in enumerate(events):
+            if event.id == last_event_id:
+                return events[index + 1:]
+        return None
+
+
+def parse_entities(entities: str) -> set:
+    wanted = {entity.strip() for entity in entities.split(",") if entity.strip()}
+    unknown = wanted - set(ENTITIES.values())
+    if unknown or not wanted:
+        raise HTTPException(status_code=400, detail=f"entities must be a subset of: {', '.join(ENTITIES.values())}")
+    return wanted
+
+
+async def sse_stream(events: AsyncIterator[Optional[Event]]) -> AsyncIterator[str]:
+    """Format events as Server-Sent Events, with comment lines as heartbeats"""
+    try:
+        yield "retry: 3000\n\n"
+        async for event in events:
+            if event is None:
+                yield ": ping\n\n"
+            else:
+                yield f"id: {event.id}\nevent: {event.type}\ndata: {event.payload}\n\n"
+    finally:
+        # Unsubscribe as soon as the client goes away
+        await events.aclose()
+
+
+def reset_event() -> Event:
+    return Event("", "feed", "reset", None, {"at": datetime.utcnow().isoformat()})
+
+
+async def _enable_pre_images(db):
+    """Best effort: pre-images let delete events carry the API id (MongoDB 6.0+)"""
+    for collection in ENTITIES:
+        try:
+            await db.command("collMod", collection, changeStreamPreAndPostImages={"enabled": True})
+        except OperationFailure as e:
+            logger.info("Pre-images unavailable for %s: %s", collection, e)
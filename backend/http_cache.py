@@ -0,0 +1,83 @@
+"""Conditional GET support: ETags, Last-Modified and Cache-Control.
+
+Blob-backed media is addressed by its SHA-256, which doubles as a strong
+ETag. JSON documents derive theirs from ``id`` and ``updated_at``, and list
+pages from the documents they contain, so a revalidation costs one indexed
+query and no serialization. List pages send no Last-Modified: removing an
+item does not make any remaining one newer, so only the ETag can tell.
+"""
+import hashlib
+from datetime import datetime, timezone
+from email.utils import format_datetime, parsedate_to_datetime
+from typing import Iterable, Optional
+
+from fastapi import Request, Response
+
+# Media that never changes once uploaded (originals and their thumbnails)
+IMMUTABLE = "public, max-age=31536000, immutable"
+# Anything that can change in place must be revalidated before reuse
+REVALIDATE = "no-cache"
+
+
+def blob_etag(sha256: str) -> str:
+    return f'"{sha256}"'
+
+
+def _digest_etag(parts: Iterable[str]) -> str:
+    digest = hashlib.sha256()
+    for part in parts:
+        digest.update(part.encode())
+        digest.update(b"\0")
+    return f'"{digest.hexdigest()[:32]}"'
+
+
+def document_etag(doc: dict) -> str:
+    return _digest_etag([doc["id"], _timestamp(doc.get("updated_at"))])
+
+
+def list_etag(docs: list) -> str:
+    return _digest_etag(f"{doc.get('id')}@{_timestamp(doc.get('updated_at'))}" for doc in docs)
+
+
+def _timestamp(value) -> str:
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+
+def _as_utc(value: datetime) -> datetime:
+    # Stored datetimes are naive UTC
+    if value.tzinfo is None:
+        value = value.replace(tzinfo=timezone.utc)
+    return value.replace(microsecond=0)
+
+
+def is_not_modified(request: Request, etag: str, modified: Optional[datetime] = None) -> bool:
+    """Evaluate If-None-Match, falling back to If-Modified-Since when it is absent"""
+    if_none_match = request.headers.get("if-none-match")
+    if if_none_match is not None:
+        if if_none_match.strip() == "*":
+            return True
+        candidates = [tag.strip() for tag in if_none_match.split(",")]
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+    if_modified_since = request.headers.get("if-modified-since")
+    if if_modified_since and modified is not None:
+        try:
+            since = parsedate_to_datetime(if_modified_since)
+        except (TypeError, ValueError):
+            return False
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+        return _as_utc(modified) <= since
+    return False
+
+
+def cache_headers(etag: str, modified: Optional[datetime] = None, cache_control: str = REVALIDATE) -> dict:
+    headers = {"ETag": etag, "Cache-Control": cache_control}
+    if modified is not None:
+        headers["Last-Modified"] = format_datetime(_as_utc(modified), usegmt=True)
+    return headers
+
+
+def not_modified(etag: str, modified: Optional[datetime] = None, cache_control: str = REVALIDATE) -> Response:
+    return Response(status_code=304, headers=cache_headers(etag, modified, cache_control))
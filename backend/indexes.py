@@ -0,0 +1,247 @@
+"""Index plan for every query shape used by server.py.
+
+``ensure_indexes`` is run at startup and is safe to repeat; it fails startup when
+an index in ``REQUIRED_INDEXES`` cannot be built, since the app relies on those
+for correctness (``python indexes.py duplicates`` lists the artists blocking
+``email_unique``). ``explain_query_shapes``
+runs each representative query through ``explain`` and flags collection scans;
+it backs ``GET /api/admin/explain`` and the ``python indexes.py explain`` command.
+"""
+import asyncio
+import logging
+import os
+from datetime import datetime
+from pathlib import Path
+
+from pymongo import ASCENDING, DESCENDING, IndexModel
+from pymongo.errors import OperationFailure
+
+from jobs import JOBS_RETENTION_SECONDS
+from schema import id_str, uuid_value
+from search import ARTIST_SEARCH_WEIGHTS, CONTENT_SEARCH_WEIGHTS, text_index
+from status_checks import STATUS_RETENTION_SECONDS
+from uploads import UPLOAD_SESSION_RETENTION_SECONDS
+
+logger = logging.getLogger(__name__)
+
+INDEX_PLAN = {
+    "artists": [
+        # Lookups use _id (schema v2); this only holds v1 documents not migrated yet, and
+        # stays so detect_legacy never scans the collection
+        IndexModel([("id", ASCENDING)], name="legacy_id", unique=True, sparse=True),
+        # create_artist duplicate check; unique so concurrent creates cannot both succeed
+        IndexModel([("email", ASCENDING)], name="email_unique", unique=True),
+        # get_all_artists keyset pagination
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at__id"),
+        # release_blob reference check
+        IndexModel([("profile_image_blob", ASCENDING)], name="profile_image_blob", sparse=True),
+        IndexModel([("profile_renditions.blob_id", ASCENDING)], name="profile_renditions_blob_id", sparse=True),
+        # get_all_artists?search=
+        text_index(ARTIST_SEARCH_WEIGHTS),
+    ],
+    "content": [
+        IndexModel([("id", ASCENDING)], name="legacy_id", unique=True, sparse=True),
+        # get_artist_content and get_all_content?artist_id=; also the batches of an artist purge and
+        # the orphan collector's distinct artist ids (see cleanup.py)
+        IndexModel([("artist_id", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="artist_created_at__id"),
+        # get_all_content keyset pagination
+        IndexModel([("created_at", DESCENDING), ("_id", DESCENDING)], name="created_at__id"),
+        # get_all_content?tags= (multikey); tag pages are served in keyset order without a sort
+        IndexModel([("tags", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="tags_created_at__id"),
+        # get_all_content?media_kind= and duration ranges; duration trails the keyset fields so the
+        # range is checked on index keys while pages still come out in keyset order
+        IndexModel([("media_kind", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING), ("duration", ASCENDING)], name="media_kind_created_at__id_duration"),
+        # SimilarityIndex refresh; only image content has a hash
+        IndexModel([("hashed_at", ASCENDING)], name="hashed_at", sparse=True),
+        # get_all_content?orientation=
+        IndexModel([("orientation", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], name="orientation_created_at__id"),
+        # release_blob reference check
+        IndexModel([("blob_id", ASCENDING)], name="blob_id", sparse=True),
+        IndexModel([("renditions.blob_id", ASCENDING)], name="renditions_blob_id", sparse=True),
+        # get_all_content?search=
+        text_index(CONTENT_SEARCH_WEIGHTS),
+    ],
+    "artist_stats": [
+        # get_artist_stats and get_all_artists?with_stats=true; one counter document per artist
+        IndexModel([("artist_id", ASCENDING)], name="artist_id_unique", unique=True),
+    ],
+    "tag_counts": [
+        IndexModel([("tag", ASCENDING)], name="tag_unique", unique=True),
+        # get_tags: covers the popularity sort, the prefix filter and the projection
+        IndexModel([("count", DESCENDING), ("tag", ASCENDING)], name="count_tag"),
+    ],
+    "jobs": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        # claim: due queued jobs, and running jobs whose lease expired
+        IndexModel([("status", ASCENDING), ("type", ASCENDING), ("run_at", ASCENDING)], name="status_type_run_at"),
+        IndexModel([("status", ASCENDING), ("type", ASCENDING), ("locked_until", ASCENDING)], name="status_type_locked_until"),
+        # Finished jobs expire; queued and running ones have no finished_at
+        IndexModel([("finished_at", ASCENDING)], name="finished_at_ttl", expireAfterSeconds=JOBS_RETENTION_SECONDS),
+    ],
+    "upload_sessions": [
+        IndexModel([("id", ASCENDING)], name="id_unique", unique=True),
+        IndexModel([("part_blobs", ASCENDING)], name="part_blobs"),
+        # expire_upload_sessions: open sessions past expires_at
+        IndexModel([("status", ASCENDING), ("expires_at", ASCENDING)], name="status_expires_at"),
+        # Expired sessions were swept long before this removes them
+        IndexModel([("expires_at", ASCENDING)], name="expires_at_ttl", expireAfterSeconds=UPLOAD_SESSION_RETENTION_SECONDS),
+    ],
+    "status_checks": [
+        # Bounds the collection: checks expire after STATUS_RETENTION_SECONDS
+        IndexModel([("timestamp", ASCENDING)], name="timestamp_ttl", expireAfterSeconds=STATUS_RETENTION_SECONDS),
+        # get_status_checks keyset pagination, for all clients and for one
+        IndexModel([("timestamp", DESCENDING), ("_id", DESCENDING)], name="timestamp__id"),
+        IndexModel([("client_name", ASCENDING), ("timestamp", DESCENDING), ("_id", DESCENDING)], name="client_name_timestamp__id"),
+    ],
+}
+
+# Schema v1 indexes on the string id; the unique one would reject v2 documents, which have no id field
+OBSOLETE_INDEXES = {
+    "artists": ["id_unique", "created_at_id"],
+    "content": ["id_unique", "artist_created_at_id", "created_at_id", "tags_created_at_id"],
+}
+
+# Representative (collection, filter, sort) for each query the API issues
+_SAMPLE_ID = "00000000-0000-0000-0000-000000000000"
+_SAMPLE_UUID = uuid_value(_SAMPLE_ID)
+_SAMPLE_DATE = datetime(2000, 1, 1)
+_SAMPLE_KEYSET = {
+    "$or": [
+        {"created_at": {"$lt": _SAMPLE_DATE}},
+        {"created_at": _SAMPLE_DATE, "_id": {"$lt": _SAMPLE_UUID}},
+    ]
+}
+_KEYSET_SORT = [("created_at", DESCENDING), ("_id", DESCENDING)]
+
+QUERY_SHAPES = {
+    "artist_by_id": ("artists", {"_id": _SAMPLE_UUID}, None),
+    "artist_by_email": ("artists", {"email": "someone@example.com"}, None),
+    "artist_list": ("artists", {}, _KEYSET_SORT),
+    "artist_list_after_cursor": ("artists", _SAMPLE_KEYSET, _KEYSET_SORT),
+    "artist_search": ("artists", {"$text": {"$search": "painter"}}, None),
+    "artist_by_profile_blob": ("artists", {"$or": [{"profile_image_blob": "0" * 64}, {"profile_renditions.blob_id": "0" * 64}]}, None),
+    "content_by_id": ("content", {"_id": _SAMPLE_UUID}, None),
+    "content_list": ("content", {}, _KEYSET_SORT),
+    "content_list_after_cursor": ("content", _SAMPLE_KEYSET, _KEYSET_SORT),
+    "content_by_artist": ("content", {"artist_id": _SAMPLE_UUID}, _KEYSET_SORT),
+    "content_by_tag": ("content", {"tags": "landscape"}, _KEYSET_SORT),
+    "content_by_all_tags": ("content", {"tags": {"$all": ["landscape", "oil"]}}, _KEYSET_SORT),
+    "content_by_any_tag": ("content", {"tags": {"$in": ["landscape", "oil"]}}, _KEYSET_SORT),
+    "content_by_media_kind": ("content", {"media_kind": "image"}, _KEYSET_SORT),
+    "content_by_duration": ("content", {"media_kind": {"$in": ["audio", "video"]}, "duration": {"$gte": 60}}, _KEYSET_SORT),
+    "content_by_orientation": ("content", {"orientation": "portrait"}, _KEYSET_SORT),
+    "content_hashed_since": ("content", {"hashed_at": {"$gt": _SAMPLE_DATE}}, [("hashed_at", ASCENDING)]),
+    "tags_by_popularity": ("tag_counts", {}, [("count", DESCENDING), ("tag", ASCENDING)]),
+    "content_search": ("content", {"$text": {"$search": "landscape"}}, None),
+    "content_by_blob": ("content", {"$or": [{"blob_id": "0" * 64}, {"renditions.blob_id": "0" * 64}]}, None),
+    "artist_stats_by_artist": ("artist_stats", {"artist_id": {"$in": [_SAMPLE_ID]}}, None),
+    "jobs_queued_of_type": ("jobs", {"status": "queued", "type": "collect_orphans"}, None),
+    "jobs_due": ("jobs", {"status": "queued", "type": {"$in": ["process_content"]}, "run_at": {"$lte": _SAMPLE_DATE}}, [("run_at", ASCENDING)]),
+    "jobs_lease_expired": ("jobs", {"status": "running", "type": {"$in": ["process_content"]}, "locked_until": {"$lt": _SAMPLE_DATE}}, [("locked_until", ASCENDING)]),
+    "upload_session_by_id": ("upload_sessions", {"id": _SAMPLE_ID}, None),
+    "upload_session_by_part_blob": ("upload_sessions", {"part_blobs": "0" * 64, "status": {"$in": ["open", "completing"]}}, None),
+    "upload_sessions_expired": ("upload_sessions", {"status": {"$in": ["open", "completing"]}, "expires_at": {"$lte": _SAMPLE_DATE}}, None),
+    "status_checks_in_window": ("status_checks", {"timestamp": {"$gte": _SAMPLE_DATE}}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+    "status_checks_by_client": ("status_checks", {"client_name": "monitor", "timestamp": {"$gte": _SAMPLE_DATE}}, [("timestamp", DESCENDING), ("_id", DESCENDING)]),
+}
+
+# Unique constraints the endpoints rely on instead of checking first; the app must not run without them
+REQUIRED_INDEXES = {("artists", "email_unique")}
+
+
+async def ensure_indexes(db):
+    """Drop OBSOLETE_INDEXES and create every index in INDEX_PLAN; existing identical indexes are left alone"""
+    for collection, names in OBSOLETE_INDEXES.items():
+        existing = await db[collection].index_information()
+        for name in names:
+            if name in existing:
+                await db[collection].drop_index(name)
+                logger.info("Dropped obsolete index %s.%s", collection, name)
+    for collection, indexes in INDEX_PLAN.items():
+        for index in indexes:
+            try:
+                await db[collection].create_indexes([index])
+            except OperationFailure as e:
+                # e.g. duplicate emails already stored, or an index with the same keys and other options
+                logger.error("Could not create index %s.%s: %s", collection, index.document["name"], e)
+                if (collection, index.document["name"]) in REQUIRED_INDEXES:
+                    raise
+
+
+async def find_duplicate_emails(db) -> list:
+    """Emails shared by several artists, with their ids; these keep email_unique from being built"""
+    pipeline = [
+        {"$group": {"_id": "$email", "ids": {"$push": {"$ifNull": ["$id", "$_id"]}}, "count": {"$sum": 1}}},
+        {"$match": {"count": {"$gt": 1}}},
+        {"$sort": {"_id": 1}},
+    ]
+    return [{"email": row["_id"], "ids": [id_str(key) for key in row["ids"]]} async for row in db.artists.aggregate(pipeline)]
+
+
+def _plan_stages(plan) -> list:
+    stages = []
+    if isinstance(plan, dict):
+        if "stage" in plan:
+            stages.append(plan["stage"])
+        for value in plan.values():
+            stages.extend(_plan_stages(value))
+    elif isinstance(plan, list):
+        for value in plan:
+            stages.extend(_plan_stages(value))
+    return stages
+
+
+async def explain_query_shapes(db) -> list:
+    """Explain each query shape and report whether its winning plan scans the collection"""
+    report = []
+    for name, (collection, query, sort) in QUERY_SHAPES.items():
+        cursor = db[collection].find(query).limit(20)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        stages = _plan_stages(explain.get("queryPlanner", {}).get("winningPlan", {}))
+        report.append({
+            "query": name,
+            "collection": collection,
+            "stages": stages,
+            "collscan": "COLLSCAN" in stages,
+        })
+    return report
+
+
+if __name__ == "__main__":
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    cli = typer.Typer(help="Manage and inspect MongoDB indexes")
+
+    def _db():
+        return AsyncIOMotorClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+
+    @cli.command()
+    def ensure():
+        """Create any missing indexes"""
+        asyncio.run(ensure_indexes(_db()))
+
+    @cli.command()
+    def duplicates():
+        """List artists sharing an email; exits non-zero if any do"""
+        found = asyncio.run(find_duplicate_emails(_db()))
+        for entry in found:
+            typer.echo(f"{entry['email']}: {', '.join(entry['ids'])}")
+        if found:
+            raise typer.Exit(code=1)
+
+    @cli.command()
+    def explain():
+        """List the plan of every query shape; exits non-zero if any scans a collection"""
+        report = asyncio.run(explain_query_shapes(_db()))
+        for entry in report:
+            flag = "COLLSCAN" if entry["collscan"] else "ok"
+            typer.echo(f"{flag:8} {entry['query']:32} {' > '.join(entry['stages'])}")
+        if any(entry["collscan"] for entry in report):
+            raise typer.Exit(code=1)
+
+    cli()
@@ -0,0 +1,215 @@
+"""Background jobs queued in MongoDB.
+
+Jobs live in the ``jobs`` collection, so the only broker is the database the
+app already uses (mongomock works for local runs). A worker claims a job
+atomically with ``find_one_and_update``, which flips it to ``running`` and
+leases it until ``locked_until``; the lease is renewed while the handler
+runs. A job whose worker died is picked up again once its lease expires.
+Failures are retried with exponential backoff and jitter until
+``max_attempts``, after which the job is marked ``failed`` and the handler's
+``on_give_up`` hook runs.
+
+Workers run in their own processes (``python worker.py``) or, with
+``JOBS_IN_PROCESS=1``, as a task inside the API process.
+"""
+import asyncio
+import logging
+import os
+import random
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, NamedTuple, Optional
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+JOBS_MAX_ATTEMPTS = int(os.environ.get("JOBS_MAX_ATTEMPTS", 5))
+JOBS_VISIBILITY_TIMEOUT_SECONDS = float(os.environ.get("JOBS_VISIBILITY_TIMEOUT_SECONDS", 300))
+JOBS_RETRY_BASE_SECONDS = float(os.environ.get("JOBS_RETRY_BASE_SECONDS", 5))
+JOBS_RETRY_MAX_SECONDS = float(os.environ.get("JOBS_RETRY_MAX_SECONDS", 600))
+JOBS_POLL_INTERVAL_SECONDS = float(os.environ.get("JOBS_POLL_INTERVAL_SECONDS", 1))
+# Finished jobs are removed by a TTL index after this long
+JOBS_RETENTION_SECONDS = int(os.environ.get("JOBS_RETENTION_SECONDS", 7 * 24 * 3600))
+
+
+class JobHandler(NamedTuple):
+    run: Callable[..., Awaitable[None]]  # (ctx, payload)
+    on_give_up: Optional[Callable[..., Awaitable[None]]] = None  # (ctx, payload, error)
+
+
+async def enqueue(db, job_type: str, payload: dict, max_attempts: int = JOBS_MAX_ATTEMPTS, delay: float = 0) -> str:
+    now = datetime.utcnow()
+    job_id = str(uuid.uuid4())
+    await db.jobs.insert_one({
+        "id": job_id,
+        "type": job_type,
+        "payload": payload,
+        "status": "queued",  # queued, running, succeeded, failed
+        "attempts": 0,
+        "max_attempts": max_attempts,
+        "run_at": now + timedelta(seconds=delay),
+        "locked_by": None,
+        "locked_until": None,
+        "last_error": None,
+        "created_at": now,
+        "updated_at": now,
+        "finished_at": None,
+    })
+    return job_id
+
+
+async def ensure_queued(db, job_type: str, payload: Optional[dict] = None, delay: float = 0) -> Optional[str]:
+    """Enqueue a job unless one of its type is already queued; periodic jobs reschedule themselves this way"""
+    if await db.jobs.find_one({"status": "queued", "type": job_type}, {"_id": 1}):
+        return None
+    return await enqueue(db, job_type, payload or {}, delay=delay)
+
+
+def retry_delay(attempts: int) -> float:
+    """Exponential backoff with jitter, so failing jobs do not retry in lockstep"""
+    delay = min(JOBS_RETRY_BASE_SECONDS * 2 ** (attempts - 1), JOBS_RETRY_MAX_SECONDS)
+    return delay * random.uniform(0.5, 1.0)
+
+
+async def claim(db, worker_id: str, job_types, visibility_timeout: float = JOBS_VISIBILITY_TIMEOUT_SECONDS) -> Optional[dict]:
+    """Atomically take the next due job, preferring ones whose previous worker lost its lease"""
+    now = datetime.utcnow()
+    lease = {
+        "$set": {
+            "status": "running",
+            "locked_by": worker_id,
+            "locked_until": now + timedelta(seconds=visibility_timeout),
+            "updated_at": now,
+        },
+        "$inc": {"attempts": 1},
+    }
+    types = {"type": {"$in": list(job_types)}}
+    for query, sort in (
+        ({"status": "running", "locked_until": {"$lt": now}, **types}, [("locked_until", 1)]),
+        ({"status": "queued", "run_at": {"$lte": now}, **types}, [("run_at", 1)]),
+    ):
+        job = await db.jobs.find_one_and_update(query, lease, sort=sort, return_document=ReturnDocument.AFTER)
+        if job:
+            return job
+    return None
+
+
+async def _finish(db, job: dict, update: dict) -> bool:
+    # Only the worker still holding the lease may record the outcome
+    result = await db.jobs.update_one({"id": job["id"], "status": "running", "locked_by": job["locked_by"]}, update)
+    return result.modified_count == 1
+
+
+async def complete(db, job: dict) -> bool:
+    now = datetime.utcnow()
+    return await _finish(db, job, {"$set": {
+        "status": "succeeded", "locked_until": None, "updated_at": now, "finished_at": now,
+    }})
+
+
+async def retry_or_fail(db, job: dict, error: str) -> bool:
+    """Requeue the job with backoff, or mark it failed once out of attempts; returns whether it failed for good"""
+    now = datetime.utcnow()
+    if job["attempts"] >= job["max_attempts"]:
+        await _finish(db, job, {"$set": {
+            "status": "failed", "last_error": error, "locked_until": None, "updated_at": now, "finished_at": now,
+        }})
+        return True
+    await _finish(db, job, {"$set": {
+        "status": "queued",
+        "last_error": error,
+        "run_at": now + timedelta(seconds=retry_delay(job["attempts"])),
+        "locked_by": None,
+        "locked_until": None,
+        "updated_at": now,
+    }})
+    return False
+
+
+async def job_counts(db) -> Dict[str, Dict[str, int]]:
+    """Number of jobs per type and status"""
+    counts: Dict[str, Dict[str, int]] = {}
+    async for row in db.jobs.aggregate([{"$group": {"_id": {"type": "$type", "status": "$status"}, "count": {"$sum": 1}}}]):
+        counts.setdefault(row["_id"]["type"], {})[row["_id"]["status"]] = row["count"]
+    return counts
+
+
+class Worker:
+    """Claims and runs jobs with up to `concurrency` handlers at a time."""
+
+    def __init__(self, ctx, handlers: Dict[str, JobHandler], concurrency: int = 4,
+                 visibility_timeout: float = JOBS_VISIBILITY_TIMEOUT_SECONDS):
+        self.ctx = ctx
+        self.db = ctx.db
+        self.handlers = handlers
+        self.concurrency = concurrency
+        self.visibility_timeout = visibility_timeout
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+
+    async def run(self, stop: asyncio.Event):
+        """Process jobs until stop is set; jobs already running are finished first"""
+        logger.info("Worker %s started (%d slots)", self.worker_id, self.concurrency)
+        await asyncio.gather(*(self._slot(stop) for _ in range(self.concurrency)))
+        logger.info("Worker %s stopped", self.worker_id)
+
+    async def _slot(self, stop: asyncio.Event):
+        while not stop.is_set():
+            try:
+                ran = await self.run_once()
+            except Exception:
+                # e.g. the database is briefly unreachable; keep the slot alive
+                logger.exception("Worker %s could not claim a job", self.worker_id)
+                ran = False
+            if not ran:
+                try:
+                    await asyncio.wait_for(stop.wait(), JOBS_POLL_INTERVAL_SECONDS)
+                except asyncio.TimeoutError:
+                    pass
+
+    async def run_once(self) -> bool:
+        """Claim and run one job; returns False when none was due"""
+        job = await claim(self.db, self.worker_id, self.handlers, self.visibility_timeout)
+        if job is None:
+            return False
+        handler = self.handlers[job["type"]]
+
+        if job["attempts"] > job["max_attempts"]:
+            # Reclaimed after its worker died on the last attempt
+            await self._give_up(job, handler, job.get("last_error") or "Lease expired")
+            return True
+
+        renew = asyncio.create_task(self._renew_lease(job))
+        try:
+            await handler.run(self.ctx, job["payload"])
+        except Exception as e:
+            logger.exception("Job %s (%s) failed on attempt %d", job["id"], job["type"], job["attempts"])
+            if await retry_or_fail(self.db, job, f"{type(e).__name__}: {e}"):
+                await self._give_up(job, handler, str(e), mark_failed=False)
+        else:
+            if not await complete(self.db, job):
+                logger.warning("Job %s finished after its lease was lost", job["id"])
+        finally:
+            renew.cancel()
+        return True
+
+    async def _give_up(self, job: dict, handler: JobHandler, error: str, mark_failed: bool = True):
+        if mark_failed:
+            await retry_or_fail(self.db, {**job, "attempts": job["max_attempts"]}, error)
+        if handler.on_give_up:
+            try:
+                await handler.on_give_up(self.ctx, job["payload"], error)
+            except Exception:
+                logger.exception("on_give_up hook failed for job %s", job["id"])
+
+    async def _renew_lease(self, job: dict):
+        while True:
+            await asyncio.sleep(self.visibility_timeout / 3)
+            result = await self.db.jobs.update_one(
+                {"id": job["id"], "status": "running", "locked_by": self.worker_id},
+                {"$set": {"locked_until": datetime.utcnow() + timedelta(seconds=self.visibility_timeout)}}
+            )
+            if result.modified_count == 0:
+                logger.warning("Lost the lease on job %s", job["id"])
+                return
@@ -0,0 +1,345 @@
+"""Media type sniffing and metadata extraction for uploaded files.
+
+Uploads are typed from their first bytes (``sniff``), not from the client's
+Content-Type or the file name, so ``file_type`` and ``media_kind`` can be
+trusted by filters and by the Content-Type of served files. The rest of the
+metadata is read once, by the post-upload job: image dimensions, orientation,
+a few EXIF fields and a 64-bit perceptual hash, and audio/video duration.
+``probe`` runs in the rendition process pool on a local copy of the blob and
+only reads what it needs (image headers, MP4 boxes, WAV chunks). The results
+are stored as plain fields on the content document and indexed, so listing
+and search filter on them (``media_filter``) without touching the files.
+
+Durations of WAV and MP4/QuickTime files are parsed here; other audio
+formats (MP3, FLAC, Ogg) need the optional ``mutagen`` package.
+"""
+import asyncio
+import importlib.util
+import logging
+import os
+import struct
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import AsyncIterator, Optional
+
+import numpy as np
+from fastapi import HTTPException
+from PIL import Image, ImageOps
+
+from renditions import is_renderable, run_in_pool
+
+logger = logging.getLogger(__name__)
+
+SNIFF_BYTES = 512
+MEDIA_KINDS = ("image", "audio", "video", "document", "other")
+ORIENTATIONS = ("landscape", "portrait", "square")
+# Longest EXIF string kept; camera makers pad some fields with garbage
+EXIF_MAX_LENGTH = 128
+
+_DOCUMENT_TYPES = {"application/pdf", "application/zip", "application/json", "application/xml"}
+# ISO base media (MP4 family) brands that are not plain video
+_FTYP_BRANDS = {
+    b"qt  ": "video/quicktime",
+    b"M4A ": "audio/mp4",
+    b"M4B ": "audio/mp4",
+    b"heic": "image/heic",
+    b"heix": "image/heic",
+    b"mif1": "image/heif",
+    b"msf1": "image/heif",
+    b"avif": "image/avif",
+    b"3gp4": "video/3gpp",
+    b"3gp5": "video/3gpp",
+}
+_RIFF_TYPES = {b"WEBP": "image/webp", b"WAVE": "audio/wav", b"AVI ": "video/x-msvideo"}
+_SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"GIF87a", "image/gif"),
+    (b"GIF89a", "image/gif"),
+    (b"BM", "image/bmp"),
+    (b"II*\x00", "image/tiff"),
+    (b"MM\x00*", "image/tiff"),
+    (b"%PDF-", "application/pdf"),
+    (b"ID3", "audio/mpeg"),
+    (b"fLaC", "audio/flac"),
+    (b"OggS", "audio/ogg"),
+    (b"\x1aE\xdf\xa3", "video/webm"),
+    (b"PK\x03\x04", "application/zip"),
+)
+# Served inline: only binary media sniff() recognises, never markup a browser would run (SVG, HTML)
+INLINE_TYPES = frozenset(
+    media_type
+    for media_type in [t for _, t in _SIGNATURES] + list(_RIFF_TYPES.values()) + list(_FTYP_BRANDS.values()) + ["video/mp4", "audio/mpeg"]
+    if media_type.split("/")[0] in ("image", "audio", "video")
+)
+# EXIF tags kept on the document; GPS and serial numbers are deliberately not copied
+_EXIF_ORIENTATION = 0x0112
+_EXIF_MAKE = 0x010F
+_EXIF_MODEL = 0x0110
+_EXIF_DATETIME = 0x0132
+_EXIF_IFD = 0x8769
+_EXIF_DATETIME_ORIGINAL = 0x9003
+
+
+def sniff(head: bytes) -> Optional[str]:
+    """Media type from a file's first bytes, or None when they are not recognised"""
+    for signature, media_type in _SIGNATURES:
+        if head.startswith(signature):
+            return media_type
+    if head[:4] == b"RIFF" and head[8:12] in _RIFF_TYPES:
+        return _RIFF_TYPES[head[8:12]]
+    if head[4:8] == b"ftyp":
+        return _FTYP_BRANDS.get(head[8:12], "video/mp4")
+    if len(head) > 1 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return "audio/mpeg"  # MPEG audio frame without an ID3 tag
+    text = head.lstrip(b"\xef\xbb\xbf \t\r\n").lower()
+    if text.startswith(b"<svg") or (text.startswith(b"<?xml") and b"<svg" in text):
+        return "image/svg+xml"
+    return None
+
+
+def media_kind_for(media_type: Optional[str]) -> str:
+    major = (media_type or "").split("/")[0]
+    if major in ("image", "audio", "video"):
+        return major
+    if major == "text" or media_type in _DOCUMENT_TYPES:
+        return "document"
+    return "other"
+
+
+def orientation(width: int, height: int) -> str:
+    if width == height:
+        return "square"
+    return "landscape" if width > height else "portrait"
+
+
+class TypeSniffer:
+    """Keeps the first bytes of an upload stream as it passes through"""
+
+    def __init__(self):
+        self.head = b""
+
+    async def wrap(self, chunks: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+        async for chunk in chunks:
+            if len(self.head) < SNIFF_BYTES:
+                self.head += chunk[:SNIFF_BYTES - len(self.head)]
+            yield chunk
+
+    def media_type(self, declared: Optional[str]) -> str:
+        """The sniffed type, else the declared one"""
+        return sniff(self.head) or declared or "application/octet-stream"
+
+
+def _dct_matrix(n: int) -> np.ndarray:
+    k = np.arange(n)[:, None]
+    return np.cos(np.pi * (2 * np.arange(n)[None, :] + 1) * k / (2 * n))
+
+
+_DCT = _dct_matrix(32)
+
+
+def phash(image: Image.Image) -> str:
+    """64-bit DCT perceptual hash as 16 hex digits; similar images differ in few bits"""
+    pixels = np.asarray(image.convert("L").resize((32, 32), Image.LANCZOS), dtype=np.float64)
+    low = (_DCT @ pixels @ _DCT.T)[:8, :8].flatten()
+    # The DC term only carries overall brightness
+    bits = low > np.median(low[1:])
+    return np.packbits(bits).tobytes().hex()
+
+
+def _exif_text(value) -> Optional[str]:
+    if isinstance(value, bytes):
+        value = value.decode("utf-8", "replace")
+    if not isinstance(value, str):
+        return None
+    value = value.strip("\x00 ").strip()
+    return value[:EXIF_MAX_LENGTH] or None
+
+
+def _probe_image(path: str) -> dict:
+    with Image.open(path) as image:
+        exif = image.getexif()
+        width, height = image.size
+        if exif.get(_EXIF_ORIENTATION) in (5, 6, 7, 8):
+            width, height = height, width  # stored rotated by 90 degrees
+        fields = {
+            "make": _exif_text(exif.get(_EXIF_MAKE)),
+            "model": _exif_text(exif.get(_EXIF_MODEL)),
+            "taken_at": _exif_text(exif.get_ifd(_EXIF_IFD).get(_EXIF_DATETIME_ORIGINAL) or exif.get(_EXIF_DATETIME)),
+        }
+        # The hash only needs a thumbnail; JPEGs can be decoded straight at a fraction of their size
+        image.draft("RGB", (64, 64))
+        metadata = {
+            "width": width,
+            "height": height,
+            "orientation": orientation(width, height),
+            "phash": phash(ImageOps.exif_transpose(image)),
+        }
+    exif_fields = {name: value for name, value in fields.items() if value}
+    if exif_fields:
+        metadata["exif"] = exif_fields
+    return metadata
+
+
+def _boxes(f, start: int, end: int):
+    """(type, payload offset, payload end) of the ISO base media boxes between two offsets"""
+    offset = start
+    while offset + 8 <= end:
+        f.seek(offset)
+        size, box_type = struct.unpack(">I4s", f.read(8))
+        header = 8
+        if size == 1:
+            size = struct.unpack(">Q", f.read(8))[0]
+            header = 16
+        elif size == 0:
+            size = end - offset
+        if size < header:
+            return
+        yield box_type, offset + header, min(offset + size, end)
+        offset += size
+
+
+def _probe_mp4(path: str) -> dict:
+    metadata = {}
+    with open(path, "rb") as f:
+        end = os.fstat(f.fileno()).st_size
+        moov = next(((start, stop) for box, start, stop in _boxes(f, 0, end) if box == b"moov"), None)
+        if moov is None:
+            return metadata
+        for box, start, stop in _boxes(f, *moov):
+            f.seek(start)
+            if box == b"mvhd":
+                version = f.read(4)[0]
+                if version == 1:
+                    f.seek(16, os.SEEK_CUR)
+                    timescale, duration = struct.unpack(">IQ", f.read(12))
+                else:
+                    f.seek(8, os.SEEK_CUR)
+                    timescale, duration = struct.unpack(">II", f.read(8))
+                if timescale:
+                    metadata["duration"] = round(duration / timescale, 3)
+            elif box == b"trak" and "width" not in metadata:
+                for child, child_start, _ in _boxes(f, start, stop):
+                    if child != b"tkhd":
+                        continue
+                    f.seek(child_start)
+                    version = f.read(4)[0]
+                    # Skip times, ids and duration, then layer, volume and the matrix
+                    f.seek((32 if version == 1 else 20) + 52, os.SEEK_CUR)
+                    width, height = (value >> 16 for value in struct.unpack(">II", f.read(8)))
+                    if width and height:  # audio tracks have no size
+                        metadata.update(width=width, height=height, orientation=orientation(width, height))
+    return metadata
+
+
+def _probe_wav(path: str) -> dict:
+    with open(path, "rb") as f:
+        f.seek(12)
+        byte_rate = None
+        while True:
+            header = f.read(8)
+            if len(header) < 8:
+                return {}
+            chunk, size = struct.unpack("<4sI", header)
+            if chunk == b"fmt ":
+                byte_rate = struct.unpack("<I", f.read(12)[8:12])[0]
+                f.seek(size - 12 + size % 2, os.SEEK_CUR)
+            elif chunk == b"data":
+                return {"duration": round(size / byte_rate, 3)} if byte_rate else {}
+            else:
+                f.seek(size + size % 2, os.SEEK_CUR)
+
+
+def _probe_duration(path: str) -> dict:
+    if importlib.util.find_spec("mutagen") is None:
+        return {}
+    import mutagen
+    info = getattr(mutagen.File(path), "info", None)
+    length = getattr(info, "length", None)
+    return {"duration": round(length, 3)} if length else {}
+
+
+def probe(path: str, declared_type: Optional[str] = None) -> dict:
+    """Type and metadata of a stored file; runs inside a worker process"""
+    with open(path, "rb") as f:
+        file_type = sniff(f.read(SNIFF_BYTES)) or declared_type or "application/octet-stream"
+    kind = media_kind_for(file_type)
+    metadata = {"file_type": file_type, "media_kind": kind}
+    try:
+        if is_renderable(file_type):
+            metadata.update(_probe_image(path))
+        elif file_type in ("video/mp4", "video/quicktime", "video/3gpp", "audio/mp4"):
+            metadata.update(_probe_mp4(path))
+        elif file_type == "audio/wav":
+            metadata.update(_probe_wav(path))
+        if kind in ("audio", "video") and "duration" not in metadata:
+            metadata.update(_probe_duration(path))
+    except Exception as e:
+        # Truncated or corrupt files still get their type
+        logger.warning("Could not read %s metadata from %s: %s", file_type, path, e)
+    return metadata
+
+
+async def extract_metadata(path: Path, declared_type: Optional[str] = None) -> dict:
+    """Probe a local file in the process pool; an empty dict if it could not be read at all"""
+    try:
+        return await run_in_pool(probe, str(path), declared_type)
+    except BrokenProcessPool:
+        logger.exception("Worker pool broke while probing %s", path)
+        raise
+    except Exception:
+        logger.exception("Could not probe %s", path)
+        return {}
+
+
+def media_filter(media_kind: Optional[str] = None, orientation: Optional[str] = None,
+                 min_duration: Optional[float] = None, max_duration: Optional[float] = None) -> dict:
+    """Query matching content by kind, orientation and duration range (seconds)"""
+    query = {}
+    if media_kind:
+        if media_kind not in MEDIA_KINDS:
+            raise HTTPException(status_code=400, detail=f"media_kind must be one of {', '.join(MEDIA_KINDS)}")
+        query["media_kind"] = media_kind
+    if orientation:
+        if orientation not in ORIENTATIONS:
+            raise HTTPException(status_code=400, detail=f"orientation must be one of {', '.join(ORIENTATIONS)}")
+        query["orientation"] = orientation
+    duration = {}
+    if min_duration is not None:
+        duration["$gte"] = min_duration
+    if max_duration is not None:
+        duration["$lte"] = max_duration
+    if duration:
+        if min_duration is not None and max_duration is not None and min_duration > max_duration:
+            raise HTTPException(status_code=400, detail="min_duration must not exceed max_duration")
+        query["duration"] = duration
+        # Only audio and video have a duration; naming them keeps the query on the media_kind index
+        query.setdefault("media_kind", {"$in": ["audio", "video"]})
+    return query
+
+
+if __name__ == "__main__":
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from jobs import enqueue
+    from processing import PROBE_CONTENT
+    from schema import CONTENT
+
+    load_dotenv(Path(__file__).parent / '.env')
+
+    def backfill(limit: int = typer.Option(0, help="Stop after this many documents; 0 for all")):
+        """Queue metadata extraction for content uploaded before it was extracted at ingest"""
+        async def run():
+            db = AsyncIOMotorClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+            queued = 0
+            docs = db.content.find({"media_kind": None, "blob_id": {"$exists": True}}, {"_id": 1, "id": 1, "blob_id": 1})
+            async for doc in docs.limit(limit):
+                doc = CONTENT.decode(doc)
+                await enqueue(db, PROBE_CONTENT, {"content_id": doc["id"], "blob_id": doc["blob_id"]})
+                queued += 1
+            typer.echo(f"Queued {queued} documents; run worker.py to process them")
+        asyncio.run(run())
+
+    typer.run(backfill)
@@ -0,0 +1,222 @@
+"""Request metrics in Prometheus text format, with MongoDB time per request.
+
+``MetricsMiddleware`` records latency, body sizes and in-flight requests per
+route template. ``MongoCommandListener`` is registered on the Motor client and
+adds each command's duration and returned document count to the stats of the
+request that issued it; Motor runs pymongo in executor threads with the
+caller's context copied, so a context variable is enough to find it. Command
+durations as reported by pymongo include decoding the reply, so large
+documents (e.g. legacy inline ``file_data``) show up as database time.
+
+Every response carries a ``Server-Timing`` header splitting total time into
+``db`` and ``app``.
+"""
+import threading
+import time
+from contextvars import ContextVar
+from typing import Dict, Optional, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (100, 1000, 10_000, 100_000, 1_000_000, 10_000_000, 100_000_000)
+COUNT_BUCKETS = (0, 1, 5, 10, 50, 100, 500, 1000, 5000)
+
+_lock = threading.Lock()
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+class Counter:
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = ()):
+        self.name, self.help, self.labels = name, help, labels
+        self.values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, *labels: str, amount: float = 1):
+        with _lock:
+            self.values[labels] = self.values.get(labels, 0) + amount
+
+    def samples(self):
+        for labels, value in self.values.items():
+            yield f"{self.name}{_format_labels(self.labels, labels)} {value}"
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, *labels: str, amount: float = 1):
+        self.inc(*labels, amount=-amount)
+
+
+class Histogram:
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labels: Tuple[str, ...] = (), buckets=LATENCY_BUCKETS):
+        self.name, self.help, self.labels = name, help, labels
+        self.buckets = buckets
+        # labels -> [per-bucket counts..., +Inf count, sum]
+        self.values: Dict[Tuple[str, ...], list] = {}
+
+    def observe(self, value: float, *labels: str):
+        with _lock:
+            series = self.values.get(labels)
+            if series is None:
+                series = self.values[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    series[i] += 1
+                    break
+            else:
+                series[len(self.buckets)] += 1
+            series[-1] += value
+
+    def samples(self):
+        for labels, series in self.values.items():
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), series[:-1]):
+                cumulative += count
+                le = f'le="{bound}"'
+                yield f"{self.name}_bucket{_format_labels(self.labels, labels, le)} {cumulative}"
+            yield f"{self.name}_sum{_format_labels(self.labels, labels)} {series[-1]}"
+            yield f"{self.name}_count{_format_labels(self.labels, labels)} {cumulative}"
+
+
+REQUESTS = Counter("http_requests_total", "Requests handled", ("method", "route", "status"))
+REQUEST_LATENCY = Histogram("http_request_duration_seconds", "Time to the end of the response body", ("method", "route"))
+REQUEST_BYTES = Histogram("http_request_size_bytes", "Request body size", ("method", "route"), SIZE_BUCKETS)
+RESPONSE_BYTES = Histogram("http_response_size_bytes", "Response body size", ("method", "route"), SIZE_BUCKETS)
+IN_FLIGHT = Gauge("http_requests_in_flight", "Requests currently being handled")
+REQUEST_DB_TIME = Histogram("http_request_db_duration_seconds", "MongoDB time spent per request", ("method", "route"))
+REQUEST_DB_DOCUMENTS = Histogram("http_request_db_documents", "Documents returned by MongoDB per request", ("method", "route"), COUNT_BUCKETS)
+MONGO_COMMANDS = Histogram("mongodb_command_duration_seconds", "MongoDB command duration, including reply decoding", ("command", "outcome"))
+REQUESTS_REJECTED = Counter("http_requests_rejected_total", "Requests refused by admission control", ("route_class", "reason"))
+UPLOAD_BYTES_IN_FLIGHT = Gauge("upload_bytes_in_flight", "Upload body bytes admitted and not yet finished")
+
+METRICS = [REQUESTS, REQUEST_LATENCY, REQUEST_BYTES, RESPONSE_BYTES, IN_FLIGHT,
+           REQUEST_DB_TIME, REQUEST_DB_DOCUMENTS, MONGO_COMMANDS, REQUESTS_REJECTED, UPLOAD_BYTES_IN_FLIGHT]
+
+
+def render_metrics() -> str:
+    lines = []
+    with _lock:
+        for metric in METRICS:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+    return "\n".join(lines) + "\n"
+
+
+class RequestStats:
+    """Database work attributed to one request; updated from Motor's executor threads."""
+
+    def __init__(self):
+        self.db_seconds = 0.0
+        self.db_commands = 0
+        self.db_documents = 0
+        self._lock = threading.Lock()
+
+    def add(self, seconds: float, documents: int):
+        with self._lock:
+            self.db_seconds += seconds
+            self.db_commands += 1
+            self.db_documents += documents
+
+
+current_request: ContextVar[Optional[RequestStats]] = ContextVar("current_request", default=None)
+
+
+def _returned_documents(reply: dict) -> int:
+    cursor = reply.get("cursor")
+    if isinstance(cursor, dict):
+        return len(cursor.get("firstBatch") or cursor.get("nextBatch") or [])
+    if isinstance(reply.get("value"), dict):  # findAndModify
+        return 1
+    return 0
+
+
+class MongoCommandListener(monitoring.CommandListener):
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMANDS.observe(seconds, event.command_name, "success")
+        stats = current_request.get()
+        if stats is not None:
+            stats.add(seconds, _returned_documents(event.reply))
+
+    def failed(self, event):
+        seconds = event.duration_micros / 1e6
+        MONGO_COMMANDS.observe(seconds, event.command_name, "failure")
+        stats = current_request.get()
+        if stats is not None:
+            stats.add(seconds, 0)
+
+
+def _route_label(scope) -> str:
+    route = scope.get("route")
+    return getattr(route, "path", None) or "unmatched"
+
+
+class MetricsMiddleware:
+    """Record per-route latency, sizes and database time, and send Server-Timing."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        stats = RequestStats()
+        token = current_request.set(stats)
+        started = time.perf_counter()
+        request_bytes = 0
+        response_bytes = 0
+        status = 500
+
+        async def counting_receive():
+            nonlocal request_bytes
+            message = await receive()
+            if message["type"] == "http.request":
+                request_bytes += len(message.get("body", b""))
+            return message
+
+        async def timing_send(message):
+            nonlocal response_bytes, status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total_ms = (time.perf_counter() - started) * 1000
+                db_ms = stats.db_seconds * 1000
+                timing = (f'db;dur={db_ms:.1f};desc="{stats.db_commands} commands", '
+                          f"app;dur={max(total_ms - db_ms, 0):.1f}, total;dur={total_ms:.1f}")
+                message["headers"] = list(message.get("headers", [])) + [(b"server-timing", timing.encode())]
+            elif message["type"] == "http.response.body":
+                response_bytes += len(message.get("body", b""))
+            await send(message)
+
+        IN_FLIGHT.inc()
+        try:
+            await self.app(scope, counting_receive, timing_send)
+        finally:
+            IN_FLIGHT.dec()
+            current_request.reset(token)
+            method, route = scope["method"], _route_label(scope)
+            REQUESTS.inc(method, route, str(status))
+            REQUEST_LATENCY.observe(time.perf_counter() - started, method, route)
+            REQUEST_BYTES.observe(request_bytes, method, route)
+            RESPONSE_BYTES.observe(response_bytes, method, route)
+            REQUEST_DB_TIME.observe(stats.db_seconds, method, route)
+            REQUEST_DB_DOCUMENTS.observe(stats.db_documents, method, route)
@@ -0,0 +1,81 @@
+"""Keyset pagination over (created_at, _id).
+
+A cursor is an opaque token for the last item of a page; the next page is
+everything strictly after it in (created_at desc, _id desc) order, which an
+index on those fields can seek to directly instead of skipping documents.
+Binary UUIDs sort byte-wise, in the same order as their string form.
+Collections ordered by another timestamp (status checks) pass its name as
+``time_field``.
+"""
+import base64
+import json
+import os
+from datetime import datetime
+from typing import List, Optional, Tuple
+
+from bson import ObjectId
+from fastapi import HTTPException
+
+from schema import id_str, uuid_value
+
+KEYSET_SORT = [("created_at", -1), ("_id", -1)]
+KEYSET_FIELDS = ("id", "created_at")
+NEXT_CURSOR_HEADER = "X-Next-Cursor"
+# Largest page the list endpoints return; a page is read into memory whole
+PAGE_LIMIT = int(os.environ.get("PAGE_LIMIT", 100))
+# Marks a cursor on a schema v1 document, whose _id is still an ObjectId
+_OBJECT_ID = "oid"
+
+
+def check_page_limit(limit: int, skip: int = 0):
+    if limit < 1 or limit > PAGE_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {PAGE_LIMIT}")
+    if skip < 0:
+        raise HTTPException(status_code=400, detail="skip must not be negative")
+
+
+def encode_cursor(doc: dict, time_field: str = "created_at") -> str:
+    """Cursor for a stored document, or an API-shaped one"""
+    key = doc.get("_id", doc.get("id"))
+    parts = [doc[time_field].isoformat()]
+    parts += [str(key), _OBJECT_ID] if isinstance(key, ObjectId) else [id_str(key)]
+    payload = json.dumps(parts, separators=(",", ":"))
+    return base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+
+
+def decode_cursor(token: str) -> Tuple[datetime, object]:
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        created_at, item_id, *kind = json.loads(base64.urlsafe_b64decode(padded))
+        key = ObjectId(item_id) if kind == [_OBJECT_ID] else uuid_value(str(item_id))
+        return datetime.fromisoformat(created_at), key
+    except (ValueError, TypeError):
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+
+def after_cursor(query: dict, cursor: Optional[str], time_field: str = "created_at") -> dict:
+    """Restrict a query to the items that come after the cursor"""
+    if not cursor:
+        return query
+    stamp, key = decode_cursor(cursor)
+    keyset = {
+        "$or": [
+            {time_field: {"$lt": stamp}},
+            {time_field: stamp, "_id": {"$lt": key}}
+        ]
+    }
+    if isinstance(key, ObjectId):
+        # ObjectIds sort above Binary UUIDs, so v2 documents with the same timestamp are all still to come
+        keyset["$or"].append({time_field: stamp, "_id": {"$type": "binData"}})
+    return {"$and": [query, keyset]} if query else keyset
+
+
+async def fetch_page(cursor, limit: int, time_field: str = "created_at") -> Tuple[List[dict], Optional[str]]:
+    """Read one page from a sorted Motor cursor and the token for the page after it"""
+    docs = await cursor.limit(limit + 1).to_list(limit + 1)
+    if len(docs) <= limit:
+        return docs, None
+    docs = docs[:limit]
+    if not docs:
+        return docs, None
+    return docs, encode_cursor(docs[-1], time_field)
@@ -0,0 +1,143 @@
+"""Job handlers for work that runs after an upload has been accepted.
+
+Uploads store the file, insert the document with ``processing_status``
+``pending`` and enqueue a job; everything slower happens here, in a worker:
+media metadata (see media.py), near-duplicate checks (see similarity.py)
+and thumbnails. Deletion jobs (see cleanup.py) run on the same workers.
+Handlers only see a ``JobContext`` so they run the same way inside the API
+process and in ``worker.py``.
+
+With the in-memory cache backend, a worker in another process cannot evict
+the API's cached copy of a document, so the processed result shows up on
+cached reads after ``CACHE_TTL_SECONDS``; ``GET /api/content/{id}/status``
+always reads the database. ``CACHE_BACKEND=redis`` shares invalidations.
+"""
+from dataclasses import dataclass
+from datetime import datetime
+from typing import Callable, Optional
+
+from pymongo import ReturnDocument
+
+from cleanup import COLLECT_ORPHANS, PURGE_ARTIST, RELEASE_BLOBS, collect_orphans, purge_artist, release_blobs
+from jobs import JobHandler
+from media import extract_metadata
+from renditions import generate_renditions, is_renderable
+from schema import ARTISTS, CONTENT, id_str
+from similarity import DUPLICATE_LIMIT, DUPLICATE_MAX_DISTANCE
+
+PROCESS_CONTENT = "process_content"
+PROCESS_PROFILE_IMAGE = "process_profile_image"
+# Metadata only, for content uploaded before it was extracted at ingest (python media.py)
+PROBE_CONTENT = "probe_content"
+# Feed events carry the processed document, so clients get its thumbnails without reading it again
+_EVENT_PROJECTION = {"file_data": 0}
+
+
+@dataclass
+class JobContext:
+    db: object
+    blob_store: object
+    cache: object
+    # Feed publisher when the worker shares the API process; elsewhere change streams carry updates
+    publish: Optional[Callable] = None
+    # SimilarityIndex for flagging near-duplicate uploads; not checked without one
+    similarity: Optional[object] = None
+
+
+async def _invalidate_content(ctx: JobContext, content_id: str, artist_id: str):
+    await ctx.cache.invalidate(f"content:{content_id}")
+    await ctx.cache.bump(f"artist_content:{artist_id}")
+
+
+async def _probe(ctx: JobContext, blob_id: str, file_type: str) -> dict:
+    async with ctx.blob_store.local_file(blob_id) as path:
+        metadata = await extract_metadata(path, file_type)
+    if "phash" in metadata:
+        # SimilarityIndex picks up new hashes by this
+        metadata["hashed_at"] = datetime.utcnow()
+    return metadata
+
+
+async def _near_duplicates(ctx: JobContext, content_id: str, artist_id: str, phash: str, exact: list) -> list:
+    """The artist's other content within DUPLICATE_MAX_DISTANCE bits, merged with exact (same file) duplicates"""
+    matches = await ctx.similarity.find(
+        ctx.db, phash, DUPLICATE_MAX_DISTANCE, artist_id=artist_id, exclude=content_id, limit=DUPLICATE_LIMIT, max_age=0
+    )
+    duplicates = {match["id"]: match["distance"] for match in matches}
+    for match in exact:
+        duplicates[match["id"]] = 0
+    return [{"id": key, "distance": value} for key, value in sorted(duplicates.items(), key=lambda item: item[1])][:DUPLICATE_LIMIT]
+
+
+async def process_content(ctx: JobContext, payload: dict):
+    """Extract metadata and render thumbnails for new content, then mark it ready"""
+    query = {**CONTENT.id_query(payload["content_id"]), "blob_id": payload["blob_id"]}
+    content = await ctx.db.content.find_one_and_update(
+        query,
+        {"$set": {"processing_status": "processing"}},
+        {"_id": 0, "file_type": 1, "artist_id": 1, "duplicates": 1}
+    )
+    if not content:
+        # Deleted, or its file replaced, before the job ran
+        return
+
+    update = {"processing_status": "ready", "updated_at": datetime.utcnow()}
+    update.update(await _probe(ctx, payload["blob_id"], content["file_type"]))
+    if "phash" in update and ctx.similarity:
+        duplicates = await _near_duplicates(
+            ctx, payload["content_id"], id_str(content["artist_id"]), update["phash"], content.get("duplicates") or []
+        )
+        if duplicates:
+            update["duplicates"] = duplicates
+    if is_renderable(update.get("file_type", content["file_type"])):
+        update["renditions"] = await generate_renditions(ctx.blob_store, payload["blob_id"])
+    processed = await ctx.db.content.find_one_and_update(query, {"$set": update}, _EVENT_PROJECTION, return_document=ReturnDocument.AFTER)
+    await _invalidate_content(ctx, payload["content_id"], id_str(content["artist_id"]))
+    if processed and ctx.publish:
+        ctx.publish("content", "updated", payload["content_id"], processed)
+
+
+async def content_processing_failed(ctx: JobContext, payload: dict, error: str):
+    result = await ctx.db.content.find_one_and_update(
+        {**CONTENT.id_query(payload["content_id"]), "blob_id": payload["blob_id"]},
+        {"$set": {"processing_status": "failed", "processing_error": error, "updated_at": datetime.utcnow()}},
+        _EVENT_PROJECTION,
+        return_document=ReturnDocument.AFTER
+    )
+    if result:
+        await _invalidate_content(ctx, payload["content_id"], id_str(result["artist_id"]))
+        if ctx.publish:
+            ctx.publish("content", "updated", payload["content_id"], result)
+
+
+async def probe_content(ctx: JobContext, payload: dict):
+    """Store metadata for content that already has its thumbnails"""
+    query = {**CONTENT.id_query(payload["content_id"]), "blob_id": payload["blob_id"]}
+    content = await ctx.db.content.find_one(query, {"_id": 0, "file_type": 1, "artist_id": 1})
+    if not content:
+        return
+    metadata = await _probe(ctx, payload["blob_id"], content["file_type"])
+    if metadata:
+        await ctx.db.content.update_one(query, {"$set": {**metadata, "updated_at": datetime.utcnow()}})
+        await _invalidate_content(ctx, payload["content_id"], id_str(content["artist_id"]))
+
+
+async def process_profile_image(ctx: JobContext, payload: dict):
+    """Render thumbnails for a profile image, unless it has been replaced meanwhile"""
+    renditions = await generate_renditions(ctx.blob_store, payload["blob_id"])
+    if renditions:
+        await ctx.db.artists.update_one(
+            {**ARTISTS.id_query(payload["artist_id"]), "profile_image_blob": payload["blob_id"]},
+            {"$set": {"profile_renditions": renditions, "updated_at": datetime.utcnow()}}
+        )
+        await ctx.cache.invalidate(f"artist:{payload['artist_id']}")
+
+
+HANDLERS = {
+    PROCESS_CONTENT: JobHandler(process_content, content_processing_failed),
+    PROCESS_PROFILE_IMAGE: JobHandler(process_profile_image),
+    PROBE_CONTENT: JobHandler(probe_content),
+    PURGE_ARTIST: JobHandler(purge_artist),
+    RELEASE_BLOBS: JobHandler(release_blobs),
+    COLLECT_ORPHANS: JobHandler(collect_orphans),
+}
@@ -0,0 +1,118 @@
+"""Thumbnail renditions for uploaded images.
+
+Resizing runs in a process pool so decoding large images never blocks the
+event loop; the resulting WebP files are stored in the blob store next to
+the original. Other CPU-bound media work (``media.probe``) shares the pool
+through ``run_in_pool``.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from io import BytesIO
+from typing import List, Optional
+
+from PIL import Image, ImageOps
+
+from blobstore import BlobNotFound, BlobStore
+
+logger = logging.getLogger(__name__)
+
+RENDITION_SIZES = (160, 480, 1080)
+RENDITION_MEDIA_TYPE = "image/webp"
+RENDITION_WORKERS = int(os.environ.get("RENDITION_WORKERS", max(1, (os.cpu_count() or 2) // 2)))
+
+_executor: Optional[ProcessPoolExecutor] = None
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(
+            max_workers=RENDITION_WORKERS,
+            mp_context=multiprocessing.get_context("spawn")
+        )
+    return _executor
+
+
+def shutdown_renditions():
+    global _executor
+    if _executor is not None:
+        _executor.shutdown(wait=False, cancel_futures=True)
+        _executor = None
+
+
+async def run_in_pool(fn, *args):
+    """Run a module-level function in the worker process pool"""
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(_get_executor(), fn, *args)
+    except BrokenProcessPool:
+        # A worker died (e.g. killed for memory); start a fresh pool and let the job retry
+        shutdown_renditions()
+        raise
+
+
+def is_renderable(media_type: Optional[str]) -> bool:
+    return bool(media_type) and media_type.startswith("image/") and media_type != "image/svg+xml"
+
+
+def render(path: str, sizes=RENDITION_SIZES) -> List[dict]:
+    """Resize the image at path to fit each bounding box; runs inside a worker process"""
+    with Image.open(path) as original:
+        image = ImageOps.exif_transpose(original)
+        if image.mode not in ("RGB", "RGBA"):
+            image = image.convert("RGBA" if "A" in image.getbands() else "RGB")
+        results = []
+        for size in sizes:
+            thumb = image.copy()
+            thumb.thumbnail((size, size), Image.LANCZOS)
+            out = BytesIO()
+            thumb.save(out, "WEBP", quality=80, method=4)
+            results.append({"size": size, "width": thumb.width, "height": thumb.height, "data": out.getvalue()})
+        return results
+
+
+async def _single_chunk(data: bytes):
+    yield data
+
+
+async def generate_renditions(blob_store: BlobStore, blob_id: str) -> List[dict]:
+    """Render thumbnails for a stored image and store them as blobs"""
+    try:
+        # Only the path crosses to the worker, which reads the file itself
+        async with blob_store.local_file(blob_id) as path:
+            rendered = await run_in_pool(render, str(path))
+    except BlobNotFound:
+        raise
+    except BrokenProcessPool:
+        logger.exception("Rendition worker pool broke while rendering blob %s", blob_id)
+        raise
+    except Exception:
+        logger.exception("Could not render thumbnails for blob %s", blob_id)
+        return []
+
+    renditions = []
+    for item in rendered:
+        blob = await blob_store.put(_single_chunk(item["data"]))
+        renditions.append({
+            "size": item["size"],
+            "width": item["width"],
+            "height": item["height"],
+            "blob_id": blob.sha256,
+            "media_type": RENDITION_MEDIA_TYPE,
+        })
+    return renditions
+
+
+def pick_rendition(renditions: List[dict], size: int) -> Optional[dict]:
+    """Smallest rendition at least as large as requested, else the largest available"""
+    if not renditions:
+        return None
+    ordered = sorted(renditions, key=lambda r: r["size"])
+    for rendition in ordered:
+        if rendition["size"] >= size:
+            return rendition
+    return ordered[-1]
@@ -0,0 +1,254 @@
+"""Storage schema v2 for artists and content.
+
+Schema v1 documents carried the API's string UUID in ``id`` next to Mongo's
+own ObjectId ``_id``, so every document held two primary keys and two
+unique indexes. In v2 the UUID *is* the ``_id``, stored as BSON Binary
+subtype 4 (16 bytes instead of a 36-character string). ``content.artist_id``
+uses the same encoding, legacy inline payloads (``file_data``,
+``profile_image``) are Binary instead of base64, and None-valued fields are
+not stored at all. ``EntityCodec`` maps between stored documents and the
+dicts the API models and serializers expect, and builds the id filters.
+
+Documents are migrated online with ``python schema.py migrate``. Until it
+has finished, a codec in legacy mode matches ids in both shapes; processes
+check for v1 documents at startup (``detect_legacy``) and use plain v2
+filters once none are left.
+"""
+import asyncio
+import base64
+import logging
+import os
+import uuid
+from pathlib import Path
+from typing import Callable, Iterable, List, Optional
+
+from bson import Binary, ObjectId
+from bson.binary import UuidRepresentation
+from pymongo import DeleteOne, ReplaceOne
+from pymongo.errors import OperationFailure
+
+logger = logging.getLogger(__name__)
+
+MIGRATION_BATCH_SIZE = int(os.environ.get("SCHEMA_MIGRATION_BATCH_SIZE", 500))
+# v1 documents taken out of their collection but not yet written back as v2
+STAGING_COLLECTION = "schema_migration_staging"
+LEGACY_QUERY = {"id": {"$exists": True}}
+
+
+def uuid_value(value):
+    """BSON Binary UUID for a string id; anything that is not a UUID is returned unchanged and matches no v2 document"""
+    if isinstance(value, uuid.UUID):
+        return Binary.from_uuid(value, UuidRepresentation.STANDARD)
+    try:
+        return Binary.from_uuid(uuid.UUID(value), UuidRepresentation.STANDARD)
+    except (TypeError, ValueError, AttributeError):
+        return value
+
+
+def id_str(value):
+    """API string id for a stored id of either schema"""
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    if isinstance(value, Binary) and value.subtype == 4:
+        return str(value.as_uuid(UuidRepresentation.STANDARD))
+    return value
+
+
+class EntityCodec:
+    def __init__(self, collection: str, refs: Iterable[str] = (), payloads: Iterable[str] = ()):
+        self.collection = collection
+        self.refs = tuple(refs)  # string UUIDs of other entities, stored as Binary
+        self.payloads = tuple(payloads)  # base64 in the API, Binary in storage
+        # Until detect_legacy has looked, assume v1 documents may still exist
+        self.legacy = True
+
+    def encode(self, doc: dict) -> dict:
+        """Storage form of an API-shaped document"""
+        out = {"_id": uuid_value(doc["id"])}
+        for name, value in doc.items():
+            if name == "id" or name == "_id" or value is None:
+                continue
+            if name in self.refs:
+                value = uuid_value(value)
+            elif name in self.payloads:
+                if not value:
+                    continue
+                value = Binary(base64.b64decode(value) if isinstance(value, str) else value)
+            out[name] = value
+        return out
+
+    def decode(self, doc: Optional[dict]) -> Optional[dict]:
+        """API-shaped document from a stored one of either schema; API-shaped input is returned as is"""
+        if doc is None:
+            return None
+        out = dict(doc)
+        key = out.pop("_id", None)
+        if key is not None and not isinstance(key, ObjectId):
+            out["id"] = id_str(key)
+        for name in self.refs:
+            if name in out:
+                out[name] = id_str(out[name])
+        for name in self.payloads:
+            if isinstance(out.get(name), bytes):
+                out[name] = base64.b64encode(out[name]).decode()
+        return out
+
+    def decode_many(self, docs: Iterable[dict]) -> List[dict]:
+        return [self.decode(doc) for doc in docs]
+
+    def id_query(self, entity_id: str) -> dict:
+        if self.legacy:
+            return {"$or": [{"_id": uuid_value(entity_id)}, {"id": entity_id}]}
+        return {"_id": uuid_value(entity_id)}
+
+    def ids_query(self, entity_ids: List[str]) -> dict:
+        values = [uuid_value(entity_id) for entity_id in entity_ids]
+        if self.legacy:
+            return {"$or": [{"_id": {"$in": values}}, {"id": {"$in": entity_ids}}]}
+        return {"_id": {"$in": values}}
+
+    def ref_query(self, name: str, entity_id: str) -> dict:
+        """Filter on a reference field, e.g. content by artist_id"""
+        if self.legacy:
+            return {name: {"$in": [uuid_value(entity_id), entity_id]}}
+        return {name: uuid_value(entity_id)}
+
+    def refs_query(self, name: str, entity_ids: List[str]) -> dict:
+        values = [uuid_value(entity_id) for entity_id in entity_ids]
+        return {name: {"$in": values + list(entity_ids) if self.legacy else values}}
+
+
+ARTISTS = EntityCodec("artists", payloads=("profile_image",))
+CONTENT = EntityCodec("content", refs=("artist_id",), payloads=("file_data",))
+CODECS = (ARTISTS, CONTENT)
+# Written in v2 form too; v1 status checks are not migrated, the TTL index expires them
+STATUS_CHECKS = EntityCodec("status_checks")
+
+
+async def detect_legacy(db):
+    """Switch each codec to plain v2 filters when its collection has no v1 documents left"""
+    for codec in CODECS:
+        codec.legacy = await db[codec.collection].find_one(LEGACY_QUERY, {"_id": 1}) is not None
+        if codec.legacy:
+            logger.warning("%s still has schema v1 documents; run 'python schema.py migrate'", codec.collection)
+
+
+async def _write_back(db, codec: EntityCodec, staged: List[dict]):
+    """Store staged v1 documents as v2 and clear them from staging; safe to repeat"""
+    await db[codec.collection].bulk_write([
+        ReplaceOne({"_id": uuid_value(doc["id"])}, codec.encode(codec.decode(doc)), upsert=True)
+        for doc in staged
+    ], ordered=False)
+    await db[STAGING_COLLECTION].delete_many({"_id": {"$in": [doc["_id"] for doc in staged]}})
+
+
+async def _resume(db, codec: EntityCodec) -> int:
+    """Finish a batch an interrupted run had staged"""
+    staged = await db[STAGING_COLLECTION].find({"collection": codec.collection}).to_list(None)
+    if not staged:
+        return 0
+    for doc in staged:
+        doc.pop("collection")
+    still_v1 = {doc["_id"] for doc in await db[codec.collection].find(
+        {"_id": {"$in": [doc["_id"] for doc in staged]}}, {"_id": 1}
+    ).to_list(None)}
+    # Originals that were never deleted are simply migrated again by the next batch
+    await db[STAGING_COLLECTION].delete_many({"_id": {"$in": list(still_v1)}})
+    staged = [doc for doc in staged if doc["_id"] not in still_v1]
+    if staged:
+        await _write_back(db, codec, staged)
+    return len(staged)
+
+
+async def migrate_collection(db, codec: EntityCodec, batch_size: int = MIGRATION_BATCH_SIZE,
+                             progress: Optional[Callable[[int, int], None]] = None) -> int:
+    """Convert every v1 document of a collection to v2; returns the number converted
+
+    Each batch is copied to a staging collection before its originals are
+    deleted and the v2 documents written, so an interrupted run resumes
+    without losing documents. Originals changed while a batch was in flight
+    are left for the next batch. v1 and v2 copies never coexist, which keeps
+    unique indexes such as the artist email valid; a document can be missing
+    for the moment between its delete and its write.
+    """
+    migrated = await _resume(db, codec)
+    total = migrated + await db[codec.collection].count_documents(LEGACY_QUERY)
+    while True:
+        batch = await db[codec.collection].find(LEGACY_QUERY).sort("_id", 1).limit(batch_size).to_list(batch_size)
+        if not batch:
+            break
+        await db[STAGING_COLLECTION].insert_many([{**doc, "collection": codec.collection} for doc in batch])
+        # Deleting by the full document only removes originals nobody changed since they were read
+        await db[codec.collection].bulk_write([DeleteOne(doc) for doc in batch], ordered=False)
+        changed = {doc["_id"] for doc in await db[codec.collection].find(
+            {"_id": {"$in": [doc["_id"] for doc in batch]}}, {"_id": 1}
+        ).to_list(None)}
+        if changed:
+            await db[STAGING_COLLECTION].delete_many({"_id": {"$in": list(changed)}})
+        done = [doc for doc in batch if doc["_id"] not in changed]
+        if done:
+            await _write_back(db, codec, done)
+        migrated += len(done)
+        if progress:
+            progress(migrated, total)
+    return migrated
+
+
+async def schema_status(db) -> dict:
+    """Per collection: v1 and v2 document counts, and the sizes MongoDB reports"""
+    status = {}
+    for codec in CODECS:
+        collection = db[codec.collection]
+        total = await collection.count_documents({})
+        legacy = await collection.count_documents(LEGACY_QUERY)
+        entry = {"documents": total, "v1": legacy, "v2": total - legacy}
+        try:
+            stats = await db.command({"collStats": codec.collection})
+            entry.update({
+                "avg_document_bytes": stats.get("avgObjSize", 0),
+                "data_bytes": stats.get("size", 0),
+                "index_bytes": stats.get("totalIndexSize", 0),
+            })
+        except (OperationFailure, NotImplementedError):
+            pass  # e.g. mongomock
+        status[codec.collection] = entry
+    return status
+
+
+if __name__ == "__main__":
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    from indexes import ensure_indexes
+
+    load_dotenv(Path(__file__).parent / '.env')
+    cli = typer.Typer(help="Migrate artists and content to storage schema v2")
+
+    def _db():
+        return AsyncIOMotorClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+
+    @cli.command()
+    def migrate(batch_size: int = typer.Option(MIGRATION_BATCH_SIZE, help="Documents converted per batch")):
+        """Convert v1 documents in batches; rerun to resume after an interruption"""
+        async def run():
+            db = _db()
+            # v2 documents need the v2 indexes, and the v1 unique id index would reject them
+            await ensure_indexes(db)
+            for codec in CODECS:
+                def report(done, total, name=codec.collection):
+                    typer.echo(f"{name}: {done}/{total}")
+                migrated = await migrate_collection(db, codec, batch_size, report)
+                typer.echo(f"{codec.collection}: converted {migrated} documents")
+            await detect_legacy(db)
+            if not any(codec.legacy for codec in CODECS):
+                typer.echo("Migration complete; restart API processes and workers to stop matching v1 ids")
+        asyncio.run(run())
+
+    @cli.command()
+    def status():
+        """Show v1/v2 document counts and collection and index sizes"""
+        for name, entry in asyncio.run(schema_status(_db())).items():
+            typer.echo(f"{name:8} " + "  ".join(f"{key} {value}" for key, value in entry.items()))
+
+    cli()
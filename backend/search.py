@@ -0,0 +1,104 @@
+"""Full-text search backed by MongoDB text indexes.
+
+User input is passed to ``$text`` as a search string, never compiled into a
+regex. MongoDB keeps the text indexes in step with inserts, updates and
+deletes, and only matching documents are scored, so results are ranked by
+``textScore`` without scanning the collection.
+"""
+import html
+from typing import Dict, List, Optional
+
+from fastapi import HTTPException
+from pymongo import TEXT, IndexModel
+
+MAX_SEARCH_LENGTH = 200
+SNIPPET_RADIUS = 40
+
+ARTIST_SEARCH_WEIGHTS = {"name": 10, "location": 3, "bio": 1}
+CONTENT_SEARCH_WEIGHTS = {"title": 10, "tags": 5, "description": 1}
+
+SCORE_PROJECTION = {"score": {"$meta": "textScore"}}
+SCORE_SORT = [("score", {"$meta": "textScore"})]
+
+
+def text_index(weights: Dict[str, int]) -> IndexModel:
+    return IndexModel(
+        [(field, TEXT) for field in weights],
+        name="text_search",
+        weights=weights,
+        default_language="english",
+    )
+
+
+def text_query(search: str) -> dict:
+    """Build a $text filter for a user-supplied search string"""
+    search = search.strip()
+    if len(search) > MAX_SEARCH_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Search must be at most {MAX_SEARCH_LENGTH} characters")
+    return {"$text": {"$search": search}}
+
+
+def search_terms(search: str) -> List[str]:
+    """Terms worth highlighting: quoted phrases and plain words, minus negated ones"""
+    terms = []
+    parts = search.split('"')
+    for i, part in enumerate(parts):
+        if i % 2 == 1:
+            if part.strip():
+                terms.append(part.strip())
+            continue
+        terms.extend(word for word in part.split() if not word.startswith("-"))
+    return [term.lower() for term in terms]
+
+
+def _snippet(text: str, terms: List[str]) -> Optional[str]:
+    lowered = text.lower()
+    matches = []
+    for term in terms:
+        start = lowered.find(term)
+        while start != -1:
+            matches.append((start, start + len(term)))
+            start = lowered.find(term, start + len(term))
+    if not matches:
+        return None
+    matches.sort()
+
+    window_start = max(matches[0][0] - SNIPPET_RADIUS, 0)
+    window_end = min(matches[0][1] + SNIPPET_RADIUS, len(text))
+    pieces = ["…" if window_start > 0 else ""]
+    pos = window_start
+    for start, end in matches:
+        if start < pos or end > window_end:
+            continue
+        pieces.append(html.escape(text[pos:start]))
+        pieces.append(f"<mark>{html.escape(text[start:end])}</mark>")
+        pos = end
+    pieces.append(html.escape(text[pos:window_end]))
+    pieces.append("…" if window_end < len(text) else "")
+    return "".join(pieces)
+
+
+def highlight(doc: dict, fields: List[str], search: str) -> Dict[str, str]:
+    """Return HTML-escaped snippets with <mark>ed matches for each field that contains a search term"""
+    terms = search_terms(search)
+    highlights = {}
+    for field in fields:
+        value = doc.get(field)
+        if isinstance(value, list):
+            value = ", ".join(str(v) for v in value)
+        if not value:
+            continue
+        snippet = _snippet(str(value), terms)
+        if snippet:
+            highlights[field] = snippet
+    return highlights
+
+
+async def search_page(collection, query: dict, search: str, projection: dict, weights: Dict[str, int], skip: int, limit: int, max_time_ms: Optional[int] = None) -> List[dict]:
+    """Run a ranked text search and attach highlight snippets to each hit"""
+    query = {**query, **text_query(search)}
+    find = collection.find(query, {**projection, **SCORE_PROJECTION}, max_time_ms=max_time_ms).sort(SCORE_SORT).skip(skip).limit(limit)
+    docs = await find.to_list(limit)
+    for doc in docs:
+        doc["highlights"] = highlight(doc, list(weights), search)
+    return docs
@@ -0,0 +1,36 @@
+"""Fast response path for documents read from MongoDB.
+
+Documents coming back from our own collections already have the right
+shape, so re-validating them through Pydantic (once when building the
+model, again for ``response_model``) is wasted work. ``DocumentSerializer``
+keeps only the model's fields, fills in defaults for missing optional
+fields and adds computed values; the result is then encoded once by orjson
+through ``ORJSONResponse``.
+"""
+from typing import Callable, Dict, Iterable, List, Optional
+
+
+class DocumentSerializer:
+    def __init__(self, model, computed: Optional[Dict[str, Callable[[dict], object]]] = None):
+        self.fields = list(model.model_fields)
+        self.field_set = set(self.fields)
+        # Only static defaults; factory-built fields (ids, timestamps) are always stored
+        self.defaults = {
+            name: field.default
+            for name, field in model.model_fields.items()
+            if not field.is_required() and field.default_factory is None
+        }
+        self.computed = computed or {}
+
+    def one(self, doc: dict) -> dict:
+        out = {name: doc[name] if name in doc else self.defaults.get(name) for name in self.fields}
+        for name, compute in self.computed.items():
+            out[name] = compute(out)
+        return out
+
+    def many(self, docs: Iterable[dict]) -> List[dict]:
+        return [self.one(doc) for doc in docs]
+
+    def partial(self, docs: Iterable[dict]) -> List[dict]:
+        """Serialize docs read with a narrowed projection, keeping only the fields present"""
+        return [{k: v for k, v in doc.items() if k in self.field_set} for doc in docs]
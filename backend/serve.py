@@ -0,0 +1,145 @@
+"""Production entry point: several uvicorn workers sharing one listening socket.
+
+    python serve.py --workers 4 --port 8001
+
+The app is imported once in the parent and the workers are forked from it,
+so module code and FastAPI's route tables are shared copy-on-write. Nothing
+stateful is created at import time: each worker opens its own MongoDB
+client, feed and caches in the app's lifespan.
+
+On SIGTERM (or Ctrl-C) every worker fails its readiness probe, ends open
+feed streams, stops accepting connections and waits up to
+``--graceful-timeout`` seconds for in-flight requests such as uploads to
+finish. A worker that dies unexpectedly is replaced; while workers keep
+failing lifespan startup (say MongoDB is down) the replacements are spaced
+out exponentially, up to ``RESPAWN_BACKOFF_MAX_SECONDS`` apart.
+"""
+import gc
+import logging
+import os
+import signal
+import socket
+import time
+from pathlib import Path
+
+import typer
+import uvicorn
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+import server  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Replacing a worker that exits this soon after starting is delayed, so a broken startup does not fork in a loop
+RESPAWN_BACKOFF_SECONDS = 1.0
+# Longest delay between replacements while startup keeps failing
+RESPAWN_BACKOFF_MAX_SECONDS = float(os.environ.get("RESPAWN_BACKOFF_MAX_SECONDS", 60))
+# Exit code of a worker whose lifespan startup failed
+STARTUP_FAILED = 3
+
+
+class DrainingServer(uvicorn.Server):
+    def handle_exit(self, sig, frame):
+        if not self.should_exit:
+            server.begin_drain()
+        super().handle_exit(sig, frame)
+
+
+def bind(host: str, port: int, backlog: int) -> socket.socket:
+    family = socket.AF_INET6 if ":" in host else socket.AF_INET
+    sock = socket.socket(family, socket.SOCK_STREAM)
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind((host, port))
+    sock.listen(backlog)
+    sock.set_inheritable(True)
+    return sock
+
+
+def run_worker(sock: socket.socket, config: uvicorn.Config):
+    # Drop the supervisor's handlers; uvicorn installs its own
+    for sig in (signal.SIGTERM, signal.SIGINT):
+        signal.signal(sig, signal.SIG_DFL)
+    worker = DrainingServer(config)
+    worker.run(sockets=[sock])
+    # Tells the supervisor lifespan startup failed (e.g. MongoDB unreachable), so it backs off
+    os._exit(0 if worker.started else STARTUP_FAILED)
+
+
+def main(
+    host: str = typer.Option("0.0.0.0", help="Address to listen on"),
+    port: int = typer.Option(8001, help="Port to listen on"),
+    workers: int = typer.Option(os.cpu_count() or 1, help="Worker processes"),
+    graceful_timeout: int = typer.Option(int(os.environ.get("GRACEFUL_TIMEOUT_SECONDS", 60)), help="Seconds to wait for in-flight requests on shutdown"),
+    backlog: int = typer.Option(2048, help="Listen backlog"),
+    log_level: str = typer.Option("info", help="uvicorn log level"),
+):
+    """Run API workers until interrupted"""
+    sock = bind(host, port, backlog)
+    config = uvicorn.Config(
+        server.app,
+        log_level=log_level,
+        lifespan="on",
+        timeout_graceful_shutdown=graceful_timeout,
+        backlog=backlog,
+    )
+    # Keep the garbage collector from writing to (and so copying) every page inherited from the parent
+    gc.freeze()
+
+    children = {}
+    stopping = False
+    startup_failures = 0
+
+    def spawn():
+        pid = os.fork()
+        if pid == 0:
+            run_worker(sock, config)
+        children[pid] = time.monotonic()
+
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    logger.info("Listening on %s:%d with %d workers", host, port, workers)
+    for _ in range(workers):
+        spawn()
+
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        started = children.pop(pid, None)
+        if started is None or stopping:
+            continue
+        code = os.waitstatus_to_exitcode(status)
+        delay = 0.0
+        if code == STARTUP_FAILED:
+            startup_failures += 1
+            delay = min(RESPAWN_BACKOFF_SECONDS * 2 ** (startup_failures - 1), RESPAWN_BACKOFF_MAX_SECONDS)
+            logger.error("Worker %d could not start; starting a replacement in %.0fs", pid, delay)
+        else:
+            startup_failures = 0
+            logger.warning("Worker %d exited with %d, starting a replacement", pid, code)
+            if time.monotonic() - started < RESPAWN_BACKOFF_SECONDS * 5:
+                delay = RESPAWN_BACKOFF_SECONDS
+        # Sleep in steps so SIGTERM during a long backoff is not held up
+        deadline = time.monotonic() + delay
+        while not stopping and time.monotonic() < deadline:
+            time.sleep(max(0.0, min(0.5, deadline - time.monotonic())))
+        if not stopping:
+            spawn()
+    sock.close()
+
+
+if __name__ == "__main__":
+    typer.run(main)
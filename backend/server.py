@@ -1,33 +1,127 @@
-from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException, Form
-from fastapi.responses import JSONResponse
+from fastapi import FastAPI, APIRouter, File, UploadFile, HTTPException, Form, Request, WebSocket, WebSocketDisconnect
+from fastapi.responses import ORJSONResponse, PlainTextResponse, Response, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
-from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ReturnDocument
+from pymongo.errors import ConnectionFailure, DuplicateKeyError, ExecutionTimeout, PyMongoError
+from contextlib import asynccontextmanager
+import asyncio
 import os
 import logging
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, computed_field
+from typing import Dict, List, Optional
 import uuid
-from datetime import datetime
+from datetime import datetime, timedelta
 import base64
 import mimetypes
+from urllib.parse import quote
+
+from admission import AdmissionController, AdmissionMiddleware, create_rate_buckets
+from batch import check_batch_size, insert_unordered, parse_ids
+from blobstore import CHUNK_SIZE, BlobNotFound, create_blob_store
+from cache import create_cache
+from cleanup import ARTIST_DELETE_INLINE_BATCHES, PURGE_ARTIST, delete_artist as delete_artist_document, purge_artist_content, queue_release, release_unreferenced, schedule_collector
+from feed import FEED_HEARTBEAT_SECONDS, FeedHub, parse_entities, sse_stream
+from database import HEALTHZ_TIMEOUT_SECONDS, LIST_TIME_MS, LOOKUP_TIME_MS, SEARCH_TIME_MS, check_connection, create_client, list_read_preference
+from http_cache import IMMUTABLE, REVALIDATE, blob_etag, cache_headers, document_etag, is_not_modified, list_etag, not_modified
+from indexes import ensure_indexes, explain_query_shapes
+from jobs import Worker, enqueue, job_counts
+from media import INLINE_TYPES, TypeSniffer, media_filter, media_kind_for
+from metrics import MetricsMiddleware, MongoCommandListener, render_metrics
+from renditions import RENDITION_SIZES, is_renderable, pick_rendition, shutdown_renditions
+from schema import ARTISTS, CONTENT, STATUS_CHECKS, detect_legacy
+from serialization import DocumentSerializer
+from similarity import DUPLICATE_LIMIT, SIMILAR_DISTANCE_LIMIT, SIMILAR_LIMIT, SIMILAR_MAX_DISTANCE, SimilarityIndex
+from stats import get_stats, reconcile_stats, record_deletes, record_upload
+from status_checks import STATUS_SORT, check_limit, status_filter, summary_pipeline, summary_window
+from tags import facet_counts, facet_stages, normalize_tags, parse_tags, popular_tags, rebuild_tag_counts, record_tags, tag_filter
+from search import ARTIST_SEARCH_WEIGHTS, CONTENT_SEARCH_WEIGHTS, highlight, search_page, text_query
+from processing import HANDLERS, PROCESS_CONTENT, PROCESS_PROFILE_IMAGE, JobContext
+from pagination import KEYSET_FIELDS, KEYSET_SORT, NEXT_CURSOR_HEADER, after_cursor, check_page_limit, fetch_page
+from uploads import MAX_PART_BYTES, MAX_PARTS, MAX_UPLOAD_BYTES, UPLOAD_COMPLETE_LEASE_SECONDS, UPLOAD_SESSION_SECONDS, UploadLimitMiddleware, limit_size
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
-mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+# MongoDB connection, opened by the lifespan handler (see database.py for settings)
+client = None
+db = None
+read_db = None  # same database, read with the list/search read preference
+
+# Uploaded media lives in a content-addressed blob store, not in documents
+blob_store = None
+
+# Metadata cache for hot artist/content lookups
+cache = create_cache()
+
+# Per-client rate limits and the in-flight upload byte budget (see admission.py)
+admission = AdmissionController(create_rate_buckets())
+
+# Perceptual hashes of image content, for near-duplicate search (see similarity.py)
+similarity = SimilarityIndex()
+
+def init_db(mongo_client, db_name: str):
+    """Point the app at a database; also used by the benchmarks to inject their own client"""
+    global client, db, read_db, blob_store
+    client = mongo_client
+    db = mongo_client[db_name]
+    read_db = mongo_client.get_database(db_name, read_preference=list_read_preference())
+    blob_store = create_blob_store(db, ROOT_DIR)
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Runs in each worker process (see serve.py), so nothing is shared across a fork
+    app.state.draining = False
+    init_db(create_client([MongoCommandListener()]), os.environ['DB_NAME'])
+    stop_jobs = asyncio.Event()
+    jobs_task = None
+    warm_task = None
+    try:
+        await check_connection(client)
+        await detect_legacy(db)
+        await ensure_indexes(db)
+        await feed.start(db)
+        if os.environ.get("JOBS_IN_PROCESS") == "1":
+            # Single-process setups (local development) run the job worker here instead of worker.py
+            worker = Worker(JobContext(db, blob_store, cache, feed.publish, similarity), HANDLERS, int(os.environ.get("JOBS_IN_PROCESS_CONCURRENCY", 2)))
+            await schedule_collector(db)
+            jobs_task = asyncio.create_task(worker.run(stop_jobs))
+        # Load the hash index in the background so the first similarity query does not wait for it
+        warm_task = asyncio.create_task(similarity.refresh(db))
+        yield
+    finally:
+        if warm_task:
+            warm_task.cancel()
+        stop_jobs.set()
+        if jobs_task:
+            await jobs_task
+        await feed.stop()
+        shutdown_renditions()
+        client.close()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(default_response_class=ORJSONResponse, lifespan=lifespan)
+
+def begin_drain():
+    """Called on SIGTERM before in-flight requests are drained: fail readiness and end live feeds"""
+    app.state.draining = True
+    feed.close()
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
 
 # Define Models
+def thumbnail_urls(content_id: str, sizes: List[int]) -> Dict[str, str]:
+    return {str(size): f"/api/content/{content_id}/thumb?size={size}" for size in sizes}
+
+class Rendition(BaseModel):
+    size: int  # bounding box in pixels
+    width: int
+    height: int
+    blob_id: str
+    media_type: str
+
 class Artist(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     name: str
@@ -36,10 +130,40 @@ class Artist(BaseModel):
     location: Optional[str] = ""
     website: Optional[str] = ""
     social_links: Optional[dict] = {}
-    profile_image: Optional[str] = ""  # base64 encoded
+    profile_image: Optional[str] = ""  # legacy base64, superseded by profile_image_blob
+    profile_image_blob: Optional[str] = None  # sha256 of the stored image
+    profile_image_type: Optional[str] = None
+    profile_renditions: List[Rendition] = []
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class ArtistStats(BaseModel):
+    """Counters kept current on every upload and delete"""
+    artist_id: str
+    content_count: int = 0
+    total_bytes: int = 0
+    latest_upload_at: Optional[datetime] = None
+    updated_at: Optional[datetime] = None
+
+class ArtistSummary(BaseModel):
+    """Artist without inline binary fields, used by list endpoints"""
+    id: str
+    name: str
+    email: str
+    bio: Optional[str] = ""
+    location: Optional[str] = ""
+    website: Optional[str] = ""
+    social_links: Optional[dict] = {}
+    profile_image_blob: Optional[str] = None
+    profile_image_type: Optional[str] = None
+    profile_renditions: List[Rendition] = []
+    has_profile_image: bool = False  # /profile-image serves a stored or legacy inline image
+    created_at: datetime
+    updated_at: datetime
+    score: Optional[float] = None  # search relevance, only set for search results
+    highlights: Optional[Dict[str, str]] = None
+    stats: Optional[ArtistStats] = None  # only set when requested with with_stats
+
 class ArtistCreate(BaseModel):
     name: str
     email: str
@@ -48,6 +172,17 @@ class ArtistCreate(BaseModel):
     website: Optional[str] = ""
     social_links: Optional[dict] = {}
 
+class ArtistBatchCreate(BaseModel):
+    artists: List[ArtistCreate]
+
+class BatchError(BaseModel):
+    index: int  # position of the failed item in the request
+    detail: str
+
+class ArtistBatchResult(BaseModel):
+    created: List[Artist]
+    errors: List[BatchError]
+
 class ArtistUpdate(BaseModel):
     name: Optional[str] = None
     bio: Optional[str] = None
@@ -55,25 +190,113 @@ class ArtistUpdate(BaseModel):
     website: Optional[str] = None
     social_links: Optional[dict] = None
 
+class DuplicateMatch(BaseModel):
+    id: str
+    distance: int  # differing perceptual hash bits; 0 for the same file
+
 class Content(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     artist_id: str
     title: str
     description: Optional[str] = ""
-    file_data: str  # base64 encoded file
-    file_type: str  # mime type
+    file_data: Optional[str] = None  # legacy base64, superseded by blob_id
+    blob_id: Optional[str] = None  # sha256 of the stored file
+    file_type: str  # mime type, sniffed from the file's first bytes
     file_name: str
     file_size: int
     tags: List[str] = []
+    # Media metadata, extracted once by the processing job (see media.py)
+    media_kind: Optional[str] = None  # image, audio, video, document, other
+    width: Optional[int] = None
+    height: Optional[int] = None
+    orientation: Optional[str] = None  # landscape, portrait, square
+    duration: Optional[float] = None  # seconds
+    exif: Optional[Dict[str, str]] = None
+    phash: Optional[str] = None  # 64-bit perceptual hash, hex
+    duplicates: Optional[List[DuplicateMatch]] = None  # the artist's earlier uploads of the same piece
+    renditions: List[Rendition] = []
+    processing_status: str = "ready"  # pending, processing, ready, failed
+    processing_error: Optional[str] = None
     created_at: datetime = Field(default_factory=datetime.utcnow)
     updated_at: datetime = Field(default_factory=datetime.utcnow)
 
+class ContentSummary(BaseModel):
+    """Content without the inline file payload, used by list endpoints"""
+    id: str
+    artist_id: str
+    title: str
+    description: Optional[str] = ""
+    blob_id: Optional[str] = None
+    file_type: str
+    file_name: str
+    file_size: int
+    tags: List[str] = []
+    media_kind: Optional[str] = None
+    width: Optional[int] = None
+    height: Optional[int] = None
+    orientation: Optional[str] = None
+    duration: Optional[float] = None
+    renditions: List[Rendition] = []
+    processing_status: str = "ready"
+    created_at: datetime
+    updated_at: datetime
+    score: Optional[float] = None  # search relevance, only set for search results
+    highlights: Optional[Dict[str, str]] = None
+    distance: Optional[int] = None  # hash bits differing from the query, only set for similar content
+
+    @computed_field
+    @property
+    def thumbnail_urls(self) -> Dict[str, str]:
+        return thumbnail_urls(self.id, [r.size for r in self.renditions])
+
+class ContentStatus(BaseModel):
+    id: str
+    processing_status: str
+    processing_error: Optional[str] = None
+    duplicates: List[DuplicateMatch] = []
+    updated_at: datetime
+
+class FacetCount(BaseModel):
+    value: Optional[str]
+    count: int
+    name: Optional[str] = None  # display name, for artist facets
+
+class ContentSearchResult(BaseModel):
+    items: List[ContentSummary]
+    facets: Dict[str, List[FacetCount]]  # tags, file_types, media_kinds, artists
+    total: int
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
 class ContentCreate(BaseModel):
     artist_id: str
     title: str
     description: Optional[str] = ""
     tags: List[str] = []
 
+class ContentBatchDelete(BaseModel):
+    ids: List[str]
+
+class UploadSessionCreate(BaseModel):
+    file_name: str
+    file_type: Optional[str] = None
+    total_size: Optional[int] = None
+
+class UploadSession(BaseModel):
+    id: str = Field(default_factory=lambda: str(uuid.uuid4()))
+    file_name: str
+    file_type: Optional[str] = None
+    total_size: Optional[int] = None
+    parts: dict = {}  # part number -> {"blob_id": ..., "size": ...}
+    part_blobs: List[str] = []
+    status: str = "open"  # open, completing, completed, aborted, expired
+    content_id: Optional[str] = None
+    created_at: datetime = Field(default_factory=datetime.utcnow)
+    updated_at: datetime = Field(default_factory=datetime.utcnow)
+    expires_at: datetime = Field(default_factory=lambda: datetime.utcnow() + timedelta(seconds=UPLOAD_SESSION_SECONDS))
+
 class StatusCheck(BaseModel):
     id: str = Field(default_factory=lambda: str(uuid.uuid4()))
     client_name: str
@@ -82,77 +305,358 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+class StatusCheckCount(BaseModel):
+    client_name: str
+    bucket: datetime  # start of the bucket
+    count: int
+
+# Serializers for documents returned straight from the database, skipping Pydantic validation
+ARTIST_SERIALIZER = DocumentSerializer(Artist)
+ARTIST_SUMMARY_SERIALIZER = DocumentSerializer(
+    ArtistSummary,
+    {"has_profile_image": lambda doc: bool(doc["profile_image_blob"] or doc["has_profile_image"])}
+)
+CONTENT_SERIALIZER = DocumentSerializer(Content)
+STATUS_CHECK_SERIALIZER = DocumentSerializer(StatusCheck)
+CONTENT_SUMMARY_SERIALIZER = DocumentSerializer(
+    ContentSummary,
+    {"thumbnail_urls": lambda doc: thumbnail_urls(doc["id"], [r["size"] for r in doc["renditions"]])}
+)
+
+# Live change events for /api/feed
+feed = FeedHub({
+    "artist": lambda doc: ARTIST_SUMMARY_SERIALIZER.one(ARTISTS.decode(doc)),
+    "content": lambda doc: CONTENT_SUMMARY_SERIALIZER.one(CONTENT.decode(doc)),
+})
+
+# Projection helpers
+# Fields added to summaries after the query, never read from the collection itself
+DERIVED_FIELDS = ("score", "highlights", "stats", "distance", "has_profile_image")
+
+def summary_projection(model, fields: Optional[str] = None) -> dict:
+    """Build a Mongo projection for a summary model, optionally narrowed by a comma-separated field list"""
+    allowed = [f for f in model.model_fields if f not in DERIVED_FIELDS]
+    if fields:
+        selected = [f.strip() for f in fields.split(",") if f.strip()]
+        unknown = [f for f in selected if f not in allowed]
+        if unknown:
+            raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+        # Keyset fields feed the next cursor and updated_at feeds the ETag
+        always = KEYSET_FIELDS + ("updated_at",)
+        allowed = list(always) + [f for f in selected if f not in always]
+    # Inclusion projections keep _id, which holds the id in storage schema v2
+    return {f: 1 for f in allowed}
+
+def summary_response(serializer: DocumentSerializer, docs: List[dict], request: Request, fields: Optional[str] = None, next_cursor: Optional[str] = None, related: Optional[List[dict]] = None):
+    """Return summaries, or the raw selected columns when a field list was requested
+
+    related lists documents embedded in the summaries (e.g. artist stats) whose changes must also change the ETag.
+    """
+    # Answer revalidations from the page's ids and timestamps, before any serialization. No
+    # Last-Modified: a deletion or an item leaving the page does not move the newest updated_at,
+    # so If-Modified-Since would confirm a stale page; only the ETag reflects membership
+    etag = list_etag(docs + (related or []))
+    if is_not_modified(request, etag):
+        response = not_modified(etag)
+    else:
+        response = ORJSONResponse(serializer.partial(docs) if fields else serializer.many(docs))
+        response.headers.update(cache_headers(etag))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+# Media helpers
+async def iter_upload(file: UploadFile):
+    """Yield an uploaded file in fixed-size chunks"""
+    while True:
+        chunk = await file.read(CHUNK_SIZE)
+        if not chunk:
+            break
+        yield chunk
+
+def parse_range(range_header: Optional[str], size: int):
+    """Return the (start, end) byte range requested, or None for the whole file"""
+    if not range_header or not range_header.startswith("bytes="):
+        return None
+    spec = range_header[len("bytes="):].split(",")[0].strip()
+    start_s, _, end_s = spec.partition("-")
+    try:
+        if start_s:
+            start = int(start_s)
+            end = int(end_s) if end_s else size - 1
+        else:
+            # Suffix range: the last N bytes
+            start = max(size - int(end_s), 0)
+            end = size - 1
+    except ValueError:
+        return None
+    end = min(end, size - 1)
+    if start > end or start >= size:
+        raise HTTPException(
+            status_code=416,
+            detail="Requested range not satisfiable",
+            headers={"Content-Range": f"bytes */{size}"}
+        )
+    return start, end
+
+def content_disposition(disposition: str, file_name: Optional[str]) -> str:
+    """Content-Disposition with an ASCII filename and the exact one as filename* (RFC 6266)"""
+    if not file_name:
+        return disposition
+    fallback = "".join(c if " " <= c <= "~" and c not in '"\\' else "_" for c in file_name)
+    return f"{disposition}; filename=\"{fallback}\"; filename*=UTF-8''{quote(file_name, safe='')}"
+
+async def media_response(
+    request: Request,
+    blob_id: Optional[str],
+    legacy_data: Optional[str],
+    media_type: str,
+    file_name: Optional[str] = None,
+    etag: Optional[str] = None,
+    cache_control: str = IMMUTABLE
+):
+    """Stream a blob (or a legacy inline base64 payload) honouring Range and conditional requests"""
+    etag = etag or (blob_etag(blob_id) if blob_id else None)
+    if etag and is_not_modified(request, etag):
+        return not_modified(etag, cache_control=cache_control)
+
+    # Uploads are served from the API origin: anything that is not plain media is a download
+    # the browser may neither sniff nor render, so an uploaded page cannot run script here
+    headers = {"Accept-Ranges": "bytes", "X-Content-Type-Options": "nosniff", "Content-Security-Policy": "sandbox"}
+    if etag:
+        headers.update(cache_headers(etag, cache_control=cache_control))
+    inline = media_type in INLINE_TYPES
+    if not inline:
+        media_type = "application/octet-stream"
+    if file_name or not inline:
+        headers["Content-Disposition"] = content_disposition("inline" if inline else "attachment", file_name)
+
+    if blob_id:
+        try:
+            size = await blob_store.size(blob_id)
+        except BlobNotFound:
+            raise HTTPException(status_code=404, detail="File not found")
+    elif legacy_data:
+        payload = base64.b64decode(legacy_data)
+        size = len(payload)
+    else:
+        raise HTTPException(status_code=404, detail="File not found")
+
+    byte_range = parse_range(request.headers.get("range"), size)
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    headers["Content-Length"] = str(length)
+    status_code = 200
+    if byte_range:
+        status_code = 206
+        headers["Content-Range"] = f"bytes {start}-{end}/{size}"
+
+    if blob_id:
+        return StreamingResponse(blob_store.open(blob_id, start, length), status_code=status_code, media_type=media_type, headers=headers)
+    return Response(payload[start:end + 1], status_code=status_code, media_type=media_type, headers=headers)
+
+async def release_blob(sha256: str):
+    """Delete a blob once no document or open upload session references it"""
+    await release_unreferenced(db, blob_store, [sha256])
+
+# Cached lookups, decoded to the API shape; binary legacy fields are never cached
+ARTIST_METADATA_PROJECTION = {"profile_image": 0}
+CONTENT_METADATA_PROJECTION = {"file_data": 0}
+
+async def find_artist(artist_id: str) -> Optional[dict]:
+    async def load():
+        return ARTISTS.decode(await db.artists.find_one(ARTISTS.id_query(artist_id), ARTIST_METADATA_PROJECTION, max_time_ms=LOOKUP_TIME_MS))
+    return await cache.get_or_load(f"artist:{artist_id}", load)
+
+async def find_content(content_id: str) -> Optional[dict]:
+    async def load():
+        return CONTENT.decode(await db.content.find_one(CONTENT.id_query(content_id), CONTENT_METADATA_PROJECTION, max_time_ms=LOOKUP_TIME_MS))
+    return await cache.get_or_load(f"content:{content_id}", load)
+
+async def mark_inline_profile_images(artists: List[dict]):
+    """Flag the artists whose only profile image is a legacy inline one, without reading the images"""
+    legacy = [artist["id"] for artist in artists if not artist.get("profile_image_blob")]
+    if not legacy:
+        return
+    docs = await read_db.artists.find(
+        {**ARTISTS.ids_query(legacy), "profile_image": {"$nin": ["", None]}}, {"_id": 1, "id": 1}
+    ).to_list(None)
+    inline = {artist["id"] for artist in ARTISTS.decode_many(docs)}
+    for artist in artists:
+        artist["has_profile_image"] = artist["id"] in inline
+
+async def exact_duplicates(artist_id: str, blob_id: str) -> List[dict]:
+    """The artist's content with the same file; the processing job adds near duplicates"""
+    docs = await db.content.find(
+        {"blob_id": blob_id, **CONTENT.ref_query("artist_id", artist_id)}, {"_id": 1, "id": 1}
+    ).limit(DUPLICATE_LIMIT).to_list(DUPLICATE_LIMIT)
+    return [{"id": doc["id"], "distance": 0} for doc in CONTENT.decode_many(docs)]
+
+async def invalidate_content(content_id: str, artist_id: str):
+    await cache.invalidate(f"content:{content_id}")
+    # Drops every cached page of this artist's content list
+    await cache.bump(f"artist_content:{artist_id}")
+
 # Artist endpoints
 @api_router.post("/artists", response_model=Artist)
 async def create_artist(artist: ArtistCreate):
     """Create a new artist profile"""
-    # Check if email already exists
-    existing_artist = await db.artists.find_one({"email": artist.email})
-    if existing_artist:
-        raise HTTPException(status_code=400, detail="Artist with this email already exists")
-    
     artist_dict = artist.dict()
     artist_obj = Artist(**artist_dict)
-    await db.artists.insert_one(artist_obj.dict())
+    try:
+        await db.artists.insert_one(ARTISTS.encode(artist_obj.dict(exclude={"profile_image"})))
+    except DuplicateKeyError:
+        # The unique email index rejects duplicates, including concurrent creates
+        raise HTTPException(status_code=400, detail="Artist with this email already exists")
+    feed.publish("artists", "created", artist_obj.id, artist_obj.dict())
     return artist_obj
 
-@api_router.get("/artists", response_model=List[Artist])
-async def get_all_artists(skip: int = 0, limit: int = 20, search: Optional[str] = None):
-    """Get all artists with optional search"""
-    query = {}
+@api_router.post("/artists:batch", response_model=ArtistBatchResult)
+async def create_artists_batch(batch: ArtistBatchCreate):
+    """Create many artists at once; failures are reported per item"""
+    check_batch_size(len(batch.artists))
+    artist_objs = [Artist(**artist.dict()) for artist in batch.artists]
+    write_errors = await insert_unordered(
+        db.artists,
+        [ARTISTS.encode(artist_obj.dict(exclude={"profile_image"})) for artist_obj in artist_objs]
+    )
+    
+    errors = []
+    for index, error in sorted(write_errors.items()):
+        detail = "Artist with this email already exists" if error.get("code") == 11000 else error.get("errmsg", "Write failed")
+        errors.append(BatchError(index=index, detail=detail))
+    created = [artist_obj for i, artist_obj in enumerate(artist_objs) if i not in write_errors]
+    for artist_obj in created:
+        feed.publish("artists", "created", artist_obj.id, artist_obj.dict())
+    return ArtistBatchResult(created=created, errors=errors)
+
+@api_router.get("/artists", response_model=List[ArtistSummary])
+async def get_all_artists(request: Request, skip: int = 0, limit: int = 20, search: Optional[str] = None, fields: Optional[str] = None, cursor: Optional[str] = None, with_stats: bool = False):
+    """Get all artists with optional search; pass the X-Next-Cursor header back as cursor for the next page"""
+    check_page_limit(limit, skip)
+    projection = summary_projection(ArtistSummary, fields)
+    next_cursor = None
     if search:
-        query = {
-            "$or": [
-                {"name": {"$regex": search, "$options": "i"}},
-                {"bio": {"$regex": search, "$options": "i"}},
-                {"location": {"$regex": search, "$options": "i"}}
-            ]
-        }
+        # Search results are ranked by relevance, so they page with skip only
+        artists = ARTISTS.decode_many(await search_page(read_db.artists, {}, search, projection, ARTIST_SEARCH_WEIGHTS, skip, limit, SEARCH_TIME_MS))
+    else:
+        query = after_cursor({}, cursor)
+        find = read_db.artists.find(query, projection, max_time_ms=LIST_TIME_MS).sort(KEYSET_SORT)
+        if not cursor:
+            find = find.skip(skip)
+        artists, next_cursor = await fetch_page(find, limit)
+        artists = ARTISTS.decode_many(artists)
+    if not fields:
+        await mark_inline_profile_images(artists)
     
-    artists = await db.artists.find(query).skip(skip).limit(limit).to_list(limit)
-    return [Artist(**artist) for artist in artists]
+    related = None
+    if with_stats:
+        # One indexed $in read for the page, instead of counting content per artist
+        stats = await get_stats(read_db, [artist["id"] for artist in artists])
+        for artist in artists:
+            artist["stats"] = stats[artist["id"]]
+        related = list(stats.values())
+    return summary_response(ARTIST_SUMMARY_SERIALIZER, artists, request, fields, next_cursor, related)
 
 @api_router.get("/artists/{artist_id}", response_model=Artist)
-async def get_artist(artist_id: str):
+async def get_artist(artist_id: str, request: Request):
     """Get specific artist by ID"""
-    artist = await db.artists.find_one({"id": artist_id})
+    artist = await find_artist(artist_id)
     if not artist:
         raise HTTPException(status_code=404, detail="Artist not found")
-    return Artist(**artist)
+    etag = document_etag(artist)
+    if is_not_modified(request, etag, artist["updated_at"]):
+        return not_modified(etag, artist["updated_at"])
+    return ORJSONResponse(ARTIST_SERIALIZER.one(artist), headers=cache_headers(etag, artist["updated_at"]))
+
+@api_router.get("/artists/{artist_id}/stats", response_model=ArtistStats)
+async def get_artist_stats(artist_id: str):
+    """Content count, total bytes and latest upload for an artist"""
+    artist = await find_artist(artist_id)
+    if not artist:
+        raise HTTPException(status_code=404, detail="Artist not found")
+    stats = await get_stats(db, [artist_id])
+    return ORJSONResponse(stats[artist_id])
 
 @api_router.put("/artists/{artist_id}", response_model=Artist)
 async def update_artist(artist_id: str, artist_update: ArtistUpdate):
     """Update artist profile"""
-    artist = await db.artists.find_one({"id": artist_id})
-    if not artist:
-        raise HTTPException(status_code=404, detail="Artist not found")
-    
     update_data = {k: v for k, v in artist_update.dict().items() if v is not None}
     update_data["updated_at"] = datetime.utcnow()
     
-    await db.artists.update_one({"id": artist_id}, {"$set": update_data})
-    updated_artist = await db.artists.find_one({"id": artist_id})
+    updated_artist = ARTISTS.decode(await db.artists.find_one_and_update(
+        ARTISTS.id_query(artist_id),
+        {"$set": update_data},
+        return_document=ReturnDocument.AFTER
+    ))
+    if not updated_artist:
+        raise HTTPException(status_code=404, detail="Artist not found")
+    await cache.invalidate(f"artist:{artist_id}")
+    feed.publish("artists", "updated", artist_id, updated_artist)
     return Artist(**updated_artist)
 
+@api_router.delete("/artists/{artist_id}")
+async def delete_artist(artist_id: str):
+    """Delete an artist and all their content; large catalogues finish in a background job (202)"""
+    ctx = JobContext(db, blob_store, cache, feed.publish)
+    if not await delete_artist_document(ctx, artist_id):
+        raise HTTPException(status_code=404, detail="Artist not found")
+    deleted, done = await purge_artist_content(ctx, artist_id, ARTIST_DELETE_INLINE_BATCHES)
+    if done:
+        return {"message": "Artist deleted successfully", "content_deleted": deleted}
+    # Should this never be queued (the process dies first), the orphan collector finishes the purge
+    job_id = await enqueue(db, PURGE_ARTIST, {"artist_id": artist_id})
+    return ORJSONResponse({"message": "Artist deleted; removing remaining content", "content_deleted": deleted, "job_id": job_id}, status_code=202)
+
 @api_router.post("/artists/{artist_id}/profile-image")
 async def upload_profile_image(artist_id: str, file: UploadFile = File(...)):
     """Upload profile image for artist"""
-    artist = await db.artists.find_one({"id": artist_id})
+    artist = await find_artist(artist_id)
     if not artist:
         raise HTTPException(status_code=404, detail="Artist not found")
     
-    # Read file and convert to base64
-    file_content = await file.read()
-    file_base64 = base64.b64encode(file_content).decode('utf-8')
+    # Stream file into the blob store, typing it from its first bytes
+    sniffer = TypeSniffer()
+    blob = await blob_store.put(sniffer.wrap(limit_size(iter_upload(file), MAX_UPLOAD_BYTES)))
+    file_type = sniffer.media_type(file.content_type or mimetypes.guess_type(file.filename)[0])
     
-    # Update artist with profile image
+    # Update artist with a reference to the profile image
     await db.artists.update_one(
-        {"id": artist_id}, 
-        {"$set": {"profile_image": file_base64, "updated_at": datetime.utcnow()}}
+        ARTISTS.id_query(artist_id), 
+        {
+            "$set": {"profile_image_blob": blob.sha256, "profile_image_type": file_type, "profile_renditions": [], "updated_at": datetime.utcnow()},
+            "$unset": {"profile_image": ""}
+        }
     )
+    await cache.invalidate(f"artist:{artist_id}")
+    feed.publish("artists", "updated", artist_id)
+    if is_renderable(file_type):
+        await enqueue(db, PROCESS_PROFILE_IMAGE, {"artist_id": artist_id, "blob_id": blob.sha256})
     
     return {"message": "Profile image uploaded successfully"}
 
+@api_router.get("/artists/{artist_id}/profile-image")
+async def get_profile_image(artist_id: str, request: Request, size: Optional[int] = None):
+    """Stream an artist's profile image, or its closest thumbnail when a size is given"""
+    artist = await find_artist(artist_id)
+    if not artist:
+        raise HTTPException(status_code=404, detail="Artist not found")
+    if not artist.get("profile_image_blob"):
+        # Only artists created before the blob store have an inline image
+        artist = ARTISTS.decode(await db.artists.find_one(ARTISTS.id_query(artist_id)))
+    rendition = pick_rendition(artist.get("profile_renditions", []), size) if size else None
+    # The profile image can be replaced, so clients must revalidate it
+    if rendition:
+        return await media_response(request, rendition["blob_id"], None, rendition["media_type"], cache_control=REVALIDATE)
+    return await media_response(
+        request,
+        artist.get("profile_image_blob"),
+        artist.get("profile_image"),
+        artist.get("profile_image_type") or "image/jpeg",
+        etag=None if artist.get("profile_image_blob") else document_etag(artist),
+        cache_control=REVALIDATE
+    )
+
 # Content endpoints
 @api_router.post("/content")
 async def upload_content(
@@ -164,73 +668,478 @@ async def upload_content(
 ):
     """Upload content for an artist"""
     # Verify artist exists
-    artist = await db.artists.find_one({"id": artist_id})
+    artist = await find_artist(artist_id)
     if not artist:
         raise HTTPException(status_code=404, detail="Artist not found")
     
-    # Read file and convert to base64
-    file_content = await file.read()
-    file_base64 = base64.b64encode(file_content).decode('utf-8')
+    # Stream file into the blob store, typing it from its first bytes
+    sniffer = TypeSniffer()
+    blob = await blob_store.put(sniffer.wrap(limit_size(iter_upload(file), MAX_UPLOAD_BYTES)))
     
-    # Get file info
-    file_type = file.content_type or mimetypes.guess_type(file.filename)[0] or "application/octet-stream"
-    file_size = len(file_content)
+    # Get file info; the client's type only counts when the bytes are not recognised
+    file_type = sniffer.media_type(file.content_type or mimetypes.guess_type(file.filename)[0])
+    file_size = blob.size
     
     # Parse tags
-    tags_list = [tag.strip() for tag in tags.split(",") if tag.strip()] if tags else []
+    tags_list = parse_tags(tags)
+    duplicates = await exact_duplicates(artist_id, blob.sha256)
     
     # Create content object
     content_obj = Content(
         artist_id=artist_id,
         title=title,
         description=description,
-        file_data=file_base64,
+        blob_id=blob.sha256,
         file_type=file_type,
         file_name=file.filename,
         file_size=file_size,
-        tags=tags_list
+        tags=tags_list,
+        media_kind=media_kind_for(file_type),
+        duplicates=duplicates or None,
+        processing_status="pending"
     )
     
-    await db.content.insert_one(content_obj.dict())
-    return {"message": "Content uploaded successfully", "content_id": content_obj.id}
+    await db.content.insert_one(CONTENT.encode(content_obj.dict(exclude={"file_data"})))
+    # Thumbnails and other post-processing run in a job worker; poll /content/{id}/status
+    await enqueue(db, PROCESS_CONTENT, {"content_id": content_obj.id, "blob_id": blob.sha256})
+    await record_upload(db, artist_id, file_size, content_obj.created_at)
+    await record_tags(db, tags_list, 1)
+    await cache.bump(f"artist_content:{artist_id}")
+    feed.publish("content", "created", content_obj.id, content_obj.dict())
+    # Near duplicates are only known once processing has hashed the image; see /content/{id}/status
+    return {"message": "Content uploaded successfully", "content_id": content_obj.id, "processing_status": content_obj.processing_status, "duplicates": duplicates}
+
+@api_router.get("/content", response_model=List[ContentSummary])
+async def get_all_content(request: Request, skip: int = 0, limit: int = 20, artist_id: Optional[str] = None, search: Optional[str] = None, fields: Optional[str] = None, cursor: Optional[str] = None, ids: Optional[str] = None, tags: Optional[str] = None, tag_mode: str = "all", media_kind: Optional[str] = None, orientation: Optional[str] = None, min_duration: Optional[float] = None, max_duration: Optional[float] = None):
+    """Get all content with optional filtering; pass the X-Next-Cursor header back as cursor for the next page"""
+    check_page_limit(limit, skip)
+    query = {**tag_filter(tags, tag_mode), **media_filter(media_kind, orientation, min_duration, max_duration)}
+    if artist_id:
+        query.update(CONTENT.ref_query("artist_id", artist_id))
+    
+    projection = summary_projection(ContentSummary, fields)
+    if ids:
+        # Fetch-by-ids in one $in query, returned in the requested order
+        id_list = parse_ids(ids)
+        query.update(CONTENT.ids_query(id_list))
+        found = {c["id"]: c for c in CONTENT.decode_many(await read_db.content.find(query, projection, max_time_ms=LIST_TIME_MS).to_list(len(id_list)))}
+        content = [found[i] for i in id_list if i in found]
+        return summary_response(CONTENT_SUMMARY_SERIALIZER, content, request, fields)
+    if search:
+        # Search results are ranked by relevance, so they page with skip only
+        content = CONTENT.decode_many(await search_page(read_db.content, query, search, projection, CONTENT_SEARCH_WEIGHTS, skip, limit, SEARCH_TIME_MS))
+        return summary_response(CONTENT_SUMMARY_SERIALIZER, content, request, fields)
+    
+    query = after_cursor(query, cursor)
+    find = read_db.content.find(query, projection, max_time_ms=LIST_TIME_MS).sort(KEYSET_SORT)
+    if not cursor:
+        find = find.skip(skip)
+    content, next_cursor = await fetch_page(find, limit)
+    return summary_response(CONTENT_SUMMARY_SERIALIZER, CONTENT.decode_many(content), request, fields, next_cursor)
 
-@api_router.get("/content", response_model=List[Content])
-async def get_all_content(skip: int = 0, limit: int = 20, artist_id: Optional[str] = None, search: Optional[str] = None):
-    """Get all content with optional filtering"""
-    query = {}
+@api_router.get("/content:search", response_model=ContentSearchResult)
+async def search_content_with_facets(skip: int = 0, limit: int = 20, search: Optional[str] = None, tags: Optional[str] = None, tag_mode: str = "all", artist_id: Optional[str] = None, file_type: Optional[str] = None, media_kind: Optional[str] = None, orientation: Optional[str] = None, min_duration: Optional[float] = None, max_duration: Optional[float] = None):
+    """Search or filter content, returning a page of results plus tag, file type, media kind and artist counts"""
+    check_page_limit(limit, skip)
+    match = {**tag_filter(tags, tag_mode), **media_filter(media_kind, orientation, min_duration, max_duration)}
     if artist_id:
-        query["artist_id"] = artist_id
+        match.update(CONTENT.ref_query("artist_id", artist_id))
+    if file_type:
+        match["file_type"] = file_type
+    projection = summary_projection(ContentSummary)
+    pipeline = []
     if search:
-        query["$or"] = [
-            {"title": {"$regex": search, "$options": "i"}},
-            {"description": {"$regex": search, "$options": "i"}},
-            {"tags": {"$regex": search, "$options": "i"}}
-        ]
+        # $text must be in the first $match; the score is kept for ranking inside $facet
+        pipeline.append({"$match": {**match, **text_query(search)}})
+        pipeline.append({"$addFields": {"score": {"$meta": "textScore"}}})
+        projection["score"] = 1
+        sort = {"score": -1, "created_at": -1, "_id": -1}
+    else:
+        pipeline.append({"$match": match})
+        sort = {"created_at": -1, "_id": -1}
+    # One pass over the matches yields both the page and the facet counts
+    pipeline.append({"$facet": {
+        "items": [{"$sort": sort}, {"$skip": skip}, {"$limit": limit}, {"$project": projection}],
+        **facet_stages(CONTENT.legacy),
+    }})
+    result = (await read_db.content.aggregate(pipeline, maxTimeMS=SEARCH_TIME_MS).to_list(1))[0]
     
-    content = await db.content.find(query).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    return [Content(**c) for c in content]
+    items = CONTENT.decode_many(result["items"])
+    if search:
+        for item in items:
+            item["highlights"] = highlight(item, list(CONTENT_SEARCH_WEIGHTS), search)
+    return ORJSONResponse({
+        "items": CONTENT_SUMMARY_SERIALIZER.many(items),
+        "facets": {name: facet_counts(result[name]) for name in ("tags", "file_types", "media_kinds", "artists")},
+        "total": result["total"][0]["count"] if result["total"] else 0,
+    })
 
 @api_router.get("/content/{content_id}", response_model=Content)
-async def get_content(content_id: str):
+async def get_content(content_id: str, request: Request):
     """Get specific content by ID"""
-    content = await db.content.find_one({"id": content_id})
+    content = await find_content(content_id)
+    if not content:
+        raise HTTPException(status_code=404, detail="Content not found")
+    etag = document_etag(content)
+    if is_not_modified(request, etag, content["updated_at"]):
+        return not_modified(etag, content["updated_at"])
+    return ORJSONResponse(CONTENT_SERIALIZER.one(content), headers=cache_headers(etag, content["updated_at"]))
+
+@api_router.get("/content/{content_id}/status", response_model=ContentStatus)
+async def get_content_status(content_id: str):
+    """Processing status of an upload; always read from the database, never from the cache"""
+    content = CONTENT.decode(await db.content.find_one(
+        CONTENT.id_query(content_id),
+        {"id": 1, "processing_status": 1, "processing_error": 1, "duplicates": 1, "updated_at": 1},
+        max_time_ms=LOOKUP_TIME_MS
+    ))
     if not content:
         raise HTTPException(status_code=404, detail="Content not found")
-    return Content(**content)
+    content.setdefault("processing_status", "ready")
+    content.setdefault("processing_error", None)
+    content.setdefault("duplicates", [])
+    return ORJSONResponse(content, headers={"Cache-Control": "no-store"})
+
+@api_router.get("/content/{content_id}/similar", response_model=List[ContentSummary])
+async def get_similar_content(content_id: str, max_distance: int = SIMILAR_MAX_DISTANCE, limit: int = 20, artist_id: Optional[str] = None):
+    """Image content that looks like this one, closest first; distance counts differing hash bits out of 64"""
+    if max_distance < 0 or max_distance > SIMILAR_DISTANCE_LIMIT:
+        raise HTTPException(status_code=400, detail=f"max_distance must be between 0 and {SIMILAR_DISTANCE_LIMIT}")
+    if limit < 1 or limit > SIMILAR_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {SIMILAR_LIMIT}")
+    content = await find_content(content_id)
+    if not content:
+        raise HTTPException(status_code=404, detail="Content not found")
+    if not content.get("phash"):
+        raise HTTPException(status_code=409, detail="Content has no perceptual hash: it is not an image, or is still processing")
+    matches = await similarity.find(
+        read_db, content["phash"], max_distance, artist_id=artist_id, exclude=content_id, limit=limit,
+        projection=summary_projection(ContentSummary), max_time_ms=LIST_TIME_MS
+    )
+    return ORJSONResponse(CONTENT_SUMMARY_SERIALIZER.many(matches))
+
+@api_router.get("/content/{content_id}/file")
+async def get_content_file(content_id: str, request: Request):
+    """Stream the file behind a content item, with Range support"""
+    content = await find_content(content_id)
+    if not content:
+        raise HTTPException(status_code=404, detail="Content not found")
+    if not content.get("blob_id"):
+        # Only content uploaded before the blob store has an inline payload
+        content = CONTENT.decode(await db.content.find_one(CONTENT.id_query(content_id)))
+    return await media_response(
+        request,
+        content.get("blob_id"),
+        content.get("file_data"),
+        content["file_type"],
+        content["file_name"],
+        etag=None if content.get("blob_id") else document_etag(content)
+    )
+
+@api_router.get("/content/{content_id}/thumb")
+async def get_content_thumbnail(content_id: str, request: Request, size: int = RENDITION_SIZES[0]):
+    """Stream the smallest thumbnail at least size pixels across"""
+    content = await find_content(content_id)
+    if not content:
+        raise HTTPException(status_code=404, detail="Content not found")
+    rendition = pick_rendition(content.get("renditions", []), size)
+    if not rendition:
+        raise HTTPException(status_code=404, detail="Thumbnail not available")
+    return await media_response(request, rendition["blob_id"], None, rendition["media_type"])
 
 @api_router.delete("/content/{content_id}")
 async def delete_content(content_id: str):
     """Delete content"""
-    result = await db.content.delete_one({"id": content_id})
-    if result.deleted_count == 0:
+    deleted = CONTENT.decode(await db.content.find_one_and_delete(
+        CONTENT.id_query(content_id), {"artist_id": 1, "file_size": 1, "created_at": 1, "tags": 1, "blob_id": 1, "renditions.blob_id": 1}
+    ))
+    if not deleted:
         raise HTTPException(status_code=404, detail="Content not found")
+    await record_deletes(db, [deleted])
+    await record_tags(db, deleted.get("tags", []), -1)
+    # Identical uploads share blobs, so a job deletes only the ones nothing references now
+    await queue_release(db, [deleted])
+    await invalidate_content(content_id, deleted["artist_id"])
+    feed.publish("content", "deleted", content_id)
     return {"message": "Content deleted successfully"}
 
-@api_router.get("/artists/{artist_id}/content", response_model=List[Content])
-async def get_artist_content(artist_id: str, skip: int = 0, limit: int = 20):
+@api_router.post("/content:batchDelete")
+async def delete_content_batch(batch: ContentBatchDelete):
+    """Delete many content items with a single delete_many"""
+    ids = list(dict.fromkeys(batch.ids))
+    check_batch_size(len(ids))
+    docs = CONTENT.decode_many(await db.content.find(
+        CONTENT.ids_query(ids), {"id": 1, "artist_id": 1, "file_size": 1, "created_at": 1, "tags": 1, "blob_id": 1, "renditions.blob_id": 1}
+    ).to_list(len(ids)))
+    if docs:
+        await db.content.delete_many(CONTENT.ids_query([doc["id"] for doc in docs]))
+        # A concurrent delete of the same item can double-count here; reconcile_stats repairs that
+        await record_deletes(db, docs)
+        await record_tags(db, [tag for doc in docs for tag in doc.get("tags", [])], -1)
+        await queue_release(db, docs)
+    
+    for doc in docs:
+        await cache.invalidate(f"content:{doc['id']}")
+        feed.publish("content", "deleted", doc["id"])
+    for artist_id in {doc["artist_id"] for doc in docs}:
+        await cache.bump(f"artist_content:{artist_id}")
+    
+    deleted = {doc["id"] for doc in docs}
+    return {"deleted": [i for i in ids if i in deleted], "not_found": [i for i in ids if i not in deleted]}
+
+@api_router.get("/artists/{artist_id}/content", response_model=List[ContentSummary])
+async def get_artist_content(artist_id: str, request: Request, skip: int = 0, limit: int = 20, fields: Optional[str] = None, cursor: Optional[str] = None):
     """Get all content for a specific artist"""
-    content = await db.content.find({"artist_id": artist_id}).sort("created_at", -1).skip(skip).limit(limit).to_list(limit)
-    return [Content(**c) for c in content]
+    check_page_limit(limit, skip)
+    projection = summary_projection(ContentSummary, fields)
+    
+    async def load_page():
+        # Read from the primary: a page from a lagging secondary would stay cached under the new version
+        query = after_cursor(CONTENT.ref_query("artist_id", artist_id), cursor)
+        find = db.content.find(query, projection, max_time_ms=LIST_TIME_MS).sort(KEYSET_SORT)
+        if not cursor:
+            find = find.skip(skip)
+        content, next_cursor = await fetch_page(find, limit)
+        return CONTENT.decode_many(content), next_cursor
+    
+    # Pages are keyed by the artist's content version, which every write bumps
+    version = await cache.version(f"artist_content:{artist_id}")
+    key = f"artist_content:{artist_id}:{version}:{skip}:{limit}:{cursor}:{fields}"
+    content, next_cursor = await cache.get_or_load(key, load_page)
+    return summary_response(CONTENT_SUMMARY_SERIALIZER, content, request, fields, next_cursor)
+
+# Tags
+@api_router.get("/tags", response_model=List[TagCount])
+async def get_tags(prefix: Optional[str] = None, skip: int = 0, limit: int = 50):
+    """Tags by popularity, optionally only those starting with prefix"""
+    check_page_limit(limit, skip)
+    return ORJSONResponse(await popular_tags(read_db, prefix, skip, limit, LIST_TIME_MS))
+
+# Live updates
+@api_router.get("/feed")
+async def feed_events(request: Request, entities: str = "artist,content", last_event_id: Optional[str] = None):
+    """Server-Sent Events for artist and content changes; reconnect with Last-Event-ID to catch up"""
+    wanted = parse_entities(entities)
+    resume_from = request.headers.get("last-event-id") or last_event_id
+    return StreamingResponse(
+        sse_stream(feed.subscribe(wanted, resume_from, FEED_HEARTBEAT_SECONDS)),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@api_router.websocket("/feed/ws")
+async def feed_socket(websocket: WebSocket, entities: str = "artist,content", last_event_id: Optional[str] = None):
+    """The same events as /feed, one JSON message each"""
+    wanted = parse_entities(entities)
+    await websocket.accept()
+    events = feed.subscribe(wanted, last_event_id)
+    try:
+        async for event in events:
+            await websocket.send_text(event.payload)
+        # The feed ended with a reset (the client must reload) or because this worker is shutting down
+        await websocket.close()
+    except WebSocketDisconnect:
+        pass
+    finally:
+        await events.aclose()
+
+# Resumable upload sessions
+@api_router.post("/uploads", response_model=UploadSession)
+async def create_upload_session(input: UploadSessionCreate):
+    """Start a chunked upload; parts are sent separately and assembled on completion"""
+    if input.total_size is not None and input.total_size > MAX_UPLOAD_BYTES:
+        raise HTTPException(status_code=413, detail=f"Upload exceeds the limit of {MAX_UPLOAD_BYTES} bytes")
+    session_obj = UploadSession(**input.dict())
+    await db.upload_sessions.insert_one(session_obj.dict())
+    return session_obj
+
+@api_router.get("/uploads/{upload_id}", response_model=UploadSession)
+async def get_upload_session(upload_id: str):
+    """Get an upload session, including the parts received so far"""
+    session = await db.upload_sessions.find_one({"id": upload_id})
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    return UploadSession(**session)
+
+@api_router.put("/uploads/{upload_id}/{part}")
+async def upload_part(upload_id: str, part: int, request: Request):
+    """Upload one part of a chunked upload; re-sending a part replaces it"""
+    if part < 1 or part > MAX_PARTS:
+        raise HTTPException(status_code=400, detail=f"Part number must be between 1 and {MAX_PARTS}")
+    session = await db.upload_sessions.find_one({"id": upload_id, "status": "open"})
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    if session["expires_at"] <= datetime.utcnow():
+        raise HTTPException(status_code=410, detail="Upload expired")
+
+    # Cap the part so the assembled file cannot exceed the upload limit
+    other_bytes = sum(p["size"] for n, p in session["parts"].items() if n != str(part))
+    part_limit = min(MAX_PART_BYTES, MAX_UPLOAD_BYTES - other_bytes)
+    blob = await blob_store.put(limit_size(request.stream(), part_limit))
+
+    result = await db.upload_sessions.update_one(
+        {"id": upload_id, "status": "open"},
+        {
+            "$set": {f"parts.{part}": {"blob_id": blob.sha256, "size": blob.size}, "updated_at": datetime.utcnow()},
+            "$addToSet": {"part_blobs": blob.sha256}
+        }
+    )
+    if not result.matched_count:
+        # Completed, aborted or expired while the part was being stored
+        await release_blob(blob.sha256)
+        raise HTTPException(status_code=409, detail="Upload is no longer open")
+    return {"part": part, "size": blob.size, "sha256": blob.sha256}
+
+@api_router.post("/uploads/{upload_id}/complete")
+async def complete_upload(upload_id: str, input: ContentCreate):
+    """Assemble the uploaded parts into a content item"""
+    tags_list = normalize_tags(input.tags)
+    now = datetime.utcnow()
+    session = await db.upload_sessions.find_one_and_update(
+        {
+            "id": upload_id,
+            "expires_at": {"$gt": now},
+            "$or": [
+                {"status": "open"},
+                # A completion whose process died part way
+                {"status": "completing", "updated_at": {"$lt": now - timedelta(seconds=UPLOAD_COMPLETE_LEASE_SECONDS)}},
+            ],
+        },
+        {"$set": {"status": "completing", "updated_at": now}},
+        return_document=ReturnDocument.AFTER
+    )
+    if not session:
+        existing = await db.upload_sessions.find_one({"id": upload_id})
+        if not existing:
+            raise HTTPException(status_code=404, detail="Upload not found")
+        if existing["status"] == "completed":
+            return {"message": "Content uploaded successfully", "content_id": existing["content_id"]}
+        if existing["status"] == "expired" or existing["expires_at"] <= now:
+            raise HTTPException(status_code=410, detail="Upload expired")
+        raise HTTPException(status_code=409, detail="Upload is already being completed")
+
+    # Derived from the upload, so a retried completion finds the item an earlier attempt inserted
+    content_id = str(uuid.uuid5(uuid.NAMESPACE_URL, f"upload:{upload_id}"))
+    inserted = False
+    try:
+        numbers = sorted(int(n) for n in session["parts"])
+        if not numbers or numbers != list(range(1, len(numbers) + 1)):
+            raise HTTPException(status_code=400, detail="Upload is missing parts")
+
+        artist = await find_artist(input.artist_id)
+        if not artist:
+            raise HTTPException(status_code=404, detail="Artist not found")
+
+        async def assembled():
+            for n in numbers:
+                async for chunk in blob_store.open(session["parts"][str(n)]["blob_id"]):
+                    yield chunk
+
+        sniffer = TypeSniffer()
+        blob = await blob_store.put(sniffer.wrap(limit_size(assembled(), MAX_UPLOAD_BYTES)))
+        if session.get("total_size") is not None and blob.size != session["total_size"]:
+            if blob.sha256 not in session["part_blobs"]:
+                await release_blob(blob.sha256)
+            raise HTTPException(status_code=400, detail="Assembled size does not match total_size")
+
+        file_type = sniffer.media_type(session.get("file_type") or mimetypes.guess_type(session["file_name"])[0])
+        duplicates = [match for match in await exact_duplicates(input.artist_id, blob.sha256) if match["id"] != content_id]
+        content_obj = Content(
+            id=content_id,
+            artist_id=input.artist_id,
+            title=input.title,
+            description=input.description,
+            blob_id=blob.sha256,
+            file_type=file_type,
+            file_name=session["file_name"],
+            file_size=blob.size,
+            tags=tags_list,
+            media_kind=media_kind_for(file_type),
+            duplicates=duplicates or None,
+            processing_status="pending"
+        )
+        try:
+            await db.content.insert_one(CONTENT.encode(content_obj.dict(exclude={"file_data"})))
+            inserted = True
+        except DuplicateKeyError:
+            pass  # inserted by an attempt that died before marking the session completed
+        await enqueue(db, PROCESS_CONTENT, {"content_id": content_obj.id, "blob_id": blob.sha256})
+        await db.upload_sessions.update_one(
+            {"id": upload_id, "status": "completing"},
+            {"$set": {"status": "completed", "content_id": content_obj.id, "updated_at": datetime.utcnow()}}
+        )
+    except Exception:
+        # Any failure leaves the session open for a retry, with nothing created
+        if inserted:
+            await db.content.delete_one(CONTENT.id_query(content_id))
+        await db.upload_sessions.update_one({"id": upload_id, "status": "completing"}, {"$set": {"status": "open"}})
+        raise
+
+    await record_upload(db, input.artist_id, blob.size, content_obj.created_at)
+    await record_tags(db, tags_list, 1)
+    await cache.bump(f"artist_content:{input.artist_id}")
+    feed.publish("content", "created", content_obj.id, content_obj.dict())
+
+    # Parts are no longer needed once the assembled file is stored
+    for part_blob in session["part_blobs"]:
+        await release_blob(part_blob)
+    return {"message": "Content uploaded successfully", "content_id": content_obj.id, "processing_status": content_obj.processing_status, "duplicates": duplicates}
+
+@api_router.delete("/uploads/{upload_id}")
+async def abort_upload(upload_id: str):
+    """Abort an open upload session and discard its parts"""
+    session = await db.upload_sessions.find_one_and_update(
+        {"id": upload_id, "status": "open"},
+        {"$set": {"status": "aborted", "updated_at": datetime.utcnow()}}
+    )
+    if not session:
+        raise HTTPException(status_code=404, detail="Upload not found")
+    for part_blob in session["part_blobs"]:
+        await release_blob(part_blob)
+    return {"message": "Upload aborted"}
+
+# Diagnostics
+@api_router.get("/healthz")
+async def healthz(request: Request):
+    """Readiness probe: 503 while the worker drains for shutdown or when MongoDB does not answer a ping"""
+    if getattr(request.app.state, "draining", False):
+        return ORJSONResponse({"status": "draining"}, status_code=503, headers={"Cache-Control": "no-store"})
+    try:
+        await asyncio.wait_for(check_connection(client), HEALTHZ_TIMEOUT_SECONDS)
+    except (asyncio.TimeoutError, PyMongoError):
+        return ORJSONResponse({"status": "database unavailable"}, status_code=503, headers={"Cache-Control": "no-store"})
+    return ORJSONResponse({"status": "ok"}, headers={"Cache-Control": "no-store"})
+
+@api_router.get("/admin/explain")
+async def explain_queries():
+    """Explain every query shape the API issues and flag collection scans"""
+    report = await explain_query_shapes(db)
+    return {"collscans": [entry["query"] for entry in report if entry["collscan"]], "queries": report}
+
+@api_router.post("/admin/stats/reconcile")
+async def reconcile_artist_stats():
+    """Recompute artist counters from the content collection and fix any drift"""
+    return await reconcile_stats(db)
+
+@api_router.post("/admin/tags/reconcile")
+async def reconcile_tag_counts():
+    """Recompute tag popularity counts from the content collection"""
+    return await rebuild_tag_counts(db)
+
+@api_router.get("/admin/jobs")
+async def jobs_stats():
+    """Job counts per type and status"""
+    return await job_counts(db)
+
+@api_router.get("/admin/cache")
+async def cache_stats():
+    """Hit/miss/eviction counters for the metadata cache"""
+    return cache.stats()
+
+@api_router.get("/admin/admission")
+async def admission_stats():
+    """Rate limits in force and upload bytes currently admitted"""
+    return admission.stats()
 
 # Original endpoints
 @api_router.get("/")
@@ -241,25 +1150,53 @@ async def root():
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    _ = await db.status_checks.insert_one(STATUS_CHECKS.encode(status_obj.dict()))
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
-    return [StatusCheck(**status_check) for status_check in status_checks]
+async def get_status_checks(client_name: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None, limit: int = 100, cursor: Optional[str] = None):
+    """Status checks newest first, optionally for one client and since <= timestamp < until; pass X-Next-Cursor back as cursor"""
+    check_limit(limit)
+    query = after_cursor(status_filter(client_name, since, until), cursor, "timestamp")
+    find = read_db.status_checks.find(query, max_time_ms=LIST_TIME_MS).sort(STATUS_SORT)
+    status_checks, next_cursor = await fetch_page(find, limit, "timestamp")
+    response = ORJSONResponse(STATUS_CHECK_SERIALIZER.many(STATUS_CHECKS.decode_many(status_checks)))
+    if next_cursor:
+        response.headers[NEXT_CURSOR_HEADER] = next_cursor
+    return response
+
+@api_router.get("/status/summary", response_model=List[StatusCheckCount])
+async def get_status_summary(client_name: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None, bucket_minutes: int = 1):
+    """Status check counts per client per bucket (one minute by default) over since..until, the last hour by default"""
+    since, until = summary_window(since, until, bucket_minutes)
+    pipeline = summary_pipeline(status_filter(client_name, since, until), bucket_minutes)
+    return ORJSONResponse(await read_db.status_checks.aggregate(pipeline, maxTimeMS=LIST_TIME_MS).to_list(None))
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# Inside UploadLimitMiddleware, so oversized bodies are refused before they reserve upload budget
+app.add_middleware(AdmissionMiddleware, controller=admission)
+
+app.add_middleware(UploadLimitMiddleware)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=[NEXT_CURSOR_HEADER, "Retry-After"],
 )
 
+# Outermost, so rejected and failed requests are measured too
+app.add_middleware(MetricsMiddleware)
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    """Prometheus scrape endpoint"""
+    return PlainTextResponse(render_metrics(), media_type="text/plain; version=0.0.4")
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -267,6 +1204,13 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
-    client.close()
\ No newline at end of file
+@app.exception_handler(ExecutionTimeout)
+async def query_timeout_handler(request: Request, exc: ExecutionTimeout):
+    # A query ran past its max_time_ms budget
+    return ORJSONResponse({"detail": "Query took too long"}, status_code=503, headers={"Retry-After": "1"})
+
+@app.exception_handler(ConnectionFailure)
+async def database_unavailable_handler(request: Request, exc: ConnectionFailure):
+    # No server selectable, or no pooled connection free within the wait-queue timeout
+    logger.warning("Database unavailable: %s", exc)
+    return ORJSONResponse({"detail": "Database unavailable"}, status_code=503, headers={"Retry-After": "1"})
\ No newline at end of file
@@ -0,0 +1,261 @@
+"""Near-duplicate search over the perceptual hashes of image content.
+
+Each image gets a 64-bit pHash when it is processed (see media.py); two
+copies of the same piece, re-encoded, resized or lightly edited, differ in
+only a few bits. ``HashIndex`` keeps every hash in NumPy arrays and finds
+the ones within a Hamming distance with multi-index hashing: the hash is
+split into four 16-bit chunks and each chunk gets a sorted table. Two
+hashes within distance ``r`` agree to within ``r // 4`` bits on at least one
+chunk, so a query only probes the table entries near its own chunks (137
+probes per chunk for r = 10) and checks the exact distance of those few
+candidates, instead of scanning every hash. New hashes go to a small
+buffer that is scanned directly and merged into the tables off the event
+loop once it grows.
+
+Every process keeps its own ``SimilarityIndex``, filled from the content
+collection by ``hashed_at`` (set with the hash) and kept current by
+re-reading recently hashed documents. Matches are always re-checked
+against the stored documents, so deleted content and replaced files never
+show up as results even though the in-memory index only grows.
+"""
+import asyncio
+import os
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+from schema import CONTENT, id_str
+
+# Bits (of 64) in which a near duplicate may differ
+SIMILAR_MAX_DISTANCE = int(os.environ.get("SIMILAR_MAX_DISTANCE", 10))
+SIMILAR_DISTANCE_LIMIT = 16
+SIMILAR_LIMIT = 100
+# Uploads closer than this to the same artist's earlier content are flagged as duplicates
+DUPLICATE_MAX_DISTANCE = int(os.environ.get("DUPLICATE_MAX_DISTANCE", 4))
+DUPLICATE_LIMIT = 10
+SIMILARITY_REFRESH_SECONDS = float(os.environ.get("SIMILARITY_REFRESH_SECONDS", 5))
+# Hashes written up to this long before the newest one seen may still become visible (clock skew, slow writes)
+SIMILARITY_OVERLAP_SECONDS = 60
+# Buffered hashes are merged into the sorted tables past this many
+MERGE_THRESHOLD = 8192
+
+_CHUNKS = 4
+_CHUNK_BITS = 16
+_CHUNK_MASK = (1 << _CHUNK_BITS) - 1
+_POPCOUNT8 = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+def popcount(values: np.ndarray) -> np.ndarray:
+    """Set bits in each uint64"""
+    if hasattr(np, "bitwise_count"):  # NumPy 2
+        return np.bitwise_count(values)
+    return _POPCOUNT8[values.view(np.uint8)].reshape(-1, 8).sum(axis=1, dtype=np.uint8)
+
+
+# Every 16-bit value by its number of set bits, for probing a chunk table within a radius
+_CHUNK_POPCOUNT = popcount(np.arange(1 << _CHUNK_BITS, dtype=np.uint64))
+_FLIP_MASKS = [np.flatnonzero(_CHUNK_POPCOUNT <= bits).astype(np.uint16) for bits in range(_CHUNK_BITS + 1)]
+
+
+def _ranges(starts: np.ndarray, stops: np.ndarray) -> np.ndarray:
+    """Concatenation of arange(start, stop) for each pair, without a Python loop"""
+    lengths = stops - starts
+    total = int(lengths.sum())
+    if not total:
+        return np.empty(0, dtype=np.int64)
+    offsets = np.repeat(starts - (np.cumsum(lengths) - lengths), lengths)
+    return np.arange(total) + offsets
+
+
+class _Segment:
+    """Immutable hashes with one sorted table per chunk"""
+
+    def __init__(self, hashes: np.ndarray, ids: np.ndarray, artists: np.ndarray):
+        self.hashes = hashes
+        self.ids = ids
+        self.artists = artists
+        self.tables = []
+        for chunk in range(_CHUNKS):
+            keys = ((hashes >> np.uint64(chunk * _CHUNK_BITS)) & np.uint64(_CHUNK_MASK)).astype(np.uint16)
+            order = np.argsort(keys, kind="stable").astype(np.int32)
+            self.tables.append((keys[order], order))
+
+    def merged(self, hashes: np.ndarray, ids: np.ndarray, artists: np.ndarray) -> "_Segment":
+        return _Segment(
+            np.concatenate([self.hashes, hashes]),
+            np.concatenate([self.ids, ids]),
+            np.concatenate([self.artists, artists]),
+        )
+
+    def candidates(self, value: int, radius: int) -> np.ndarray:
+        """Rows sharing a chunk with the value to within radius // 4 bits; a row can appear more than once"""
+        masks = _FLIP_MASKS[min(radius // _CHUNKS, _CHUNK_BITS)]
+        rows = []
+        for chunk, (keys, order) in enumerate(self.tables):
+            probes = masks ^ np.uint16((value >> (chunk * _CHUNK_BITS)) & _CHUNK_MASK)
+            starts = np.searchsorted(keys, probes, side="left")
+            stops = np.searchsorted(keys, probes, side="right")
+            rows.append(order[_ranges(starts, stops)])
+        return np.concatenate(rows)
+
+
+def _id_bytes(value) -> bytes:
+    return uuid.UUID(id_str(value)).bytes
+
+
+def _artist_key(value) -> Optional[int]:
+    """None for an id that is not a UUID, which no artist has"""
+    try:
+        key = _id_bytes(value)
+    except ValueError:
+        return None
+    # Half the UUID is plenty to narrow candidates; find() checks the artist in the database
+    return int.from_bytes(key[:8], "big")
+
+
+class HashIndex:
+    """64-bit hashes of content (16-byte id, 64-bit artist key), searchable by Hamming distance"""
+
+    def __init__(self):
+        empty = np.empty(0, dtype=np.uint64)
+        self._segment = _Segment(empty, np.empty(0, dtype="V16"), empty)
+        self._buffer: List[Tuple[int, bytes, int]] = []
+        self._buffer_arrays = None
+        self._merging = False
+
+    def __len__(self) -> int:
+        return len(self._segment.hashes) + len(self._buffer)
+
+    @property
+    def buffered(self) -> int:
+        return len(self._buffer)
+
+    def add(self, content_id: bytes, artist_key: int, value: int):
+        self._buffer.append((value, content_id, artist_key))
+        self._buffer_arrays = None
+
+    @staticmethod
+    def _arrays(entries: List[Tuple[int, bytes, int]]):
+        return (
+            np.array([entry[0] for entry in entries], dtype=np.uint64),
+            np.frombuffer(b"".join(entry[1] for entry in entries), dtype="V16"),
+            np.array([entry[2] for entry in entries], dtype=np.uint64),
+        )
+
+    async def merge(self):
+        """Fold buffered hashes into the sorted tables; sorting runs in a thread"""
+        if self._merging or not self._buffer:
+            return
+        self._merging = True
+        try:
+            count = len(self._buffer)
+            arrays = self._arrays(self._buffer[:count])
+            self._segment = await asyncio.to_thread(self._segment.merged, *arrays)
+            del self._buffer[:count]
+            self._buffer_arrays = None
+        finally:
+            self._merging = False
+
+    def search(self, value: int, radius: int, artist_key: Optional[int] = None) -> List[Tuple[bytes, int]]:
+        """(content id, distance) of every hash within radius, closest first"""
+        query = np.uint64(value)
+        segment = self._segment
+        rows = segment.candidates(value, radius)
+        # Exact distances first: only the few true matches are deduplicated and have their ids gathered
+        distances = popcount(segment.hashes[rows] ^ query)
+        close = distances <= radius
+        rows, first = np.unique(rows[close], return_index=True)
+        parts = [(distances[close][first], segment.ids[rows], segment.artists[rows])]
+        if self._buffer:
+            if self._buffer_arrays is None:
+                self._buffer_arrays = self._arrays(self._buffer)
+            hashes, ids, artists = self._buffer_arrays
+            distances = popcount(hashes ^ query)
+            keep = distances <= radius
+            parts.append((distances[keep], ids[keep], artists[keep]))
+        matches = {}
+        for distances, ids, artists in parts:
+            if artist_key is not None:
+                keep = artists == np.uint64(artist_key)
+                distances, ids = distances[keep], ids[keep]
+            for content_id, distance in zip(ids, distances):
+                key = content_id.tobytes()
+                # A re-hashed document appears twice; its newest hash is checked against the database anyway
+                matches[key] = min(int(distance), matches.get(key, radius))
+        return sorted(matches.items(), key=lambda item: item[1])
+
+
+class SimilarityIndex:
+    """The HashIndex of the content collection, refreshed from MongoDB on use"""
+
+    def __init__(self):
+        self.hashes = HashIndex()
+        self._watermark: Optional[datetime] = None
+        self._recent = {}  # content id -> hashed_at, for documents re-read in the overlap window
+        self._refreshed_at = 0.0
+        self._lock = asyncio.Lock()
+
+    async def refresh(self, db, max_age: float = SIMILARITY_REFRESH_SECONDS):
+        """Load hashes written since the last refresh, unless it was less than max_age seconds ago"""
+        if time.monotonic() - self._refreshed_at < max_age:
+            return
+        async with self._lock:
+            if time.monotonic() - self._refreshed_at < max_age:
+                return
+            started = time.monotonic()
+            since = self._watermark - timedelta(seconds=SIMILARITY_OVERLAP_SECONDS) if self._watermark else datetime.min
+            cursor = db.content.find(
+                {"hashed_at": {"$gt": since}},
+                {"_id": 1, "id": 1, "artist_id": 1, "phash": 1, "hashed_at": 1}
+            ).sort("hashed_at", 1).batch_size(10000)
+            async for doc in cursor:
+                doc = CONTENT.decode(doc)
+                if self._recent.get(doc["id"]) == doc["hashed_at"]:
+                    continue
+                self._recent[doc["id"]] = doc["hashed_at"]
+                self.hashes.add(_id_bytes(doc["id"]), _artist_key(doc["artist_id"]) or 0, int(doc["phash"], 16))
+                if self._watermark is None or doc["hashed_at"] > self._watermark:
+                    self._watermark = doc["hashed_at"]
+                if self.hashes.buffered >= MERGE_THRESHOLD:
+                    await self.hashes.merge()
+            if self._watermark:
+                horizon = self._watermark - timedelta(seconds=SIMILARITY_OVERLAP_SECONDS)
+                self._recent = {key: value for key, value in self._recent.items() if value > horizon}
+            await self.hashes.merge()
+            self._refreshed_at = started
+
+    async def find(self, db, phash: str, max_distance: int, artist_id: Optional[str] = None,
+                   exclude: Optional[str] = None, limit: int = SIMILAR_LIMIT,
+                   projection: Optional[dict] = None, max_age: float = SIMILARITY_REFRESH_SECONDS,
+                   max_time_ms: Optional[int] = None) -> List[dict]:
+        """Stored content within max_distance bits of a hash, closest first, each with its distance"""
+        artist_key = _artist_key(artist_id) if artist_id else None
+        if artist_id and artist_key is None:
+            return []
+        await self.refresh(db, max_age)
+        value = int(phash, 16)
+        matches = self.hashes.search(value, max_distance, artist_key)
+        ids = [content_id for content_id in (str(uuid.UUID(bytes=key)) for key, _ in matches) if content_id != exclude]
+        if not ids:
+            return []
+        # Fetch a few spare matches, in case some were deleted or re-hashed since they were indexed
+        ids = ids[:limit * 2]
+        query = CONTENT.ids_query(ids)
+        if artist_id:
+            query = {**query, **CONTENT.ref_query("artist_id", artist_id)}
+        docs = CONTENT.decode_many(await db.content.find(
+            query, {**(projection or {"_id": 1}), "phash": 1}, max_time_ms=max_time_ms
+        ).to_list(len(ids)))
+        results = []
+        for doc in docs:
+            if not doc.get("phash"):
+                continue
+            distance = bin(int(doc["phash"], 16) ^ value).count("1")
+            if distance <= max_distance:
+                doc["distance"] = distance
+                results.append(doc)
+        results.sort(key=lambda doc: doc["distance"])
+        return results[:limit]
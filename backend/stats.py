@@ -0,0 +1,136 @@
+"""Per-artist content counters.
+
+Each artist has one ``artist_stats`` document (content count, total bytes,
+latest upload) kept current with ``$inc`` as content is added or deleted, so
+dashboards read one small document per artist instead of scanning
+``content``. Counters can drift if a process dies between the content write
+and the counter update; ``reconcile_stats`` recomputes them from ``content``
+with an aggregation pipeline and fixes any that differ. Run it with
+``python stats.py reconcile`` or ``POST /api/admin/stats/reconcile``.
+"""
+import asyncio
+import os
+from collections import defaultdict
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional
+
+from pymongo import UpdateOne
+
+from schema import CONTENT, detect_legacy, id_str
+
+STATS_FIELDS = ("content_count", "total_bytes", "latest_upload_at")
+STATS_PROJECTION = {"_id": 0, "artist_id": 1, "updated_at": 1, **{f: 1 for f in STATS_FIELDS}}
+
+
+def empty_stats(artist_id: str) -> dict:
+    return {"artist_id": artist_id, "content_count": 0, "total_bytes": 0, "latest_upload_at": None, "updated_at": None}
+
+
+async def record_upload(db, artist_id: str, file_size: int, created_at: datetime):
+    await db.artist_stats.update_one(
+        {"artist_id": artist_id},
+        {
+            "$inc": {"content_count": 1, "total_bytes": file_size},
+            "$max": {"latest_upload_at": created_at},
+            "$set": {"updated_at": datetime.utcnow()},
+        },
+        upsert=True
+    )
+
+
+async def record_deletes(db, deleted: Iterable[dict]):
+    """Decrement counters for deleted content docs (which need artist_id, file_size and created_at)"""
+    by_artist: Dict[str, List[dict]] = defaultdict(list)
+    for doc in deleted:
+        by_artist[doc["artist_id"]].append(doc)
+
+    for artist_id, docs in by_artist.items():
+        await db.artist_stats.update_one(
+            {"artist_id": artist_id},
+            {
+                "$inc": {"content_count": -len(docs), "total_bytes": -sum(doc.get("file_size", 0) for doc in docs)},
+                "$set": {"updated_at": datetime.utcnow()},
+            }
+        )
+        # A maximum cannot be decremented; look the latest upload up again (one indexed read)
+        latest = await db.content.find_one(
+            CONTENT.ref_query("artist_id", artist_id), {"_id": 0, "created_at": 1}, sort=[("created_at", -1), ("_id", -1)]
+        )
+        await db.artist_stats.update_one(
+            {"artist_id": artist_id},
+            {"$set": {"latest_upload_at": latest["created_at"] if latest else None}}
+        )
+
+
+async def get_stats(db, artist_ids: List[str]) -> Dict[str, dict]:
+    """Stats for each artist id, with zeroed stats for artists that have never uploaded"""
+    found = {
+        doc["artist_id"]: doc
+        for doc in await db.artist_stats.find({"artist_id": {"$in": artist_ids}}, STATS_PROJECTION).to_list(len(artist_ids))
+    }
+    return {artist_id: found.get(artist_id) or empty_stats(artist_id) for artist_id in artist_ids}
+
+
+async def reconcile_stats(db, artist_ids: Optional[List[str]] = None) -> dict:
+    """Recompute counters from content and correct the ones that drifted"""
+    match = {"artist_id": {"$in": artist_ids}} if artist_ids is not None else {}
+    pipeline = [
+        {"$match": CONTENT.refs_query("artist_id", artist_ids) if artist_ids is not None else {}},
+        {"$group": {
+            "_id": "$artist_id",
+            "content_count": {"$sum": 1},
+            "total_bytes": {"$sum": "$file_size"},
+            "latest_upload_at": {"$max": "$created_at"},
+        }},
+    ]
+    actual = {}
+    async for row in db.content.aggregate(pipeline, allowDiskUse=True):
+        artist_id = id_str(row["_id"])
+        if artist_id in actual:
+            # The same artist under a v1 string and a v2 Binary id, while a schema migration runs
+            seen = actual[artist_id]
+            seen["content_count"] += row["content_count"]
+            seen["total_bytes"] += row["total_bytes"]
+            seen["latest_upload_at"] = max(seen["latest_upload_at"], row["latest_upload_at"])
+        else:
+            actual[artist_id] = {f: row[f] for f in STATS_FIELDS}
+
+    stored = {}
+    async for doc in db.artist_stats.find(match, STATS_PROJECTION):
+        stored[doc["artist_id"]] = {f: doc.get(f) for f in STATS_FIELDS}
+
+    now = datetime.utcnow()
+    updates = []
+    for artist_id in actual.keys() | stored.keys():
+        expected = actual.get(artist_id) or {f: v for f, v in empty_stats(artist_id).items() if f in STATS_FIELDS}
+        if stored.get(artist_id) != expected:
+            updates.append(UpdateOne({"artist_id": artist_id}, {"$set": {**expected, "updated_at": now}}, upsert=True))
+    for start in range(0, len(updates), 1000):
+        await db.artist_stats.bulk_write(updates[start:start + 1000], ordered=False)
+    return {"artists": len(actual.keys() | stored.keys()), "corrected": len(updates)}
+
+
+if __name__ == "__main__":
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    cli = typer.Typer(help="Maintain per-artist content counters")
+
+    @cli.callback()
+    def main():
+        """Maintain per-artist content counters"""
+
+    @cli.command()
+    def reconcile(artist_id: Optional[List[str]] = typer.Option(None, help="Only these artists (repeatable)")):
+        """Recompute counters from the content collection"""
+        async def run():
+            db = AsyncIOMotorClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+            await detect_legacy(db)
+            return await reconcile_stats(db, artist_id or None)
+        result = asyncio.run(run())
+        typer.echo(f"Checked {result['artists']} artists, corrected {result['corrected']}")
+
+    cli()
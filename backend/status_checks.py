@@ -0,0 +1,78 @@
+"""Status check history: bounded storage, windowed queries and per-minute rollups.
+
+Status checks are written by monitoring clients as fast as they like, so the
+collection expires them with a TTL index on ``timestamp`` after
+``STATUS_RETENTION_SECONDS`` instead of growing forever. Reads always go
+through an index: newest first in keyset order over (timestamp, _id),
+optionally for one client and a time window. ``summary_pipeline`` counts
+checks per client per time bucket on the server, so dashboards never pull
+raw rows.
+"""
+import os
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Tuple
+
+from fastapi import HTTPException
+
+STATUS_RETENTION_SECONDS = int(os.environ.get("STATUS_RETENTION_SECONDS", 7 * 24 * 3600))
+STATUS_PAGE_LIMIT = 1000
+STATUS_SUMMARY_MAX_BUCKETS = 10080  # a week of minutes
+STATUS_SORT = [("timestamp", -1), ("_id", -1)]
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def _as_naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # Stored datetimes are naive UTC
+    if value is not None and value.tzinfo is not None:
+        value = value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+def status_filter(client_name: Optional[str] = None, since: Optional[datetime] = None, until: Optional[datetime] = None) -> dict:
+    """Checks from one client (or all) with since <= timestamp < until"""
+    since, until = _as_naive_utc(since), _as_naive_utc(until)
+    if since and until and since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    query = {}
+    if client_name:
+        query["client_name"] = client_name
+    window = {}
+    if since:
+        window["$gte"] = since
+    if until:
+        window["$lt"] = until
+    if window:
+        query["timestamp"] = window
+    return query
+
+
+def check_limit(limit: int):
+    if limit < 1 or limit > STATUS_PAGE_LIMIT:
+        raise HTTPException(status_code=400, detail=f"limit must be between 1 and {STATUS_PAGE_LIMIT}")
+
+
+def summary_window(since: Optional[datetime], until: Optional[datetime], bucket_minutes: int) -> Tuple[datetime, datetime]:
+    """The window to summarize: the last hour by default, at most STATUS_SUMMARY_MAX_BUCKETS buckets long"""
+    if bucket_minutes < 1:
+        raise HTTPException(status_code=400, detail="bucket_minutes must be at least 1")
+    until = _as_naive_utc(until) or datetime.utcnow()
+    since = _as_naive_utc(since) or until - timedelta(hours=1)
+    if since >= until:
+        raise HTTPException(status_code=400, detail="since must be before until")
+    if (until - since) / timedelta(minutes=bucket_minutes) > STATUS_SUMMARY_MAX_BUCKETS:
+        raise HTTPException(status_code=400, detail=f"Window spans more than {STATUS_SUMMARY_MAX_BUCKETS} buckets; narrow it or widen bucket_minutes")
+    return since, until
+
+
+def summary_pipeline(match: dict, bucket_minutes: int) -> list:
+    """Count checks per client per bucket, in bucket then client order"""
+    bucket_ms = bucket_minutes * 60 * 1000
+    # Date minus date is milliseconds, date minus milliseconds is a date: floors the timestamp to its bucket
+    bucket_start = {"$subtract": ["$timestamp", {"$mod": [{"$subtract": ["$timestamp", _EPOCH]}, bucket_ms]}]}
+    return [
+        {"$match": match},
+        {"$group": {"_id": {"client_name": "$client_name", "bucket": bucket_start}, "count": {"$sum": 1}}},
+        {"$sort": {"_id.bucket": 1, "_id.client_name": 1}},
+        {"$project": {"_id": 0, "client_name": "$_id.client_name", "bucket": "$_id.bucket", "count": 1}},
+    ]
@@ -0,0 +1,213 @@
+"""Tag normalization, tag filters, popularity counts and search facets.
+
+Tags are stored lowercased and deduplicated, so exact matches hit the
+multikey ``tags`` index instead of a regex. ``tag_counts`` holds one
+document per tag, kept current with ``$inc`` on upload and delete; it is
+indexed on (count, tag) so ``GET /api/tags`` is a covered, index-only read.
+``rebuild_tag_counts`` recomputes it from ``content`` when it drifts, and
+``python tags.py normalize`` rewrites tags stored before normalization.
+"""
+import asyncio
+import os
+import re
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Iterable, List, Optional
+
+from fastapi import HTTPException
+from pymongo import UpdateOne
+
+from schema import id_str
+
+MAX_TAG_LENGTH = 64
+MAX_TAGS = 50
+MAX_FILTER_TAGS = 20
+FACET_LIMIT = 20
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def _normalize(tags: Iterable[str]) -> List[str]:
+    """Lowercase, trim and collapse whitespace, dropping blanks and duplicates but keeping order"""
+    return list(dict.fromkeys(_WHITESPACE.sub(" ", tag).strip().lower() for tag in tags if tag and tag.strip()))
+
+
+def normalize_tags(tags: Iterable[str]) -> List[str]:
+    """Normalize tags from a request, rejecting overlong tags and lists"""
+    normalized = _normalize(tags)
+    too_long = [tag for tag in normalized if len(tag) > MAX_TAG_LENGTH]
+    if too_long:
+        raise HTTPException(status_code=400, detail=f"Tags must be at most {MAX_TAG_LENGTH} characters")
+    if len(normalized) > MAX_TAGS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_TAGS} tags are allowed")
+    return normalized
+
+
+def parse_tags(tags: Optional[str]) -> List[str]:
+    """Normalize a comma-separated tag list"""
+    return normalize_tags(tags.split(",")) if tags else []
+
+
+def tag_filter(tags: Optional[str], mode: str = "all") -> dict:
+    """Query matching content with all (AND) or any (OR) of a comma-separated tag list"""
+    wanted = parse_tags(tags)
+    if not wanted:
+        return {}
+    if len(wanted) > MAX_FILTER_TAGS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_FILTER_TAGS} tags can be filtered on")
+    if len(wanted) == 1:
+        return {"tags": wanted[0]}
+    if mode == "all":
+        return {"tags": {"$all": wanted}}
+    if mode == "any":
+        return {"tags": {"$in": wanted}}
+    raise HTTPException(status_code=400, detail="tag_mode must be 'all' or 'any'")
+
+
+async def record_tags(db, tags: Iterable[str], delta: int, session=None):
+    """Adjust popularity counts for tags added to (delta > 0) or removed from (delta < 0) content"""
+    counts = Counter(tags)
+    if not counts:
+        return
+    now = datetime.utcnow()
+    await db.tag_counts.bulk_write([
+        UpdateOne({"tag": tag}, {"$inc": {"count": n * delta}, "$set": {"updated_at": now}}, upsert=True)
+        for tag, n in counts.items()
+    ], ordered=False, session=session)
+    if delta < 0:
+        await db.tag_counts.delete_many({"tag": {"$in": list(counts)}, "count": {"$lte": 0}}, session=session)
+
+
+async def popular_tags(db, prefix: Optional[str] = None, skip: int = 0, limit: int = 50, max_time_ms: Optional[int] = None) -> List[dict]:
+    query = {"tag": {"$regex": f"^{re.escape(prefix.lower())}"}} if prefix else {}
+    find = db.tag_counts.find(query, {"_id": 0, "tag": 1, "count": 1}, max_time_ms=max_time_ms)
+    return await find.sort([("count", -1), ("tag", 1)]).skip(skip).limit(limit).to_list(limit)
+
+
+async def rebuild_tag_counts(db) -> dict:
+    """Recompute tag_counts from content and correct the counts that drifted"""
+    actual = {}
+    pipeline = [
+        {"$unwind": "$tags"},
+        {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+    ]
+    async for row in db.content.aggregate(pipeline, allowDiskUse=True):
+        actual[row["_id"]] = row["count"]
+
+    stored = {}
+    async for doc in db.tag_counts.find({}, {"_id": 0, "tag": 1, "count": 1}):
+        stored[doc["tag"]] = doc["count"]
+
+    now = datetime.utcnow()
+    updates = [
+        UpdateOne({"tag": tag}, {"$set": {"count": count, "updated_at": now}}, upsert=True)
+        for tag, count in actual.items() if stored.get(tag) != count
+    ]
+    for start in range(0, len(updates), 1000):
+        await db.tag_counts.bulk_write(updates[start:start + 1000], ordered=False)
+    stale = [tag for tag in stored if tag not in actual]
+    if stale:
+        await db.tag_counts.delete_many({"tag": {"$in": stale}})
+    return {"tags": len(actual), "corrected": len(updates) + len(stale)}
+
+
+async def normalize_stored_tags(db, batch_size: int = 1000) -> int:
+    """Rewrite content tags saved before normalization; returns the number of documents changed"""
+    changed = 0
+    updates = []
+    async for doc in db.content.find({"tags.0": {"$exists": True}}, {"_id": 1, "tags": 1}):
+        normalized = _normalize(doc["tags"])
+        if normalized != doc["tags"]:
+            updates.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"tags": normalized}}))
+        if len(updates) >= batch_size:
+            await db.content.bulk_write(updates, ordered=False)
+            changed += len(updates)
+            updates = []
+    if updates:
+        await db.content.bulk_write(updates, ordered=False)
+        changed += len(updates)
+    return changed
+
+
+def facet_stages(legacy: bool = False) -> dict:
+    """$facet sub-pipelines counting tags, file types, media kinds and artists over the matched content
+
+    With legacy set, artists are also looked up by their schema v1 string id.
+    """
+    artist_names = {"$arrayElemAt": ["$artist.name", 0]}
+    legacy_lookup = []
+    if legacy:
+        legacy_lookup = [{"$lookup": {"from": "artists", "localField": "_id", "foreignField": "id", "as": "legacy_artist"}}]
+        artist_names = {"$arrayElemAt": [{"$concatArrays": ["$artist.name", "$legacy_artist.name"]}, 0]}
+    return {
+        "tags": [
+            {"$unwind": "$tags"},
+            {"$group": {"_id": "$tags", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": FACET_LIMIT},
+        ],
+        "file_types": [
+            {"$group": {"_id": "$file_type", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": FACET_LIMIT},
+        ],
+        "media_kinds": [
+            {"$group": {"_id": "$media_kind", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+        ],
+        "artists": [
+            {"$group": {"_id": "$artist_id", "count": {"$sum": 1}}},
+            {"$sort": {"count": -1, "_id": 1}},
+            {"$limit": FACET_LIMIT},
+            # Only the top artists are joined, to label them
+            {"$lookup": {"from": "artists", "localField": "_id", "foreignField": "_id", "as": "artist"}},
+            *legacy_lookup,
+            {"$project": {"_id": 1, "count": 1, "name": artist_names}},
+        ],
+        "total": [{"$count": "count"}],
+    }
+
+
+def facet_counts(rows: List[dict]) -> List[dict]:
+    counts = {}
+    for row in rows:
+        value = id_str(row["_id"])
+        if value in counts:
+            # An artist counted under both its v1 and v2 id while a schema migration runs
+            counts[value]["count"] += row["count"]
+            counts[value]["name"] = counts[value]["name"] or row.get("name")
+        else:
+            counts[value] = {"value": value, "count": row["count"], "name": row.get("name")}
+    return list(counts.values())
+
+
+if __name__ == "__main__":
+    import typer
+    from dotenv import load_dotenv
+    from motor.motor_asyncio import AsyncIOMotorClient
+
+    load_dotenv(Path(__file__).parent / '.env')
+    cli = typer.Typer(help="Maintain normalized tags and tag counts")
+
+    def _db():
+        return AsyncIOMotorClient(os.environ['MONGO_URL'])[os.environ['DB_NAME']]
+
+    @cli.command()
+    def normalize():
+        """Lowercase and deduplicate stored tags, then rebuild the counts"""
+        async def run():
+            db = _db()
+            changed = await normalize_stored_tags(db)
+            result = await rebuild_tag_counts(db)
+            return changed, result
+        changed, result = asyncio.run(run())
+        typer.echo(f"Normalized {changed} documents; {result['tags']} tags, corrected {result['corrected']} counts")
+
+    @cli.command()
+    def rebuild():
+        """Recompute tag counts from the content collection"""
+        result = asyncio.run(rebuild_tag_counts(_db()))
+        typer.echo(f"{result['tags']} tags, corrected {result['corrected']} counts")
+
+    cli()
@@ -0,0 +1,82 @@
+"""Size limits for streamed uploads.
+
+Request bodies are never buffered whole: the middleware rejects oversized
+requests from their Content-Length before any parsing happens, and counts
+bytes as they arrive for bodies sent without one.
+"""
+import os
+from typing import AsyncIterator
+
+from fastapi import HTTPException
+
+MAX_UPLOAD_BYTES = int(os.environ.get("MAX_UPLOAD_BYTES", 512 * 1024 * 1024))
+MAX_PART_BYTES = int(os.environ.get("MAX_PART_BYTES", 64 * 1024 * 1024))
+MAX_PARTS = 10000
+# Chunked upload sessions take parts for this long; cleanup.py releases the parts of expired ones
+UPLOAD_SESSION_SECONDS = int(os.environ.get("UPLOAD_SESSION_SECONDS", 24 * 3600))
+# A completion still unfinished after this long (its process died) may be retried
+UPLOAD_COMPLETE_LEASE_SECONDS = float(os.environ.get("UPLOAD_COMPLETE_LEASE_SECONDS", 600))
+# Session documents are removed by a TTL index this long after they expire
+UPLOAD_SESSION_RETENTION_SECONDS = int(os.environ.get("UPLOAD_SESSION_RETENTION_SECONDS", 7 * 24 * 3600))
+
+# Allowance for multipart boundaries and form fields around the file itself
+FORM_OVERHEAD_BYTES = 1024 * 1024
+
+
+def too_large(limit: int) -> HTTPException:
+    return HTTPException(status_code=413, detail=f"Upload exceeds the limit of {limit} bytes")
+
+
+async def limit_size(chunks: AsyncIterator[bytes], max_bytes: int) -> AsyncIterator[bytes]:
+    """Pass chunks through, failing as soon as more than max_bytes have been seen"""
+    seen = 0
+    async for chunk in chunks:
+        seen += len(chunk)
+        if seen > max_bytes:
+            raise too_large(max_bytes)
+        yield chunk
+
+
+class UploadLimitMiddleware:
+    """Reject request bodies larger than the upload limit before they are read."""
+
+    def __init__(self, app, max_body_bytes: int = MAX_UPLOAD_BYTES + FORM_OVERHEAD_BYTES):
+        self.app = app
+        self.max_body_bytes = max_body_bytes
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or scope["method"] not in ("POST", "PUT", "PATCH"):
+            await self.app(scope, receive, send)
+            return
+
+        headers = dict(scope["headers"])
+        content_length = headers.get(b"content-length")
+        if content_length is not None and content_length.isdigit() and int(content_length) > self.max_body_bytes:
+            await self._reject(send)
+            return
+
+        received = 0
+
+        async def limited_receive():
+            nonlocal received
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body_bytes:
+                    raise too_large(self.max_body_bytes)
+            return message
+
+        await self.app(scope, limited_receive, send)
+
+    async def _reject(self, send):
+        body = b'{"detail":"Request body too large"}'
+        await send({
+            "type": "http.response.start",
+            "status": 413,
+            "headers": [
+                (b"content-type", b"application/json"),
+                (b"content-length", str(len(body)).encode()),
+                (b"connection", b"close"),
+            ],
+        })
+        await send({"type": "http.response.body", "body": body})
@@ -0,0 +1,87 @@
+"""Job worker entry point.
+
+    python worker.py --processes 2 --concurrency 4
+
+Each process opens its own MongoDB client and runs ``concurrency`` job slots.
+SIGTERM or Ctrl-C stops claiming new jobs and lets running ones finish.
+"""
+import asyncio
+import logging
+import multiprocessing
+import os
+import signal
+from pathlib import Path
+
+import typer
+from dotenv import load_dotenv
+
+ROOT_DIR = Path(__file__).parent
+load_dotenv(ROOT_DIR / '.env')
+
+from blobstore import create_blob_store  # noqa: E402
+from cache import create_cache  # noqa: E402
+from cleanup import schedule_collector  # noqa: E402
+from database import check_connection, create_client  # noqa: E402
+from jobs import Worker  # noqa: E402
+from processing import HANDLERS, JobContext  # noqa: E402
+from renditions import shutdown_renditions  # noqa: E402
+from schema import detect_legacy  # noqa: E402
+from similarity import SimilarityIndex  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+
+async def serve(concurrency: int):
+    client = create_client()
+    try:
+        await check_connection(client)
+        db = client[os.environ['DB_NAME']]
+        await detect_legacy(db)
+        ctx = JobContext(db=db, blob_store=create_blob_store(db, ROOT_DIR), cache=create_cache(), similarity=SimilarityIndex())
+        await schedule_collector(db)
+
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGTERM, signal.SIGINT):
+            loop.add_signal_handler(sig, stop.set)
+        await Worker(ctx, HANDLERS, concurrency).run(stop)
+    finally:
+        shutdown_renditions()
+        client.close()
+
+
+def run_process(concurrency: int):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(processName)s - %(name)s - %(levelname)s - %(message)s')
+    asyncio.run(serve(concurrency))
+
+
+def main(
+    processes: int = typer.Option(1, help="Worker processes"),
+    concurrency: int = typer.Option(4, help="Jobs run at once per process"),
+):
+    """Run job workers until interrupted"""
+    if processes == 1:
+        run_process(concurrency)
+        return
+
+    context = multiprocessing.get_context("spawn")
+    children = [
+        context.Process(target=run_process, args=(concurrency,), name=f"worker-{i}")
+        for i in range(processes)
+    ]
+    for child in children:
+        child.start()
+
+    def forward(signum, frame):
+        for child in children:
+            if child.is_alive():
+                os.kill(child.pid, signal.SIGTERM)
+
+    signal.signal(signal.SIGTERM, forward)
+    signal.signal(signal.SIGINT, forward)
+    for child in children:
+        child.join()
+
+
+if __name__ == "__main__":
+    typer.run(main)
@@ -48,9 +48,9 @@ const ArtistCard = ({ artist, onClick }) => (
     onClick={() => onClick(artist)}
   >
     <div className="h-48 bg-gradient-to-r from-blue-400 to-purple-500 flex items-center justify-center">
-      {artist.profile_image ? (
+      {artist.has_profile_image ? (
         <img 
-          src={`data:image/jpeg;base64,${artist.profile_image}`}
+          src={`${API}/artists/${artist.id}/profile-image?size=480`}
           alt={artist.name}
           className="w-full h-full object-cover"
         />
@@ -78,13 +78,13 @@ const ContentCard = ({ content, artist }) => {
       <div className="h-64 bg-gray-100 flex items-center justify-center">
         {isImage ? (
           <img 
-            src={`data:${content.file_type};base64,${content.file_data}`}
+            src={content.thumbnail_urls?.['480'] ? `${BACKEND_URL}${content.thumbnail_urls['480']}` : `${API}/content/${content.id}/file`}
             alt={content.title}
             className="w-full h-full object-cover"
           />
         ) : isVideo ? (
           <video 
-            src={`data:${content.file_type};base64,${content.file_data}`}
+            src={`${API}/content/${content.id}/file`}
             controls
             className="w-full h-full object-cover"
           />
@@ -92,7 +92,7 @@ const ContentCard = ({ content, artist }) => {
           <div className="flex flex-col items-center space-y-4">
             <div className="text-4xl text-gray-400">🎵</div>
             <audio 
-              src={`data:${content.file_type};base64,${content.file_data}`}
+              src={`${API}/content/${content.id}/file`}
               controls
               className="w-full"
             />
@@ -423,6 +423,65 @@ function App() {
     fetchData();
   }, []);
 
+  // Live updates: apply artist/content changes as they happen instead of refetching the lists
+  const [feedConnected, setFeedConnected] = useState(false);
+
+  useEffect(() => {
+    const setters = { artist: setArtists, content: setContent };
+    const paths = { artist: 'artists', content: 'content' };
+
+    const upsert = (entity, item) => {
+      setters[entity]((items) => {
+        const index = items.findIndex((existing) => existing.id === item.id);
+        if (index === -1) return [item, ...items];
+        const next = [...items];
+        next[index] = { ...items[index], ...item };
+        return next;
+      });
+    };
+
+    const remove = (entity, id) => {
+      setters[entity]((items) => items.filter((item) => item.id !== id));
+    };
+
+    const handleEvent = async (message) => {
+      const event = JSON.parse(message.data);
+      const [entity, op] = event.type.split('.');
+      if (op === 'deleted') {
+        remove(entity, event.entity_id);
+      } else if (event.data) {
+        upsert(entity, event.data);
+      } else {
+        // Some updates only say what changed, not how; content is reread as a summary so it keeps its thumbnail_urls
+        try {
+          if (entity === 'content') {
+            const response = await axios.get(`${API}/content`, { params: { ids: event.entity_id } });
+            response.data.forEach((item) => upsert(entity, item));
+          } else {
+            const response = await axios.get(`${API}/${paths[entity]}/${event.entity_id}`);
+            upsert(entity, response.data);
+          }
+        } catch (error) {
+          console.error('Error refreshing from feed:', error);
+        }
+      }
+    };
+
+    const source = new EventSource(`${API}/feed`);
+    const types = ['created', 'updated', 'deleted'].flatMap((op) => [`artist.${op}`, `content.${op}`]);
+    types.forEach((type) => source.addEventListener(type, handleEvent));
+    // Too far behind, or the server restarted: start over from the lists
+    source.addEventListener('feed.reset', () => fetchData());
+    source.onopen = () => setFeedConnected(true);
+    source.onerror = () => setFeedConnected(false);
+
+    return () => source.close();
+  }, []);
+
+  const refreshIfOffline = () => {
+    if (!feedConnected) fetchData();
+  };
+
   const handleArtistClick = (artist) => {
     console.log('Artist clicked:', artist);
     // TODO: Implement artist detail view
@@ -454,14 +513,14 @@ function App() {
       {currentView === 'upload' && (
         <UploadView 
           artists={artists} 
-          onRefresh={fetchData} 
+          onRefresh={refreshIfOffline} 
         />
       )}
       
       {currentView === 'profile' && (
         <ProfileView 
           artists={artists} 
-          onRefresh={fetchData} 
+          onRefresh={refreshIfOffline} 
         />
       )}
     </div>
@@ -0,0 +1,43 @@
+import sys
+from pathlib import Path
+
+import pytest
+from mongomock_motor import AsyncMongoMockClient
+
+# The backend modules import each other by their top-level names
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent / "backend"))
+
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+
+@pytest.fixture
+def db():
+    return AsyncMongoMockClient()["test"]
+
+
+@pytest.fixture(autouse=True)
+def legacy_codecs():
+    """Codecs are process-wide; put them back in the mode they start in"""
+    from schema import CODECS
+    yield
+    for codec in CODECS:
+        codec.legacy = True
+
+
+@pytest.fixture
+async def api(monkeypatch, tmp_path):
+    """An HTTP client for the app, on a fresh mongomock database, blob directory and cache"""
+    import httpx
+
+    import server
+    from blobstore import LocalBlobStore
+    from cache import DocumentCache, MemoryBackend
+
+    server.init_db(AsyncMongoMockClient(), "test")
+    monkeypatch.setattr(server, "blob_store", LocalBlobStore(tmp_path / "blobs"))
+    monkeypatch.setattr(server, "cache", DocumentCache(MemoryBackend()))
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=server.app), base_url="http://test") as client:
+        yield client
@@ -0,0 +1,93 @@
+from types import SimpleNamespace
+
+import pytest
+
+import admission
+from admission import AdmissionController, MemoryBuckets, RateLimit
+
+pytestmark = pytest.mark.anyio
+
+LIMIT = RateLimit(rate=2, burst=3)
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(admission, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+async def test_burst_then_wait(clock):
+    buckets = MemoryBuckets()
+    assert [await buckets.take("client", LIMIT) for _ in range(3)] == [0, 0, 0]
+    assert await buckets.take("client", LIMIT) == pytest.approx(0.5)
+
+
+async def test_refills_at_rate_up_to_burst(clock):
+    buckets = MemoryBuckets()
+    for _ in range(3):
+        await buckets.take("client", LIMIT)
+    clock.value += 0.5
+    assert await buckets.take("client", LIMIT) == 0
+    assert await buckets.take("client", LIMIT) == pytest.approx(0.5)
+
+    # A long idle spell refills only to the burst size
+    clock.value += 60
+    assert [await buckets.take("client", LIMIT) for _ in range(3)] == [0, 0, 0]
+    assert await buckets.take("client", LIMIT) > 0
+
+
+async def test_waiting_the_returned_delay_is_enough(clock):
+    buckets = MemoryBuckets()
+    for _ in range(3):
+        await buckets.take("client", LIMIT)
+    clock.value += 0.2
+    wait = await buckets.take("client", LIMIT)
+    assert wait == pytest.approx(0.3)
+    # A denied request takes nothing from the bucket
+    clock.value += wait
+    assert await buckets.take("client", LIMIT) == 0
+
+
+async def test_clients_have_separate_buckets(clock):
+    buckets = MemoryBuckets()
+    for _ in range(3):
+        await buckets.take("a", LIMIT)
+    assert await buckets.take("a", LIMIT) > 0
+    assert await buckets.take("b", LIMIT) == 0
+
+
+async def test_least_recently_used_clients_are_forgotten(clock):
+    buckets = MemoryBuckets(max_entries=2)
+    for key in ("a", "b", "a", "c"):
+        await buckets.take(key, LIMIT)
+    assert list(buckets.buckets) == ["a", "c"]
+
+
+async def test_disabled_and_unknown_classes_are_not_limited(clock):
+    controller = AdmissionController(MemoryBuckets(), {"read": RateLimit(rate=0, burst=1)})
+    for _ in range(5):
+        assert await controller.check_rate("client", "read") == 0
+        assert await controller.check_rate("client", "write") == 0
+
+
+def test_limits_stay_off_until_proxy_hops_are_set(monkeypatch):
+    monkeypatch.setattr(admission, "TRUSTED_PROXY_HOPS", None)
+    assert AdmissionController(MemoryBuckets()).limits == {}
+    monkeypatch.setattr(admission, "TRUSTED_PROXY_HOPS", 0)
+    assert AdmissionController(MemoryBuckets()).limits == admission.RATE_LIMITS
+
+
+@pytest.mark.parametrize("hops,forwarded,expected", [
+    (None, b"203.0.113.9", "10.0.0.1"),
+    (0, b"203.0.113.9", "10.0.0.1"),
+    (1, b"203.0.113.9", "203.0.113.9"),
+    # Only the hop added by our own proxy is trusted, not what the client claims before it
+    (1, b"198.51.100.7, 203.0.113.9", "203.0.113.9"),
+    (2, b"198.51.100.7, 203.0.113.9", "198.51.100.7"),
+])
+def test_client_address(monkeypatch, hops, forwarded, expected):
+    monkeypatch.setattr(admission, "TRUSTED_PROXY_HOPS", hops)
+    scope = {"client": ("10.0.0.1", 5000), "headers": [(b"x-forwarded-for", forwarded)]}
+    assert admission.client_address(scope) == expected
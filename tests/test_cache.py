@@ -0,0 +1,134 @@
+import asyncio
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+import cache as cache_module
+from cache import DocumentCache, MemoryBackend, RedisBackend
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture(params=["memory", "redis"])
+def backend(request):
+    if request.param == "memory":
+        return MemoryBackend()
+    fakeredis = pytest.importorskip("fakeredis")
+    pytest.importorskip("lupa")
+    return RedisBackend(fakeredis.FakeAsyncRedis())
+
+
+async def test_invalidation_during_a_load_is_not_undone(backend):
+    cache = DocumentCache(backend)
+    loading, invalidated = asyncio.Event(), asyncio.Event()
+
+    async def slow_load():
+        loading.set()
+        await invalidated.wait()
+        return {"title": "before the write"}
+
+    load = asyncio.create_task(cache.get_or_load("content:1", slow_load))
+    await loading.wait()
+    await cache.invalidate("content:1")
+    invalidated.set()
+    # The caller still gets what it read, but it is not cached past the write
+    assert await load == {"title": "before the write"}
+
+    async def fresh_load():
+        return {"title": "after the write"}
+
+    assert await cache.get_or_load("content:1", fresh_load) == {"title": "after the write"}
+    assert await cache.get_or_load("content:1", slow_load) == {"title": "after the write"}
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    """A monotonic clock the test moves by hand"""
+    now = SimpleNamespace(value=1000.0)
+    monkeypatch.setattr(cache_module, "time", SimpleNamespace(monotonic=lambda: now.value))
+    return now
+
+
+async def test_least_recently_used_entries_are_evicted(clock):
+    backend = MemoryBackend(max_entries=2)
+    await backend.set("a", 1, 30)
+    await backend.set("b", 2, 30)
+    assert await backend.get("a") == (True, 1)
+    await backend.set("c", 3, 30)
+    assert list(backend.entries) == ["a", "c"]
+    assert backend.stats()["evictions"] == 1
+
+
+async def test_entries_expire(clock):
+    backend = MemoryBackend()
+    await backend.set("a", 1, 30)
+    clock.value += 29
+    assert await backend.get("a") == (True, 1)
+    clock.value += 2
+    assert await backend.get("a") == (False, None)
+    assert backend.stats()["expirations"] == 1
+
+
+async def test_missing_documents_are_cached_briefly(clock):
+    cache = DocumentCache(MemoryBackend(), ttl=30, negative_ttl=5)
+    loads = []
+
+    async def load():
+        loads.append(1)
+        return None
+
+    for _ in range(3):
+        assert await cache.get_or_load("artist:missing", load) is None
+    assert len(loads) == 1
+    assert cache.stats()["negative_hits"] == 2
+    clock.value += 6
+    await cache.get_or_load("artist:missing", load)
+    assert len(loads) == 2
+
+
+async def test_invalidate_and_versions(backend):
+    cache = DocumentCache(backend)
+
+    async def load():
+        return {"name": "cached"}
+
+    async def reload():
+        return {"name": "reloaded"}
+
+    await cache.get_or_load("artist:1", load)
+    assert await cache.get_or_load("artist:1", reload) == {"name": "cached"}
+    await cache.invalidate("artist:1")
+    assert await cache.get_or_load("artist:1", reload) == {"name": "reloaded"}
+
+    assert await cache.version("artist_content:1") == 0
+    await cache.bump("artist_content:1")
+    await cache.bump("artist_content:1")
+    assert await cache.version("artist_content:1") == 2
+    assert await cache.version("artist_content:2") == 0
+
+
+async def test_redis_values_round_trip():
+    fakeredis = pytest.importorskip("fakeredis")
+    backend = RedisBackend(fakeredis.FakeAsyncRedis())
+    value = {"id": "1", "tags": ["ink"], "created_at": datetime(2024, 1, 2, 3, 4, 5, 6000)}
+    await backend.set("content:1", value, 30)
+    assert await backend.get("content:1") == (True, value)
+
+
+async def test_writes_reach_cached_reads(api):
+    artist = (await api.post("/api/artists", json={"name": "Artist", "email": "artist@example.com"})).json()
+    url = f"/api/artists/{artist['id']}"
+    assert (await api.get(url)).json()["bio"] == ""
+    assert (await api.get(f"{url}/content")).json() == []
+
+    await api.put(url, json={"bio": "Painter"})
+    assert (await api.get(url)).json()["bio"] == "Painter"
+
+    # A new upload bumps the artist's content version, so the cached empty page is not served again
+    response = await api.post("/api/content", data={"artist_id": artist["id"], "title": "Piece"}, files={"file": ("a.txt", b"text", "text/plain")})
+    assert response.status_code == 200
+    assert [item["title"] for item in (await api.get(f"{url}/content")).json()] == ["Piece"]
+
+    await api.delete(f"/api/content/{response.json()['content_id']}")
+    assert (await api.get(f"{url}/content")).json() == []
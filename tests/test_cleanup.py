@@ -0,0 +1,121 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+
+import cleanup
+from blobstore import LocalBlobStore
+from cache import DocumentCache, MemoryBackend
+from cleanup import (
+    COLLECT_ORPHANS, RELEASE_BLOBS, collect_orphans, delete_artist, purge_artist,
+    purge_artist_content, release_unreferenced,
+)
+from processing import JobContext
+from schema import ARTISTS, CONTENT
+from tags import record_tags
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def ctx(db, tmp_path):
+    events = []
+    context = JobContext(db, LocalBlobStore(tmp_path), DocumentCache(MemoryBackend()), lambda *event: events.append(event))
+    context.events = events
+    return context
+
+
+async def put_blob(ctx, data: bytes) -> str:
+    async def chunks():
+        yield data
+    return (await ctx.blob_store.put(chunks())).sha256
+
+
+async def add_artist(ctx) -> str:
+    artist_id = str(uuid.uuid4())
+    await ctx.db.artists.insert_one(ARTISTS.encode({"id": artist_id, "name": "Artist", "email": f"{artist_id}@example.com"}))
+    await ctx.db.artist_stats.insert_one({"artist_id": artist_id, "content_count": 0})
+    return artist_id
+
+
+async def add_content(ctx, artist_id: str, blob_id: str, tags=("paint",)) -> str:
+    content_id = str(uuid.uuid4())
+    await ctx.db.content.insert_one(CONTENT.encode({
+        "id": content_id, "artist_id": artist_id, "blob_id": blob_id, "tags": list(tags), "created_at": datetime.utcnow(),
+    }))
+    await record_tags(ctx.db, tags, 1)
+    return content_id
+
+
+async def queued_blob_ids(db) -> set:
+    return {key for job in await db.jobs.find({"type": RELEASE_BLOBS}).to_list(None) for key in job["payload"]["blob_ids"]}
+
+
+async def test_delete_artist_and_purge_in_batches(ctx, monkeypatch):
+    monkeypatch.setattr(cleanup, "ARTIST_DELETE_BATCH_SIZE", 2)
+    artist_id, other_id = await add_artist(ctx), await add_artist(ctx)
+    shared = await put_blob(ctx, b"shared")
+    own = [await put_blob(ctx, f"own {i}".encode()) for i in range(4)]
+    for blob_id in own + [shared]:
+        await add_content(ctx, artist_id, blob_id)
+    kept = await add_content(ctx, other_id, shared)
+
+    assert (await delete_artist(ctx, artist_id))["id"] == artist_id
+    assert await ctx.db.artists.count_documents({}) == 1
+    assert await ctx.db.artist_stats.count_documents({"artist_id": artist_id}) == 0
+    assert await delete_artist(ctx, artist_id) is None
+
+    assert await purge_artist_content(ctx, artist_id, max_batches=1) == (2, False)
+    assert await purge_artist_content(ctx, artist_id) == (3, True)
+    remaining = CONTENT.decode_many(await ctx.db.content.find().to_list(None))
+    assert [doc["id"] for doc in remaining] == [kept]
+    assert (await ctx.db.tag_counts.find_one({"tag": "paint"}))["count"] == 1
+    assert ("artists", "deleted", artist_id) in ctx.events
+    assert len([event for event in ctx.events if event[:2] == ("content", "deleted")]) == 5
+
+    # Every blob of the deleted content is queued; only the one another artist still uses survives the release
+    assert await queued_blob_ids(ctx.db) == set(own) | {shared}
+    monkeypatch.setattr(cleanup, "BLOB_RELEASE_GRACE_SECONDS", 0)
+    assert await release_unreferenced(ctx.db, ctx.blob_store, await queued_blob_ids(ctx.db)) == 4
+    assert await ctx.blob_store.exists(shared)
+    assert not any([await ctx.blob_store.exists(key) for key in own])
+
+
+async def test_recent_blob_is_kept_and_checked_again(ctx):
+    blob_id = await put_blob(ctx, b"just uploaded")
+
+    assert await release_unreferenced(ctx.db, ctx.blob_store, [blob_id]) == 0
+    assert await ctx.blob_store.exists(blob_id)
+    job = await ctx.db.jobs.find_one({"type": RELEASE_BLOBS})
+    assert job["payload"] == {"blob_ids": [blob_id]}
+    assert job["run_at"] > datetime.utcnow() + timedelta(seconds=cleanup.BLOB_RELEASE_GRACE_SECONDS - 60)
+
+
+async def test_open_upload_session_keeps_its_parts(ctx, monkeypatch):
+    monkeypatch.setattr(cleanup, "BLOB_RELEASE_GRACE_SECONDS", 0)
+    part = await put_blob(ctx, b"part")
+    await ctx.db.upload_sessions.insert_one({"id": "upload", "status": "open", "part_blobs": [part]})
+
+    assert await release_unreferenced(ctx.db, ctx.blob_store, [part]) == 0
+    await ctx.db.upload_sessions.update_one({"id": "upload"}, {"$set": {"status": "completed"}})
+    assert await release_unreferenced(ctx.db, ctx.blob_store, [part]) == 1
+
+
+async def test_purge_job_leaves_an_existing_artist_alone(ctx):
+    artist_id = await add_artist(ctx)
+    await add_content(ctx, artist_id, await put_blob(ctx, b"keep"))
+
+    await purge_artist(ctx, {"artist_id": artist_id})
+    assert await ctx.db.content.count_documents({}) == 1
+
+
+async def test_collector_purges_orphans_and_reschedules(ctx):
+    artist_id = await add_artist(ctx)
+    await add_content(ctx, artist_id, await put_blob(ctx, b"kept"))
+    orphan = await add_content(ctx, str(uuid.uuid4()), await put_blob(ctx, b"orphaned"))
+
+    await collect_orphans(ctx, {})
+    ids = [doc["id"] for doc in CONTENT.decode_many(await ctx.db.content.find().to_list(None))]
+    assert len(ids) == 1
+    assert orphan not in ids
+    assert await ctx.db.jobs.count_documents({"type": COLLECT_ORPHANS, "status": "queued"}) == 1
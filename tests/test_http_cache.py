@@ -0,0 +1,91 @@
+from datetime import datetime
+
+import pytest
+from starlette.requests import Request
+
+from http_cache import REVALIDATE, cache_headers, document_etag, is_not_modified, list_etag, not_modified
+
+MODIFIED = datetime(2024, 3, 4, 5, 6, 7, 890000)
+ETAG = document_etag({"id": "a", "updated_at": MODIFIED})
+
+
+def request(**headers) -> Request:
+    return Request({"type": "http", "headers": [(name.replace("_", "-").encode(), value.encode()) for name, value in headers.items()]})
+
+
+def test_document_etag_follows_updated_at():
+    assert document_etag({"id": "a", "updated_at": MODIFIED}) == ETAG
+    assert document_etag({"id": "a", "updated_at": datetime(2024, 3, 4)}) != ETAG
+    assert document_etag({"id": "b", "updated_at": MODIFIED}) != ETAG
+
+
+def test_list_etag_follows_membership_and_order():
+    a, b = {"id": "a", "updated_at": MODIFIED}, {"id": "b", "updated_at": MODIFIED}
+    assert list_etag([a, b]) == list_etag([dict(a), dict(b)])
+    assert list_etag([a, b]) != list_etag([a])
+    assert list_etag([a, b]) != list_etag([b, a])
+    assert list_etag([]) != list_etag([a])
+
+
+@pytest.mark.parametrize("if_none_match,expected", [
+    (ETAG, True),
+    (f"W/{ETAG}", True),
+    (f'"other", {ETAG}', True),
+    ("*", True),
+    ('"other"', False),
+])
+def test_if_none_match(if_none_match, expected):
+    assert is_not_modified(request(if_none_match=if_none_match), ETAG, MODIFIED) is expected
+
+
+@pytest.mark.parametrize("since,expected", [
+    ("Mon, 04 Mar 2024 05:06:07 GMT", True),  # sub-second precision is dropped, as in Last-Modified
+    ("Mon, 04 Mar 2024 05:06:06 GMT", False),
+    ("not a date", False),
+])
+def test_if_modified_since(since, expected):
+    assert is_not_modified(request(if_modified_since=since), ETAG, MODIFIED) is expected
+
+
+def test_if_none_match_takes_precedence():
+    headers = {"if_none_match": '"other"', "if_modified_since": "Mon, 04 Mar 2024 05:06:07 GMT"}
+    assert not is_not_modified(request(**headers), ETAG, MODIFIED)
+    assert not is_not_modified(request(), ETAG, MODIFIED)
+
+
+def test_headers_and_304():
+    headers = cache_headers(ETAG, MODIFIED)
+    assert headers == {"ETag": ETAG, "Cache-Control": REVALIDATE, "Last-Modified": "Mon, 04 Mar 2024 05:06:07 GMT"}
+    response = not_modified(ETAG, MODIFIED)
+    assert response.status_code == 304
+    assert not response.body
+    assert response.headers["etag"] == ETAG
+
+
+@pytest.mark.anyio
+async def test_artist_endpoints_revalidate(api):
+    created = (await api.post("/api/artists", json={"name": "Artist", "email": "artist@example.com"})).json()
+    url = f"/api/artists/{created['id']}"
+
+    first = await api.get(url)
+    etag = first.headers["etag"]
+    assert (await api.get(url, headers={"If-None-Match": etag})).status_code == 304
+    assert (await api.get(url, headers={"If-Modified-Since": first.headers["last-modified"]})).status_code == 304
+
+    page = await api.get("/api/artists")
+    page_etag = page.headers["etag"]
+    assert "last-modified" not in page.headers
+    assert (await api.get("/api/artists", headers={"If-None-Match": page_etag})).status_code == 304
+
+    # An edit changes both the document and the page it is listed on
+    await api.put(url, json={"bio": "Painter"})
+    assert (await api.get(url, headers={"If-None-Match": etag})).status_code == 200
+    assert (await api.get("/api/artists", headers={"If-None-Match": page_etag})).status_code == 200
+
+    # A deletion changes the page even though nothing left in it is newer
+    other = (await api.post("/api/artists", json={"name": "Other", "email": "other@example.com"})).json()
+    before = (await api.get("/api/artists")).headers["etag"]
+    await api.delete(f"/api/artists/{other['id']}")
+    after = await api.get("/api/artists", headers={"If-None-Match": before})
+    assert after.status_code == 200
+    assert after.headers["etag"] != before
@@ -0,0 +1,31 @@
+import uuid
+
+import pytest
+from bson import ObjectId
+from pymongo.errors import OperationFailure
+
+from indexes import ensure_indexes, find_duplicate_emails
+from schema import ARTISTS
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_duplicate_emails_fail_startup(db):
+    first, second = str(uuid.uuid4()), str(uuid.uuid4())
+    await db.artists.insert_one(ARTISTS.encode({"id": first, "name": "A", "email": "same@example.com"}))
+    # A v1 document still keyed by its string id
+    await db.artists.insert_one({"_id": ObjectId(), "id": second, "name": "B", "email": "same@example.com"})
+    await db.artists.insert_one(ARTISTS.encode({"id": str(uuid.uuid4()), "name": "C", "email": "other@example.com"}))
+
+    with pytest.raises(OperationFailure):
+        await ensure_indexes(db)
+    assert await find_duplicate_emails(db) == [{"email": "same@example.com", "ids": [first, second]}]
+
+
+async def test_unique_email_is_enforced(db):
+    await ensure_indexes(db)
+    await ensure_indexes(db)
+    assert await find_duplicate_emails(db) == []
+    await db.artists.insert_one(ARTISTS.encode({"id": str(uuid.uuid4()), "name": "A", "email": "a@example.com"}))
+    with pytest.raises(OperationFailure):
+        await db.artists.insert_one(ARTISTS.encode({"id": str(uuid.uuid4()), "name": "B", "email": "a@example.com"}))
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+import pytest
+
+from jobs import JobHandler, Worker, claim, complete, enqueue, ensure_queued
+
+pytestmark = pytest.mark.anyio
+
+
+async def expire_lease(db, job_id: str):
+    await db.jobs.update_one({"id": job_id}, {"$set": {"locked_until": datetime.utcnow() - timedelta(seconds=1)}})
+
+
+async def test_claim_leases_a_job_once(db):
+    job_id = await enqueue(db, "noop", {"n": 1})
+
+    job = await claim(db, "worker-a", ["noop"])
+    assert job["id"] == job_id
+    assert job["status"] == "running"
+    assert job["attempts"] == 1
+    assert job["locked_until"] > datetime.utcnow()
+    assert await claim(db, "worker-b", ["noop"]) is None
+
+
+async def test_delayed_job_waits(db):
+    await enqueue(db, "noop", {}, delay=60)
+    assert await claim(db, "worker-a", ["noop"]) is None
+
+
+async def test_expired_lease_is_reclaimed(db):
+    job_id = await enqueue(db, "noop", {})
+    first = await claim(db, "worker-a", ["noop"])
+    await expire_lease(db, job_id)
+
+    second = await claim(db, "worker-b", ["noop"])
+    assert second["id"] == job_id
+    assert second["locked_by"] == "worker-b"
+    assert second["attempts"] == 2
+    # The worker that lost the lease can no longer record an outcome
+    assert not await complete(db, first)
+    assert await complete(db, second)
+    assert (await db.jobs.find_one({"id": job_id}))["status"] == "succeeded"
+
+
+async def test_reclaimed_after_last_attempt_gives_up(db):
+    given_up = []
+
+    async def run(ctx, payload):
+        raise AssertionError("must not run again")
+
+    async def on_give_up(ctx, payload, error):
+        given_up.append(error)
+
+    job_id = await enqueue(db, "flaky", {}, max_attempts=1)
+    await claim(db, "worker-a", ["flaky"])
+    await expire_lease(db, job_id)
+
+    worker = Worker(SimpleNamespace(db=db), {"flaky": JobHandler(run, on_give_up)}, concurrency=1)
+    assert await worker.run_once()
+    job = await db.jobs.find_one({"id": job_id})
+    assert job["status"] == "failed"
+    assert given_up == ["Lease expired"]
+
+
+async def test_failure_is_retried_later(db):
+    async def run(ctx, payload):
+        raise ValueError("boom")
+
+    job_id = await enqueue(db, "flaky", {}, max_attempts=3)
+    worker = Worker(SimpleNamespace(db=db), {"flaky": JobHandler(run)}, concurrency=1)
+    assert await worker.run_once()
+
+    job = await db.jobs.find_one({"id": job_id})
+    assert job["status"] == "queued"
+    assert job["last_error"] == "ValueError: boom"
+    assert job["run_at"] > datetime.utcnow()
+
+
+async def test_ensure_queued_keeps_one_waiting(db):
+    assert await ensure_queued(db, "periodic", delay=60)
+    assert await ensure_queued(db, "periodic") is None
+    assert await db.jobs.count_documents({"type": "periodic"}) == 1
@@ -0,0 +1,128 @@
+import struct
+import wave
+
+import pytest
+from fastapi import HTTPException
+from PIL import Image
+
+from media import INLINE_TYPES, SNIFF_BYTES, TypeSniffer, extract_metadata, media_filter, media_kind_for, probe, sniff
+from renditions import shutdown_renditions
+
+
+@pytest.mark.parametrize("head,expected", [
+    (b"\xff\xd8\xff\xe0rest", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\nrest", "image/png"),
+    (b"RIFF\x00\x00\x00\x00WEBPVP8 ", "image/webp"),
+    (b"RIFF\x00\x00\x00\x00WAVEfmt ", "audio/wav"),
+    (b"\x00\x00\x00\x18ftypisom", "video/mp4"),
+    (b"\x00\x00\x00\x18ftypqt  ", "video/quicktime"),
+    (b"\x00\x00\x00\x18ftypheic", "image/heic"),
+    (b"\xff\xfb\x90\x00", "audio/mpeg"),
+    (b"%PDF-1.7", "application/pdf"),
+    (b"\xef\xbb\xbf  <svg xmlns='http://www.w3.org/2000/svg'>", "image/svg+xml"),
+    (b"<?xml version='1.0'?>\n<svg>", "image/svg+xml"),
+    (b"<html><body>", None),
+    (b"plain text", None),
+    (b"", None),
+])
+def test_sniff(head, expected):
+    assert sniff(head) == expected
+
+
+def test_only_binary_media_is_served_inline():
+    assert {"image/png", "image/jpeg", "video/mp4", "audio/mpeg", "audio/wav"} <= INLINE_TYPES
+    assert "image/svg+xml" not in INLINE_TYPES
+    assert not any(media_type.startswith(("text/", "application/")) for media_type in INLINE_TYPES)
+
+
+@pytest.mark.parametrize("media_type,kind", [
+    ("image/png", "image"), ("video/mp4", "video"), ("audio/wav", "audio"),
+    ("text/plain", "document"), ("application/pdf", "document"),
+    ("application/octet-stream", "other"), (None, "other"),
+])
+def test_media_kind_for(media_type, kind):
+    assert media_kind_for(media_type) == kind
+
+
+@pytest.mark.anyio
+async def test_sniffer_keeps_the_head_across_chunks():
+    async def chunks():
+        yield b"\x89PN"
+        yield b"G\r\n\x1a\n" + b"x" * SNIFF_BYTES
+
+    sniffer = TypeSniffer()
+    passed = b"".join([chunk async for chunk in sniffer.wrap(chunks())])
+    assert len(passed) == SNIFF_BYTES + 8
+    assert len(sniffer.head) == SNIFF_BYTES
+    # The sniffed type wins over what the client declared
+    assert sniffer.media_type("text/html") == "image/png"
+    assert TypeSniffer().media_type("text/plain") == "text/plain"
+    assert TypeSniffer().media_type(None) == "application/octet-stream"
+
+
+def test_media_filter():
+    assert media_filter("image", "portrait") == {"media_kind": "image", "orientation": "portrait"}
+    assert media_filter(min_duration=5) == {"duration": {"$gte": 5}, "media_kind": {"$in": ["audio", "video"]}}
+    for bad in [{"media_kind": "sculpture"}, {"orientation": "diagonal"}, {"min_duration": 10, "max_duration": 5}]:
+        with pytest.raises(HTTPException):
+            media_filter(**bad)
+
+
+def test_probe_image_with_exif(tmp_path):
+    path = tmp_path / "photo.jpg"
+    exif = Image.Exif()
+    exif[0x0112] = 6  # stored rotated: the displayed image is portrait
+    exif[0x010F] = "Camera Maker\x00"
+    exif[0x0110] = "Model 1"
+    Image.new("RGB", (40, 20), "red").save(path, exif=exif)
+
+    metadata = probe(str(path), "application/octet-stream")
+    assert metadata["file_type"] == "image/jpeg"
+    assert metadata["media_kind"] == "image"
+    assert (metadata["width"], metadata["height"], metadata["orientation"]) == (20, 40, "portrait")
+    assert metadata["exif"] == {"make": "Camera Maker", "model": "Model 1"}
+    assert len(metadata["phash"]) == 16
+
+
+def test_probe_wav(tmp_path):
+    path = tmp_path / "tone.wav"
+    with wave.open(str(path), "wb") as out:
+        out.setnchannels(1)
+        out.setsampwidth(2)
+        out.setframerate(8000)
+        out.writeframes(b"\x00\x00" * 12000)
+    assert probe(str(path)) == {"file_type": "audio/wav", "media_kind": "audio", "duration": 1.5}
+
+
+def box(kind: bytes, payload: bytes) -> bytes:
+    return struct.pack(">I4s", 8 + len(payload), kind) + payload
+
+
+def test_probe_mp4(tmp_path):
+    mvhd = box(b"mvhd", bytes(4) + bytes(8) + struct.pack(">II", 1000, 2500) + bytes(80))
+    # version/flags, times, track id, reserved, duration, reserved, layer, volume, matrix, then width and height
+    tkhd = box(b"tkhd", bytes(4) + bytes(20) + bytes(52) + struct.pack(">II", 1280 << 16, 720 << 16))
+    path = tmp_path / "clip.mp4"
+    path.write_bytes(box(b"ftyp", b"isom" + bytes(4)) + box(b"moov", mvhd + box(b"trak", tkhd)) + box(b"mdat", b""))
+
+    assert probe(str(path)) == {
+        "file_type": "video/mp4", "media_kind": "video",
+        "duration": 2.5, "width": 1280, "height": 720, "orientation": "landscape",
+    }
+
+
+def test_corrupt_file_still_gets_its_type(tmp_path):
+    path = tmp_path / "broken.png"
+    path.write_bytes(b"\x89PNG\r\n\x1a\n" + b"not really a png")
+    assert probe(str(path)) == {"file_type": "image/png", "media_kind": "image"}
+
+
+@pytest.mark.anyio
+async def test_extract_metadata_runs_in_the_pool(tmp_path):
+    path = tmp_path / "square.png"
+    Image.new("RGB", (16, 16), "blue").save(path)
+    try:
+        metadata = await extract_metadata(path, "image/png")
+    finally:
+        shutdown_renditions()
+    assert (metadata["file_type"], metadata["orientation"]) == ("image/png", "square")
@@ -0,0 +1,119 @@
+import pytest
+from fastapi import HTTPException
+
+from blobstore import BlobNotFound, LocalBlobStore
+from server import content_disposition, parse_range
+
+pytestmark = pytest.mark.anyio
+
+PNG = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 4
+
+
+async def chunks(*parts):
+    for part in parts:
+        yield part
+
+
+async def read(store, sha256, start=0, length=None) -> bytes:
+    return b"".join([chunk async for chunk in store.open(sha256, start, length)])
+
+
+async def test_blobs_are_content_addressed(tmp_path):
+    store = LocalBlobStore(tmp_path)
+    first = await store.put(chunks(b"hello ", b"world"))
+    second = await store.put(chunks(b"hello world"))
+
+    assert first == second
+    assert first.size == 11
+    assert await read(store, first.sha256) == b"hello world"
+    assert await read(store, first.sha256, 6, 3) == b"wor"
+    assert await store.size(first.sha256) == 11
+    assert list((tmp_path / "tmp").iterdir()) == []
+
+
+async def test_missing_and_deleted_blobs(tmp_path):
+    store = LocalBlobStore(tmp_path)
+    blob = await store.put(chunks(b"data"))
+
+    # Just written, so it is kept within the grace period
+    assert not await store.delete(blob.sha256, min_age=60)
+    assert await store.delete(blob.sha256)
+    assert not await store.exists(blob.sha256)
+    with pytest.raises(BlobNotFound):
+        await store.size(blob.sha256)
+    with pytest.raises(BlobNotFound):
+        await read(store, blob.sha256)
+
+
+@pytest.mark.parametrize("header,expected", [
+    (None, None),
+    ("bytes=0-99", (0, 99)),
+    ("bytes=100-", (100, 999)),
+    ("bytes=-100", (900, 999)),
+    ("bytes=-5000", (0, 999)),
+    ("bytes=990-5000", (990, 999)),
+    ("bytes=0-1,5-9", (0, 1)),  # only the first range is served
+    ("items=0-1", None),
+    ("bytes=a-b", None),
+])
+def test_parse_range(header, expected):
+    assert parse_range(header, 1000) == expected
+
+
+@pytest.mark.parametrize("header", ["bytes=1000-", "bytes=500-100"])
+def test_unsatisfiable_range(header):
+    with pytest.raises(HTTPException) as raised:
+        parse_range(header, 1000)
+    assert raised.value.status_code == 416
+    assert raised.value.headers["Content-Range"] == "bytes */1000"
+
+
+def test_content_disposition_keeps_non_ascii_names():
+    assert content_disposition("inline", None) == "inline"
+    assert content_disposition("attachment", 'Ünïcode "name".png') == (
+        "attachment; filename=\"_n_code _name_.png\"; filename*=UTF-8''%C3%9Cn%C3%AFcode%20%22name%22.png"
+    )
+
+
+async def upload(api, data: bytes, file_name: str, content_type: str) -> str:
+    artist = (await api.post("/api/artists", json={"name": "Artist", "email": f"{file_name}@example.com"})).json()
+    response = await api.post(
+        "/api/content", data={"artist_id": artist["id"], "title": "Piece"}, files={"file": (file_name, data, content_type)}
+    )
+    assert response.status_code == 200
+    return response.json()["content_id"]
+
+
+async def test_file_ranges(api):
+    content_id = await upload(api, PNG, "image.png", "image/png")
+    url = f"/api/content/{content_id}/file"
+
+    whole = await api.get(url)
+    assert whole.status_code == 200
+    assert whole.content == PNG
+    assert whole.headers["content-type"] == "image/png"
+    assert whole.headers["accept-ranges"] == "bytes"
+
+    part = await api.get(url, headers={"Range": "bytes=8-15"})
+    assert part.status_code == 206
+    assert part.content == PNG[8:16]
+    assert part.headers["content-range"] == f"bytes 8-15/{len(PNG)}"
+    assert part.headers["content-length"] == "8"
+
+    beyond = await api.get(url, headers={"Range": f"bytes={len(PNG)}-"})
+    assert beyond.status_code == 416
+    assert beyond.headers["content-range"] == f"bytes */{len(PNG)}"
+
+    revalidated = await api.get(url, headers={"If-None-Match": whole.headers["etag"]})
+    assert revalidated.status_code == 304
+
+
+async def test_active_content_is_downloaded_not_rendered(api):
+    svg = b'<svg xmlns="http://www.w3.org/2000/svg"><script>alert(1)</script></svg>'
+    content_id = await upload(api, svg, "drawing.svg", "image/svg+xml")
+
+    response = await api.get(f"/api/content/{content_id}/file")
+    assert response.headers["content-type"] == "application/octet-stream"
+    assert response.headers["content-disposition"].startswith("attachment;")
+    assert response.headers["x-content-type-options"] == "nosniff"
+    assert response.headers["content-security-policy"] == "sandbox"
@@ -0,0 +1,87 @@
+import uuid
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from pagination import KEYSET_SORT, after_cursor, check_page_limit, decode_cursor, encode_cursor, fetch_page
+from schema import uuid_value
+
+START = datetime(2024, 1, 1)
+
+
+async def insert_items(db, count: int, same_time: bool = False) -> list:
+    docs = [
+        {"_id": uuid_value(str(uuid.uuid4())), "created_at": START if same_time else START + timedelta(minutes=i)}
+        for i in range(count)
+    ]
+    if docs:
+        await db.items.insert_many(docs)
+    return docs
+
+
+async def read_all(db, limit: int) -> list:
+    pages, cursor = [], None
+    while True:
+        find = db.items.find(after_cursor({}, cursor)).sort(KEYSET_SORT)
+        docs, cursor = await fetch_page(find, limit)
+        pages.append(docs)
+        if cursor is None:
+            return pages
+
+
+def test_cursor_round_trip():
+    item_id = str(uuid.uuid4())
+    stamp = datetime(2024, 5, 6, 7, 8, 9, 123000)
+    assert decode_cursor(encode_cursor({"_id": uuid_value(item_id), "created_at": stamp})) == (stamp, uuid_value(item_id))
+    # API-shaped documents carry the string id
+    assert decode_cursor(encode_cursor({"id": item_id, "created_at": stamp})) == (stamp, uuid_value(item_id))
+
+
+def test_cursor_on_v1_document():
+    key = ObjectId()
+    assert decode_cursor(encode_cursor({"_id": key, "created_at": START})) == (START, key)
+
+
+@pytest.mark.parametrize("token", ["", "not a cursor", "WzFd", "WyJ4IiwiYSJd"])
+def test_invalid_cursor(token):
+    with pytest.raises(HTTPException) as raised:
+        decode_cursor(token)
+    assert raised.value.status_code == 400
+
+
+@pytest.mark.parametrize("limit,skip", [(0, 0), (-1, 0), (101, 0), (10_000_000, 0), (20, -1)])
+def test_page_limit_bounds(limit, skip):
+    with pytest.raises(HTTPException) as raised:
+        check_page_limit(limit, skip)
+    assert raised.value.status_code == 400
+
+
+def test_page_limit_accepts_bounds():
+    check_page_limit(1)
+    check_page_limit(100, skip=500)
+
+
+@pytest.mark.anyio
+@pytest.mark.parametrize("count,limit,sizes", [
+    (5, 2, [2, 2, 1]),
+    (4, 2, [2, 2]),  # the last full page has no cursor after it
+    (0, 2, [0]),
+    (1, 1, [1]),
+])
+async def test_pages_cover_everything_once(db, count, limit, sizes):
+    docs = await insert_items(db, count)
+    pages = await read_all(db, limit)
+    assert [len(page) for page in pages] == sizes
+    seen = [doc["_id"] for page in pages for doc in page]
+    assert seen == [doc["_id"] for doc in sorted(docs, key=lambda d: d["created_at"], reverse=True)]
+
+
+@pytest.mark.anyio
+async def test_pages_with_equal_timestamps(db):
+    docs = await insert_items(db, 7, same_time=True)
+    pages = await read_all(db, 3)
+    seen = [doc["_id"] for page in pages for doc in page]
+    assert sorted(seen) == sorted(doc["_id"] for doc in docs)
+    assert len(set(seen)) == 7
@@ -0,0 +1,71 @@
+import base64
+import uuid
+from datetime import datetime
+
+import pytest
+from bson import Binary, ObjectId
+
+from schema import ARTISTS, CONTENT, LEGACY_QUERY, STAGING_COLLECTION, detect_legacy, migrate_collection, uuid_value
+
+pytestmark = pytest.mark.anyio
+
+
+def v1_content(artist_id: str) -> dict:
+    return {
+        "_id": ObjectId(),
+        "id": str(uuid.uuid4()),
+        "artist_id": artist_id,
+        "title": "Piece",
+        "file_data": base64.b64encode(b"inline bytes").decode(),
+        "description": None,
+        "created_at": datetime(2024, 1, 1),
+    }
+
+
+async def test_migration_round_trip(db):
+    artist_id = str(uuid.uuid4())
+    originals = [v1_content(artist_id) for _ in range(5)]
+    await db.content.insert_many([dict(doc) for doc in originals])
+
+    assert await migrate_collection(db, CONTENT, batch_size=2) == 5
+
+    assert await db.content.count_documents(LEGACY_QUERY) == 0
+    assert await db[STAGING_COLLECTION].count_documents({}) == 0
+    for original in originals:
+        stored = await db.content.find_one({"_id": uuid_value(original["id"])})
+        assert stored["_id"].subtype == 4
+        assert stored["artist_id"] == uuid_value(artist_id)
+        assert stored["file_data"] == Binary(b"inline bytes")
+        assert "description" not in stored
+        decoded = CONTENT.decode(stored)
+        assert decoded["id"] == original["id"]
+        assert decoded["artist_id"] == artist_id
+        assert decoded["file_data"] == original["file_data"]
+
+
+async def test_migration_is_idempotent(db):
+    await db.content.insert_many([v1_content(str(uuid.uuid4())) for _ in range(3)])
+    await migrate_collection(db, CONTENT)
+    before = await db.content.find().sort("_id", 1).to_list(None)
+
+    assert await migrate_collection(db, CONTENT) == 0
+    assert await db.content.find().sort("_id", 1).to_list(None) == before
+
+
+async def test_migration_resumes_a_staged_batch(db):
+    doc = v1_content(str(uuid.uuid4()))
+    # An interrupted run deleted the original after staging it, before writing the v2 copy
+    await db[STAGING_COLLECTION].insert_one({**doc, "collection": "content"})
+
+    assert await migrate_collection(db, CONTENT) == 1
+    assert CONTENT.decode(await db.content.find_one(CONTENT.id_query(doc["id"])))["title"] == "Piece"
+    assert await db[STAGING_COLLECTION].count_documents({}) == 0
+
+
+async def test_detect_legacy(db):
+    await db.artists.insert_one({"_id": ObjectId(), "id": str(uuid.uuid4()), "name": "Old", "email": "old@example.com"})
+    await detect_legacy(db)
+    assert ARTISTS.legacy
+    await migrate_collection(db, ARTISTS)
+    await detect_legacy(db)
+    assert not ARTISTS.legacy
@@ -0,0 +1,79 @@
+import random
+import uuid
+
+import pytest
+
+from similarity import HashIndex, SIMILAR_DISTANCE_LIMIT
+
+pytestmark = pytest.mark.anyio
+
+
+def flip(value: int, bits) -> int:
+    for bit in bits:
+        value ^= 1 << bit
+    return value
+
+
+def brute_force(entries, value: int, radius: int, artist_key=None) -> dict:
+    return {
+        content_id: bin(hashed ^ value).count("1")
+        for content_id, artist, hashed in entries
+        if bin(hashed ^ value).count("1") <= radius and (artist_key is None or artist == artist_key)
+    }
+
+
+async def filled_index(entries, merged: bool) -> HashIndex:
+    index = HashIndex()
+    for content_id, artist, hashed in entries:
+        index.add(content_id, artist, hashed)
+    if merged:
+        await index.merge()
+    return index
+
+
+@pytest.mark.parametrize("merged", [False, True])
+async def test_radius_boundary(merged):
+    base = random.Random(1).getrandbits(64)
+    # Ten flips spread over all four chunks, so no chunk matches exactly
+    at_radius = flip(base, [1, 2, 3, 17, 18, 19, 33, 34, 49, 50])
+    beyond = flip(at_radius, [60])
+    entries = [(b"a" * 16, 1, base), (b"b" * 16, 1, at_radius), (b"c" * 16, 1, beyond)]
+    index = await filled_index(entries, merged)
+
+    assert index.search(base, 10) == [(b"a" * 16, 0), (b"b" * 16, 10)]
+    assert index.search(base, 11) == [(b"a" * 16, 0), (b"b" * 16, 10), (b"c" * 16, 11)]
+    assert index.search(base, 0) == [(b"a" * 16, 0)]
+
+
+@pytest.mark.parametrize("merged", [False, True])
+async def test_matches_brute_force(merged):
+    rng = random.Random(7)
+    entries = []
+    for _ in range(300):
+        base = rng.getrandbits(64)
+        entries.append((uuid.UUID(int=rng.getrandbits(128)).bytes, rng.randrange(3), base))
+        for _ in range(3):
+            near = flip(base, rng.sample(range(64), rng.randrange(SIMILAR_DISTANCE_LIMIT + 1)))
+            entries.append((uuid.UUID(int=rng.getrandbits(128)).bytes, rng.randrange(3), near))
+    index = await filled_index(entries, merged)
+
+    for content_id, artist, hashed in rng.sample(entries, 40):
+        radius = rng.randrange(SIMILAR_DISTANCE_LIMIT + 1)
+        assert dict(index.search(hashed, radius)) == brute_force(entries, hashed, radius)
+        assert dict(index.search(hashed, radius, artist_key=artist)) == brute_force(entries, hashed, radius, artist)
+
+
+async def test_buffer_and_tables_are_searched_together():
+    value = 0x0123456789ABCDEF
+    index = HashIndex()
+    index.add(b"a" * 16, 1, value)
+    await index.merge()
+    index.add(b"b" * 16, 1, flip(value, [0]))
+    # A document hashed again is kept once, at its closest distance
+    index.add(b"a" * 16, 1, flip(value, [5, 6]))
+
+    assert index.buffered == 2
+    assert index.search(value, 4) == [(b"a" * 16, 0), (b"b" * 16, 1)]
+    await index.merge()
+    assert index.buffered == 0
+    assert index.search(value, 4) == [(b"a" * 16, 0), (b"b" * 16, 1)]
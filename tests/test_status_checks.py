@@ -0,0 +1,95 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from fastapi import HTTPException
+
+import server
+import status_checks
+from indexes import ensure_indexes
+from status_checks import STATUS_SUMMARY_MAX_BUCKETS, check_limit, status_filter, summary_window
+
+NOW = datetime(2024, 6, 1, 12, 0)
+
+
+def test_window_is_half_open_and_utc():
+    since = datetime(2024, 6, 1, 14, 0, tzinfo=timezone(timedelta(hours=2)))
+    assert status_filter("monitor", since, NOW + timedelta(hours=1)) == {
+        "client_name": "monitor", "timestamp": {"$gte": NOW, "$lt": NOW + timedelta(hours=1)},
+    }
+    assert status_filter(until=NOW) == {"timestamp": {"$lt": NOW}}
+    assert status_filter() == {}
+
+
+@pytest.mark.parametrize("since,until,buckets", [
+    (NOW, NOW, 1),
+    (NOW, NOW - timedelta(minutes=1), 1),
+    (NOW - timedelta(hours=1), NOW, 0),
+    (NOW - timedelta(minutes=STATUS_SUMMARY_MAX_BUCKETS + 1), NOW, 1),
+])
+def test_summary_window_rejects(since, until, buckets):
+    with pytest.raises(HTTPException) as raised:
+        summary_window(since, until, buckets)
+    assert raised.value.status_code == 400
+
+
+def test_summary_window_defaults_to_the_last_hour():
+    assert summary_window(None, NOW, 1) == (NOW - timedelta(hours=1), NOW)
+    # A longer window is fine with wider buckets
+    since = NOW - timedelta(minutes=STATUS_SUMMARY_MAX_BUCKETS * 5)
+    assert summary_window(since, NOW, 5) == (since, NOW)
+
+
+@pytest.mark.parametrize("limit", [0, status_checks.STATUS_PAGE_LIMIT + 1])
+def test_limit_bounds(limit):
+    with pytest.raises(HTTPException):
+        check_limit(limit)
+
+
+@pytest.mark.anyio
+async def test_checks_expire_by_timestamp(db):
+    await ensure_indexes(db)
+    info = await db.status_checks.index_information()
+    assert info["timestamp_ttl"]["expireAfterSeconds"] == status_checks.STATUS_RETENTION_SECONDS
+    assert list(info["timestamp_ttl"]["key"]) == [("timestamp", 1)]
+
+
+@pytest.mark.anyio
+async def test_history_pages_within_a_window(api):
+    start = datetime.utcnow().replace(microsecond=0) - timedelta(minutes=30)
+    for minute in range(10):
+        check = {"id": f"{minute}", "client_name": "monitor" if minute % 2 else "probe", "timestamp": start + timedelta(minutes=minute)}
+        await server.db.status_checks.insert_one(server.STATUS_CHECKS.encode(check))
+    assert (await api.post("/api/status", json={"client_name": "probe"})).status_code == 200
+
+    params = {"since": (start + timedelta(minutes=2)).isoformat(), "until": (start + timedelta(minutes=8)).isoformat(), "limit": 2}
+    seen, cursor = [], None
+    while True:
+        response = await api.get("/api/status", params={**params, **({"cursor": cursor} if cursor else {})})
+        seen += [check["id"] for check in response.json()]
+        cursor = response.headers.get(server.NEXT_CURSOR_HEADER)
+        if not cursor:
+            break
+    assert seen == ["7", "6", "5", "4", "3", "2"]
+
+    monitor = (await api.get("/api/status", params={**params, "client_name": "monitor", "limit": 10})).json()
+    assert [check["id"] for check in monitor] == ["7", "5", "3"]
+    assert (await api.get("/api/status", params={"limit": 0})).status_code == 400
+    assert (await api.get("/api/status", params={"since": params["until"], "until": params["since"]})).status_code == 400
+
+
+@pytest.mark.anyio
+async def test_summary_counts_per_client_per_bucket(api):
+    start = NOW
+    for i, (client_name, offset) in enumerate([("a", 10), ("a", 50), ("b", 70), ("a", 130), ("a", 200)]):
+        check = {"id": str(i), "client_name": client_name, "timestamp": start + timedelta(seconds=offset)}
+        await server.db.status_checks.insert_one(server.STATUS_CHECKS.encode(check))
+
+    window = {"since": start.isoformat(), "until": (start + timedelta(minutes=3)).isoformat()}
+    rows = (await api.get("/api/status/summary", params=window)).json()
+    assert [(row["client_name"], row["bucket"], row["count"]) for row in rows] == [
+        ("a", start.isoformat(), 2),
+        ("b", (start + timedelta(minutes=1)).isoformat(), 1),
+        ("a", (start + timedelta(minutes=2)).isoformat(), 1),
+    ]
+    wide = (await api.get("/api/status/summary", params={**window, "client_name": "a", "bucket_minutes": 5})).json()
+    assert [(row["bucket"], row["count"]) for row in wide] == [(start.isoformat(), 3)]
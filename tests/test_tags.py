@@ -0,0 +1,78 @@
+import pytest
+from fastapi import HTTPException
+
+from tags import MAX_FILTER_TAGS, MAX_TAG_LENGTH, MAX_TAGS, normalize_tags, parse_tags, popular_tags, rebuild_tag_counts, record_tags, tag_filter
+
+
+def test_normalize_tags():
+    assert normalize_tags([" Oil  Paint ", "oil paint", "", "  ", "Ink", "INK"]) == ["oil paint", "ink"]
+    assert parse_tags("Ink, watercolour,,ink") == ["ink", "watercolour"]
+    assert parse_tags(None) == []
+
+
+@pytest.mark.parametrize("tags", [["x" * (MAX_TAG_LENGTH + 1)], [f"tag {i}" for i in range(MAX_TAGS + 1)]])
+def test_normalize_rejects_overlong(tags):
+    with pytest.raises(HTTPException) as raised:
+        normalize_tags(tags)
+    assert raised.value.status_code == 400
+
+
+def test_tag_filter():
+    assert tag_filter(None) == {}
+    assert tag_filter("Ink") == {"tags": "ink"}
+    assert tag_filter("ink,Paint") == {"tags": {"$all": ["ink", "paint"]}}
+    assert tag_filter("ink,paint", "any") == {"tags": {"$in": ["ink", "paint"]}}
+    # One tag needs no mode, so an unknown one is only rejected when it matters
+    assert tag_filter("ink", "both") == {"tags": "ink"}
+
+
+@pytest.mark.parametrize("tags,mode", [("ink,paint", "both"), (",".join(f"t{i}" for i in range(MAX_FILTER_TAGS + 1)), "all")])
+def test_tag_filter_rejects(tags, mode):
+    with pytest.raises(HTTPException) as raised:
+        tag_filter(tags, mode)
+    assert raised.value.status_code == 400
+
+
+@pytest.mark.anyio
+async def test_counts_follow_uploads_and_deletes(db):
+    await record_tags(db, ["ink", "paint"], 1)
+    await record_tags(db, ["ink"], 1)
+    await record_tags(db, ["paper"], 1)
+    assert await popular_tags(db) == [{"tag": "ink", "count": 2}, {"tag": "paint", "count": 1}, {"tag": "paper", "count": 1}]
+    assert await popular_tags(db, prefix="PA") == [{"tag": "paint", "count": 1}, {"tag": "paper", "count": 1}]
+    assert await popular_tags(db, skip=1, limit=1) == [{"tag": "paint", "count": 1}]
+
+    # A tag no content uses any more is dropped
+    await record_tags(db, ["paint"], -1)
+    assert [row["tag"] for row in await popular_tags(db)] == ["ink", "paper"]
+
+
+@pytest.mark.anyio
+async def test_rebuild_corrects_drift(db):
+    await db.content.insert_many([{"tags": ["ink", "paint"]}, {"tags": ["ink"]}])
+    await record_tags(db, ["ink", "stale"], 1)
+
+    assert await rebuild_tag_counts(db) == {"tags": 2, "corrected": 3}
+    assert await popular_tags(db) == [{"tag": "ink", "count": 2}, {"tag": "paint", "count": 1}]
+    assert (await rebuild_tag_counts(db))["corrected"] == 0
+
+
+@pytest.mark.anyio
+async def test_tag_endpoints(api):
+    artist = (await api.post("/api/artists", json={"name": "Artist", "email": "artist@example.com"})).json()
+    for title, tags in [("one", "Ink, Paint"), ("two", "ink"), ("three", "paper")]:
+        response = await api.post("/api/content", data={"artist_id": artist["id"], "title": title, "tags": tags}, files={"file": ("a.txt", title.encode(), "text/plain")})
+        assert response.status_code == 200
+
+    async def titles(**params):
+        return sorted(item["title"] for item in (await api.get("/api/content", params=params)).json())
+
+    assert await titles(tags="INK") == ["one", "two"]
+    assert await titles(tags="ink,paint") == ["one"]
+    assert await titles(tags="paint,paper", tag_mode="any") == ["one", "three"]
+    assert (await api.get("/api/content", params={"tags": "ink,paint", "tag_mode": "both"})).status_code == 400
+
+    assert (await api.get("/api/tags")).json() == [{"tag": "ink", "count": 2}, {"tag": "paint", "count": 1}, {"tag": "paper", "count": 1}]
+    assert (await api.get("/api/tags", params={"prefix": "p", "limit": 1})).json() == [{"tag": "paint", "count": 1}]
+    assert (await api.get("/api/tags", params={"limit": 0})).status_code == 400
+    assert (await api.get("/api/tags", params={"skip": -1})).status_code == 400
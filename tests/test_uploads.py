@@ -0,0 +1,136 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException
+
+import server
+from cleanup import RELEASE_BLOBS, expire_upload_sessions
+from uploads import limit_size
+
+pytestmark = pytest.mark.anyio
+
+PARTS = [b"\x89PNG\r\n\x1a\n" + b"a" * 100, b"b" * 100, b"c" * 50]
+
+
+@pytest.fixture
+async def artist_id(api):
+    return (await api.post("/api/artists", json={"name": "Artist", "email": "artist@example.com"})).json()["id"]
+
+
+async def start(api, total_size=sum(map(len, PARTS))) -> str:
+    response = await api.post("/api/uploads", json={"file_name": "image.png", "total_size": total_size})
+    assert response.status_code == 200
+    return response.json()["id"]
+
+
+async def send_parts(api, upload_id: str, parts=PARTS):
+    # Out of order, and one part sent twice: parts are placed by number, the last one sent wins
+    order = list(enumerate(parts, 1))[::-1]
+    await api.put(f"/api/uploads/{upload_id}/1", content=b"replaced")
+    for number, data in order:
+        response = await api.put(f"/api/uploads/{upload_id}/{number}", content=data)
+        assert response.status_code == 200
+        assert response.json()["size"] == len(data)
+
+
+async def complete(api, upload_id: str, artist_id: str):
+    return await api.post(f"/api/uploads/{upload_id}/complete", json={"artist_id": artist_id, "title": "Piece", "tags": ["Ink"]})
+
+
+async def test_parts_are_assembled_in_order(api, artist_id):
+    upload_id = await start(api)
+    await send_parts(api, upload_id)
+
+    response = await complete(api, upload_id, artist_id)
+    assert response.status_code == 200
+    content_id = response.json()["content_id"]
+    assert (await api.get(f"/api/content/{content_id}/file")).content == b"".join(PARTS)
+    content = (await api.get(f"/api/content/{content_id}")).json()
+    assert content["file_type"] == "image/png"
+    assert content["tags"] == ["ink"]
+
+    # A repeated completion (say the response was lost) returns the same item
+    again = await complete(api, upload_id, artist_id)
+    assert again.json()["content_id"] == content_id
+    assert await server.db.content.count_documents({}) == 1
+    assert (await api.get(f"/api/uploads/{upload_id}")).json()["status"] == "completed"
+    assert (await api.put(f"/api/uploads/{upload_id}/4", content=b"late")).status_code == 404
+
+
+async def test_missing_part_leaves_the_session_open(api, artist_id):
+    upload_id = await start(api)
+    await api.put(f"/api/uploads/{upload_id}/1", content=PARTS[0])
+    await api.put(f"/api/uploads/{upload_id}/3", content=PARTS[2])
+
+    assert (await complete(api, upload_id, artist_id)).status_code == 400
+    assert (await api.get(f"/api/uploads/{upload_id}")).json()["status"] == "open"
+    await api.put(f"/api/uploads/{upload_id}/2", content=PARTS[1])
+    assert (await complete(api, upload_id, artist_id)).status_code == 200
+
+
+async def test_size_mismatch_is_rejected(api, artist_id):
+    upload_id = await start(api, total_size=10)
+    await send_parts(api, upload_id)
+    assert (await complete(api, upload_id, artist_id)).status_code == 400
+
+
+async def test_failed_completion_can_be_retried(api, artist_id, monkeypatch):
+    upload_id = await start(api)
+    await send_parts(api, upload_id)
+
+    enqueue, down = server.enqueue, True
+
+    async def flaky_enqueue(*args, **kwargs):
+        if down:
+            raise RuntimeError("queue unavailable")
+        return await enqueue(*args, **kwargs)
+
+    monkeypatch.setattr(server, "enqueue", flaky_enqueue)
+    with pytest.raises(RuntimeError):
+        await complete(api, upload_id, artist_id)
+    assert (await api.get(f"/api/uploads/{upload_id}")).json()["status"] == "open"
+    assert await server.db.content.count_documents({}) == 0
+
+    down = False
+    assert (await complete(api, upload_id, artist_id)).status_code == 200
+    assert await server.db.content.count_documents({}) == 1
+
+
+async def test_expired_session(api, artist_id):
+    upload_id = await start(api)
+    await send_parts(api, upload_id)
+    await server.db.upload_sessions.update_one({"id": upload_id}, {"$set": {"expires_at": datetime.utcnow() - timedelta(seconds=1)}})
+
+    assert (await api.put(f"/api/uploads/{upload_id}/1", content=b"more")).status_code == 410
+    assert (await complete(api, upload_id, artist_id)).status_code == 410
+
+    assert await expire_upload_sessions(server.db) == 1
+    assert (await api.get(f"/api/uploads/{upload_id}")).json()["status"] == "expired"
+    queued = {key for job in await server.db.jobs.find({"type": RELEASE_BLOBS}).to_list(None) for key in job["payload"]["blob_ids"]}
+    session = await server.db.upload_sessions.find_one({"id": upload_id})
+    assert set(session["part_blobs"]) <= queued
+    assert (await complete(api, upload_id, artist_id)).status_code == 410
+    assert await expire_upload_sessions(server.db) == 0
+
+
+async def test_aborted_session(api):
+    upload_id = await start(api)
+    assert (await api.delete(f"/api/uploads/{upload_id}")).status_code == 200
+    assert (await api.put(f"/api/uploads/{upload_id}/1", content=b"late")).status_code == 404
+    assert (await api.delete(f"/api/uploads/{upload_id}")).status_code == 404
+
+
+async def test_declared_size_over_the_limit(api):
+    response = await api.post("/api/uploads", json={"file_name": "huge.bin", "total_size": server.MAX_UPLOAD_BYTES + 1})
+    assert response.status_code == 413
+
+
+async def test_limit_size_stops_at_the_limit():
+    async def chunks():
+        for _ in range(4):
+            yield b"x" * 10
+
+    assert [chunk async for chunk in limit_size(chunks(), 40)] == [b"x" * 10] * 4
+    with pytest.raises(HTTPException) as raised:
+        [chunk async for chunk in limit_size(chunks(), 39)]
+    assert raised.value.status_code == 413